@@ -1,16 +1,25 @@
 from django.contrib import admin
+from . import search
 from .models import Location, Dialogue, PlayerProgress
 
+class FullTextSearchMixin:
+    """Search the FTS5 index (see game/search.py) instead of icontains on each field."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search.matching(queryset, search_term), False
+
 @admin.register(Location)
-class LocationAdmin(admin.ModelAdmin):
+class LocationAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'description')
-    search_fields = ('name',)
+    search_fields = ('name', 'description')
 
 @admin.register(Dialogue)
-class DialogueAdmin(admin.ModelAdmin):
+class DialogueAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('location', 'npc_text', 'difficulty')
     list_filter = ('location', 'difficulty')
-    search_fields = ('npc_text', 'correct_response')
+    search_fields = ('npc_text', 'hint', 'correct_response')
 
 @admin.register(PlayerProgress)
 class PlayerProgressAdmin(admin.ModelAdmin):
@@ -0,0 +1,115 @@
+"""Frame time for World buildings: per-building immediate mode vs. merged static batches.
+
+    python game/benchmarks/building_batch.py --counts 1000 10000 --frames 20
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+# gl_stats puts game/ on sys.path so the core package resolves
+from gl_stats import CallCounter, setup_camera, percentile
+from core.headless import use_egl_platform, HeadlessContext
+
+use_egl_platform()
+
+from OpenGL.GL import *
+
+import core.world as world_module
+import core.static_batch as static_batch_module
+from core.world import World
+
+
+def draw_per_building(buildings, texture):
+    # World._draw_buildings before static batching: one push/translate/begin per building
+    glEnable(GL_TEXTURE_2D)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    for building in buildings:
+        pos = building['position']
+        size = building['size']
+        glPushMatrix()
+        glTranslatef(*pos)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 0); glVertex3f(-size[0]/2, 0, -size[2]/2)
+        glTexCoord2f(1, 0); glVertex3f(size[0]/2, 0, -size[2]/2)
+        glTexCoord2f(1, 1); glVertex3f(size[0]/2, size[1], -size[2]/2)
+        glTexCoord2f(0, 1); glVertex3f(-size[0]/2, size[1], -size[2]/2)
+        glTexCoord2f(0, 0); glVertex3f(-size[0]/2, 0, size[2]/2)
+        glTexCoord2f(1, 0); glVertex3f(size[0]/2, 0, size[2]/2)
+        glTexCoord2f(1, 1); glVertex3f(size[0]/2, size[1], size[2]/2)
+        glTexCoord2f(0, 1); glVertex3f(-size[0]/2, size[1], size[2]/2)
+        glEnd()
+        glPopMatrix()
+
+
+def run(draw, frames, counter):
+    draw()
+    glFinish()
+    counter.reset()
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        draw()
+        glFinish()
+        times.append(time.perf_counter() - start)
+    return counter.count / frames, times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    args = parser.parse_args()
+
+    context = HeadlessContext(args.width, args.height)
+    setup_camera(args.width, args.height, eye=(0, 60, -120))
+    counter = CallCounter(world_module, static_batch_module, sys.modules[__name__])
+    rng = np.random.default_rng(0)
+
+    print(f"{'buildings':>9} {'path':>12} {'GL calls/frame':>15} {'p50 ms':>9} {'p95 ms':>9}")
+    try:
+        for count in args.counts:
+            world = World()  # Missing image assets fall back to the checkerboard
+            half = np.sqrt(count) * 2
+            for x, z in rng.uniform(-half, half, (count, 2)).tolist():
+                world.add_building((x, 0, z), (3, rng.uniform(3, 12), 3))
+            buildings = world.buildings
+            texture = world.textures.texture_id('building')
+
+            rows = [
+                ('per-building', lambda: draw_per_building(buildings, texture)),
+                ('batched', world.building_batches['building'].draw),
+            ]
+            for label, draw in rows:
+                calls, times = run(draw, args.frames, counter)
+                print(f"{len(buildings):>9} {label:>12} {calls:>15.0f} "
+                      f"{percentile(times, 50) * 1000:>9.2f} {percentile(times, 95) * 1000:>9.2f}")
+
+            # Adding or removing one building re-uploads one slot, not the whole batch
+            batch = world.building_batches['building']
+            start = time.perf_counter()
+            building = world.add_building((0, 0, 0), (3, 5, 3))
+            world.remove_building(buildings[0])
+            batch._sync()
+            glFinish()
+            incremental = time.perf_counter() - start
+            batch.release()
+            start = time.perf_counter()
+            batch._sync()
+            glFinish()
+            full = time.perf_counter() - start
+            print(f"{'':>9} {'add+remove':>12} {'upload ms':>15} {incremental * 1000:>9.3f} "
+                  f"(full rebuild {full * 1000:.3f} ms)")
+            world.remove_building(building)
+            batch.release()
+    finally:
+        counter.restore()
+        context.release()
+
+
+if __name__ == '__main__':
+    main()
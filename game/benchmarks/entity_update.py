@@ -0,0 +1,104 @@
+"""Simulation ticks per second: the per-object Avatar updates EntityStore replaced vs. one store tick.
+
+    python game/benchmarks/entity_update.py --counts 10 1000 100000
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.terrain import Terrain
+from core.entities.store import EntityStore
+
+
+class LegacyAvatar:
+    # Avatar's simulation before EntityStore: plain attributes and one terrain
+    # query per avatar per tick. move() printed the new position; that is left out
+    def __init__(self, position, rotation):
+        self.position = list(position)
+        self.rotation = rotation
+        self.height = 1.8
+        self.animation_state = 'idle'
+        self.animation_frame = 0
+        self.walking = False
+
+    def update(self, terrain):
+        ground_height = terrain.get_height(self.position[0], self.position[2])
+        self.position[1] = ground_height + self.height/2
+        if self.walking:
+            self.animation_frame = (self.animation_frame + 1) % 60
+            self.animation_state = 'walk'
+        else:
+            self.animation_state = 'idle'
+
+    def move(self, forward, right):
+        angle = np.radians(self.rotation)
+        dx = np.sin(angle) * forward + np.cos(angle) * right
+        dz = np.cos(angle) * forward - np.sin(angle) * right
+        speed = 0.1
+        self.position[0] += dx * speed
+        self.position[2] += dz * speed
+        self.walking = forward != 0 or right != 0
+
+
+def ticks_per_second(tick, min_seconds=0.5, max_ticks=1000):
+    ticks = 0
+    start = time.perf_counter()
+    while ticks < max_ticks:
+        tick()
+        ticks += 1
+        if time.perf_counter() - start > min_seconds:
+            break
+    return ticks / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 1000, 100000])
+    parser.add_argument('--object-max', type=int, default=10000,
+                        help='skip the per-object loop above this many entities')
+    args = parser.parse_args()
+
+    with redirect_stdout(StringIO()):
+        terrain = Terrain(size=256)
+    rng = np.random.default_rng(0)
+
+    print(f"{'entities':>9} {'objects ticks/s':>16} {'store ticks/s':>14} {'speedup':>8}")
+    for count in args.counts:
+        positions = np.column_stack([rng.uniform(-100, 100, count), np.zeros(count),
+                                     rng.uniform(-100, 100, count)])
+        headings = rng.uniform(0, 360, count)
+
+        store = EntityStore()
+        rows = store.add_many(positions, headings)
+        forward = np.ones(count)
+        right = np.zeros(count)
+
+        def store_tick():
+            store.move(rows, forward, right)
+            store.update(terrain)
+
+        store_rate = ticks_per_second(store_tick)
+
+        if count <= args.object_max:
+            avatars = [LegacyAvatar(p, heading) for p, heading in zip(positions.tolist(), headings)]
+
+            def object_tick():
+                for avatar in avatars:
+                    avatar.move(1, 0)
+                    avatar.update(terrain)
+
+            object_rate = ticks_per_second(object_tick)
+            print(f"{count:>9} {object_rate:>16.1f} {store_rate:>14.1f} {store_rate / object_rate:>7.1f}x")
+        else:
+            print(f"{count:>9} {'-':>16} {store_rate:>14.1f} {'-':>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Headless frame-time benchmark for the whole Game loop, with JSON output for CI.
+
+Runs Game offscreen (SDL offscreen driver + EGL, llvmpipe on a plain Linux
+box), moves the avatar along a scripted circular path for N frames without
+a frame cap and reports per-phase frame time percentiles:
+
+    python game/benchmarks/game_frames.py --frames 600 --output frames.json
+
+With --baseline it exits non-zero when any phase's p95 is more than
+--tolerance slower than the baseline report, so CI can gate on it. The
+game's own log lines go to stderr so stdout stays valid JSON.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from contextlib import redirect_stdout
+
+# gl_stats puts game/ on sys.path so the core package resolves
+from gl_stats import percentile
+from core.headless import use_offscreen_video
+
+use_offscreen_video()
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # Keep stdout pure JSON
+
+from OpenGL.GL import glFinish, glGetString, GL_RENDERER, GL_VERSION
+
+from main import Game
+
+PHASES = ('handle_events', 'update', 'render', 'frame')
+
+
+def camera_path(frame, frames, radius, laps):
+    """Avatar position and heading at `frame`: walking a circle, facing along it."""
+    t = 2 * math.pi * laps * frame / frames
+    x, z = radius * math.cos(t), radius * math.sin(t)
+    return (x, z), math.degrees(-t) % 360
+
+
+def phase_stats(samples):
+    ms = [s * 1000 for s in samples]
+    return {
+        'p50_ms': percentile(ms, 50),
+        'p95_ms': percentile(ms, 95),
+        'p99_ms': percentile(ms, 99),
+        'mean_ms': sum(ms) / len(ms) if ms else 0.0,
+        'max_ms': max(ms) if ms else 0.0,
+    }
+
+
+def run(game, frames, warmup, radius, laps):
+    times = {phase: [] for phase in PHASES}
+    for frame in range(-warmup, frames):
+        (x, z), heading = camera_path(frame, frames, radius, laps)
+        game.avatar.position[0] = x
+        game.avatar.position[2] = z
+        game.avatar.rotation = heading
+
+        start = time.perf_counter()
+        game.handle_events()
+        events_done = time.perf_counter()
+        game.update()
+        update_done = time.perf_counter()
+        game.render()
+        glFinish()  # Count the GPU work of this frame, not the next one
+        render_done = time.perf_counter()
+
+        if frame >= 0:
+            times['handle_events'].append(events_done - start)
+            times['update'].append(update_done - events_done)
+            times['render'].append(render_done - update_done)
+            times['frame'].append(render_done - start)
+    return times
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    for phase in PHASES:
+        old = baseline['phases'][phase]['p95_ms']
+        new = report['phases'][phase]['p95_ms']
+        # Sub-millisecond phases are dominated by timer noise
+        if new > old * (1 + tolerance) and new - old > 0.5:
+            found.append(f"{phase} p95 {old:.2f} ms -> {new:.2f} ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--warmup', type=int, default=30,
+                        help="frames run before measuring (uploads, shader compiles, caches)")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--radius', type=float, default=15.0, help="radius of the avatar's path")
+    parser.add_argument('--laps', type=float, default=1.0)
+    parser.add_argument('--streaming', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', help="earlier JSON report to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed p95 slowdown against the baseline, as a fraction")
+    args = parser.parse_args()
+
+    with redirect_stdout(sys.stderr):
+        game = Game(width=args.width, height=args.height, streaming=args.streaming, seed=args.seed)
+    try:
+        with redirect_stdout(sys.stderr):
+            times = run(game, args.frames, args.warmup, args.radius, args.laps)
+        report = {
+            'frames': args.frames,
+            'warmup': args.warmup,
+            'resolution': [args.width, args.height],
+            'streaming': args.streaming,
+            'renderer': glGetString(GL_RENDERER).decode(),
+            'gl_version': glGetString(GL_VERSION).decode(),
+            'python': platform.python_version(),
+            'phases': {phase: phase_stats(times[phase]) for phase in PHASES},
+            'terrain_triangles': game.terrain.triangles_drawn,
+        }
+    finally:
+        with redirect_stdout(sys.stderr):
+            game.shutdown()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for line in found:
+            print(f"Regression: {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Helpers shared by the rendering benchmarks."""
+import os
+import sys
+
+GAME_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if GAME_DIR not in sys.path:
+    sys.path.insert(0, GAME_DIR)
+
+
+class CallCounter:
+    """Counts calls to every gl*/glu* function referenced from the given modules."""
+
+    def __init__(self, *modules):
+        self.count = 0
+        self._patched = []
+        for module in modules:
+            for name, value in list(vars(module).items()):
+                if name.startswith('gl') and callable(value):
+                    self._patched.append((module, name, value))
+                    setattr(module, name, self._wrap(value))
+
+    def _wrap(self, func):
+        def counted(*args, **kwargs):
+            self.count += 1
+            return func(*args, **kwargs)
+        return counted
+
+    def reset(self):
+        self.count = 0
+
+    def restore(self):
+        for module, name, value in self._patched:
+            setattr(module, name, value)
+        self._patched = []
+
+
+def setup_camera(width, height, eye=(0, 40, -60), target=(0, 0, 0)):
+    from OpenGL.GL import (glViewport, glMatrixMode, glLoadIdentity, glEnable,
+                           GL_PROJECTION, GL_MODELVIEW, GL_DEPTH_TEST, GL_LIGHTING, GL_LIGHT0)
+    from OpenGL.GLU import gluPerspective, gluLookAt
+
+    glViewport(0, 0, width, height)
+    glEnable(GL_DEPTH_TEST)
+    glEnable(GL_LIGHTING)
+    glEnable(GL_LIGHT0)
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    gluPerspective(45, width / height, 0.1, 150.0)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+    gluLookAt(*eye, *target, 0, 1, 0)
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
@@ -0,0 +1,66 @@
+"""Height query throughput: per-point calls vs. one batched get_heights call.
+
+    python game/benchmarks/height_queries.py --counts 1 1000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.terrain import Terrain
+
+
+def legacy_get_height(terrain, x, z):
+    # The original nearest-cell lookup, one Python call per point
+    terrain_x = int((x + terrain.size/2) / terrain.scale)
+    terrain_z = int((z + terrain.size/2) / terrain.scale)
+    if 0 <= terrain_x < terrain.size-1 and 0 <= terrain_z < terrain.size-1:
+        return terrain.height_map[terrain_x][terrain_z]
+    return 0
+
+
+def best_of(func, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+', default=[1, 1000, 1000000])
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--loop-max', type=int, default=10000,
+                        help='skip the per-point loops above this many queries')
+    args = parser.parse_args()
+
+    terrain = Terrain(size=args.size)
+    rng = np.random.default_rng(0)
+    half = args.size / 2
+
+    print(f"\n{'queries':>9} {'legacy loop':>12} {'get_height loop':>16} {'get_heights':>12} "
+          f"{'get_normals':>12} {'ns/query':>9}")
+    for count in args.counts:
+        xs = rng.uniform(-half, half, count)
+        zs = rng.uniform(-half, half, count)
+        repeats = 5 if count <= 1000 else 1
+        batched = best_of(lambda: terrain.get_heights(xs, zs), repeats)
+        normals = best_of(lambda: terrain.get_normals(xs, zs), repeats)
+        if count <= args.loop_max:
+            legacy = best_of(lambda: [legacy_get_height(terrain, x, z) for x, z in zip(xs, zs)], repeats)
+            single = best_of(lambda: [terrain.get_height(x, z) for x, z in zip(xs, zs)], repeats)
+            loops = f"{legacy * 1000:>10.3f}ms {single * 1000:>14.3f}ms"
+        else:
+            loops = f"{'-':>12} {'-':>16}"
+        print(f"{count:>9} {loops} {batched * 1000:>10.3f}ms "
+              f"{normals * 1000:>10.3f}ms {batched / count * 1e9:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""Load the position server with simulated clients on localhost.
+
+    python game/benchmarks/position_load.py --clients 10 100 1000 --seconds 10
+
+For each client count this starts position_server.py as a subprocess,
+connects that many clients spread over a square (a constant density, so
+each sees a similar crowd at any count), walks them randomly while sending
+their state every server tick, and reads their snapshots. Reports bytes per
+second per client each way, snapshot latency (server tick to client read,
+so it includes time the clients' own process was busy) and the server's
+tick time. Prints JSON on stdout. The clients run in this one process; on
+a machine with few cores they compete with the server for CPU, which shows
+up as latency at high counts.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.net import (LENGTH, MSG_SNAPSHOT, MSG_STATE, SNAPSHOT, STATE, WELCOME,
+                      apply_snapshot, frame)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class SimulatedClient:
+    def __init__(self, reader, writer, position, decode):
+        self.reader = reader
+        self.writer = writer
+        self.x, self.z = position
+        self.heading = random.uniform(0, 360)
+        self.decode = decode
+        self.known = {}
+        self.measuring = False
+        self.bytes_down = 0
+        self.bytes_up = 0
+        self.snapshots = 0
+        self.latencies = []
+
+    def step(self, speed):
+        # Random walk: mostly straight, turning a little each tick
+        self.heading = (self.heading + random.uniform(-15, 15)) % 360
+        self.x += math.sin(math.radians(self.heading)) * speed
+        self.z += math.cos(math.radians(self.heading)) * speed
+        data = frame(STATE.pack(MSG_STATE, self.x, 1.0, self.z, self.heading))
+        self.writer.write(data)
+        if self.measuring:
+            self.bytes_up += len(data)
+
+    async def read(self):
+        try:
+            while True:
+                size, = LENGTH.unpack(await self.reader.readexactly(LENGTH.size))
+                payload = await self.reader.readexactly(size)
+                if payload[0] != MSG_SNAPSHOT:
+                    continue
+                if self.decode:
+                    server_time = apply_snapshot(payload, self.known)[1]
+                else:
+                    server_time = SNAPSHOT.unpack_from(payload)[2]
+                if self.measuring:
+                    self.latencies.append(time.monotonic() - server_time)
+                    self.bytes_down += LENGTH.size + size
+                    self.snapshots += 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+
+async def connect(port, position, decode):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    size, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    welcome = WELCOME.unpack(await reader.readexactly(size))
+    return SimulatedClient(reader, writer, position, decode), welcome[2]
+
+
+async def wait_for_server(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+            continue
+        writer.close()
+        return
+
+
+async def run_clients(port, count, spacing, warmup, seconds, decode):
+    side = math.sqrt(count) * spacing
+    clients = []
+    tick_rate = None
+    # Connect in batches so the server's accept backlog is not overrun
+    for start in range(0, count, 50):
+        batch = [connect(port, (random.uniform(0, side), random.uniform(0, side)), decode)
+                 for _ in range(start, min(count, start + 50))]
+        for client, tick_rate in await asyncio.gather(*batch):
+            clients.append(client)
+    readers = [asyncio.create_task(client.read()) for client in clients]
+
+    # One driver sends every client's state each server tick, like real clients would
+    loop = asyncio.get_running_loop()
+    step = 1.0 / tick_rate
+    speed = 4.0 / tick_rate  # Units per tick at a walking pace of 4 units/s
+    began = loop.time()
+    measure_from = began + warmup
+    end = measure_from + seconds
+    next_tick = began
+    while True:
+        now = loop.time()
+        if now >= end:
+            break
+        if now >= measure_from and not clients[0].measuring:
+            for client in clients:
+                client.measuring = True
+        for client in clients:
+            client.step(speed)
+        next_tick = max(next_tick + step, now)
+        await asyncio.sleep(next_tick - now)
+
+    for client in clients:
+        client.writer.close()
+    for task in readers:
+        task.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+    return clients, tick_rate
+
+
+def measure(count, args):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, 'position_server.py', '--port', str(port),
+         '--tick-rate', str(args.tick_rate), '--interest-radius', str(args.interest_radius),
+         '--stats-json'],
+        cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        asyncio.run(wait_for_server(port))
+        clients, tick_rate = asyncio.run(run_clients(port, count, args.spacing, args.warmup,
+                                                     args.seconds, args.decode))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        out, _ = server.communicate(timeout=30)
+    stats = json.loads(out.strip().splitlines()[-1]) if out.strip() else {}
+
+    latencies = [latency for client in clients for latency in client.latencies]
+    return {
+        'clients': count,
+        'tick_rate': tick_rate,
+        'down_bytes_per_client_s': sum(c.bytes_down for c in clients) / count / args.seconds,
+        'up_bytes_per_client_s': sum(c.bytes_up for c in clients) / count / args.seconds,
+        'snapshots_per_client_s': sum(c.snapshots for c in clients) / count / args.seconds,
+        'latency_ms_p50': 1000 * percentile(latencies, 0.50) if latencies else None,
+        'latency_ms_p95': 1000 * percentile(latencies, 0.95) if latencies else None,
+        'latency_ms_p99': 1000 * percentile(latencies, 0.99) if latencies else None,
+        'server_tick_ms_p50': stats.get('tick_ms_p50'),
+        'server_tick_ms_p99': stats.get('tick_ms_p99'),
+        'server_skipped_snapshots': stats.get('skipped_snapshots'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--seconds', type=float, default=10.0, help="measured time per count")
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--tick-rate', type=int, default=20)
+    parser.add_argument('--interest-radius', type=float, default=48.0)
+    parser.add_argument('--spacing', type=float, default=12.0,
+                        help="average distance between clients")
+    parser.add_argument('--decode', action='store_true',
+                        help="apply every snapshot like the game does (costs client CPU)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    results = []
+    for count in args.clients:
+        results.append(measure(count, args))
+        print(f"{count} clients done", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
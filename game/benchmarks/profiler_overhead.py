@@ -0,0 +1,63 @@
+"""Cost of the profiler's scopes and counters, disabled and enabled, against an empty loop.
+
+    python game/benchmarks/profiler_overhead.py --iterations 1000000
+
+A game frame opens under ten scopes and about ten counters, so the
+disabled numbers times ~20 is the per-frame price of leaving the
+instrumentation in.
+"""
+import argparse
+import time
+
+# gl_stats puts game/ on sys.path so the core package resolves
+import gl_stats  # noqa: F401
+from core.profiler import Profiler
+
+
+def time_loop(iterations, body):
+    start = time.perf_counter()
+    body(iterations)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def empty(n):
+    for _ in range(n):
+        pass
+
+
+def scopes(profiler):
+    def body(n):
+        for _ in range(n):
+            with profiler.scope('work'):
+                pass
+    return body
+
+
+def counters(profiler):
+    def body(n):
+        for _ in range(n):
+            profiler.count('vertices', 36)
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    baseline = time_loop(args.iterations, empty)
+    print(f"{'case':>18} {'ns/call':>9}")
+    print(f"{'empty loop':>18} {baseline:>9.1f}")
+    for enabled in (False, True):
+        profiler = Profiler(enabled=enabled, capacity=600)
+        # Enabled scopes and counters record into the open frame
+        profiler.begin_frame()
+        label = 'enabled' if enabled else 'disabled'
+        for name, make in (('scope', scopes), ('count', counters)):
+            ns = time_loop(args.iterations, make(profiler)) - baseline
+            print(f"{name + ' ' + label:>18} {ns:>9.1f}")
+        profiler.end_frame()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Replay a recorded input log offscreen and report ticks per second and checksum mismatches.
+
+    python game/main.py --record session.ginp        # play, then quit
+    python game/benchmarks/replay_session.py session.ginp --render-every 1
+
+Without a log, --synthesize TICKS records a scripted walk first, so CI can
+run it with nothing checked in. Exits non-zero when the replay diverges
+from the recording.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+# gl_stats puts game/ on sys.path so the core package resolves
+import gl_stats  # noqa: F401
+from core.headless import use_offscreen_video
+
+use_offscreen_video()
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from core.replay import InputFrame, InputReplay, KEY_FORWARD, KEY_LEFT, KEY_RIGHT
+from main import Game
+
+
+def scripted_frame(tick):
+    # Walk with alternating strafes and a turn every few seconds
+    strafe = (0, KEY_LEFT, 0, KEY_RIGHT)[(tick // 120) % 4]
+    turn = 6 if tick % 300 < 30 else 0
+    return InputFrame(KEY_FORWARD | strafe, turn, 0)
+
+
+def synthesize(path, ticks, streaming):
+    game = Game(width=320, height=180, streaming=streaming, record_path=path, grab_input=False)
+    try:
+        for tick in range(ticks):
+            game.update(scripted_frame(tick))
+    finally:
+        game.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('log', nargs='?', help="input log written by main.py --record")
+    parser.add_argument('--synthesize', type=int, metavar='TICKS',
+                        help="record a scripted session of TICKS ticks and replay that")
+    parser.add_argument('--render-every', type=int, default=0, metavar='N',
+                        help="render every N ticks (default: simulate only)")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    args = parser.parse_args()
+    if not args.log and not args.synthesize:
+        parser.error("give a log or --synthesize TICKS")
+
+    root = None
+    path = args.log
+    with redirect_stdout(sys.stderr):
+        if path is None:
+            root = tempfile.mkdtemp(prefix='replay-bench-')
+            path = os.path.join(root, 'session.ginp')
+            synthesize(path, args.synthesize, streaming=False)
+        log = InputReplay(path)
+        game = Game(width=args.width, height=args.height, streaming=log.streaming, seed=log.seed,
+                    tick_rate=log.tick_rate, render_mode='uncapped', grab_input=False)
+        try:
+            summary = game.replay(log, args.render_every)
+        finally:
+            game.shutdown()
+    summary['log_bytes'] = os.path.getsize(path)
+    summary['render_every'] = args.render_every
+    if root is not None:
+        os.remove(path)
+        os.rmdir(root)
+
+    print(json.dumps(summary, indent=2))
+    if summary['mismatches']:
+        print(f"Replay diverged at tick {summary['first_mismatch']}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
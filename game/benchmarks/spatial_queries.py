@@ -0,0 +1,107 @@
+"""Collision, radius and nearest queries: linear scan over building dicts vs. SpatialGrid.
+
+    python game/benchmarks/spatial_queries.py --counts 10 1000 100000
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.spatial import SpatialGrid, _distance_sq_to_box
+
+
+def linear_collision(buildings, position):
+    # World.check_collision before the grid
+    for building in buildings:
+        bpos = building['position']
+        bsize = building['size']
+        if (abs(position[0] - bpos[0]) < bsize[0]/2 and
+                abs(position[2] - bpos[2]) < bsize[2]/2):
+            return True
+    return False
+
+
+def footprint(building):
+    pos, size = building['position'], building['size']
+    return (pos[0] - size[0]/2, pos[2] - size[2]/2, pos[0] + size[0]/2, pos[2] + size[2]/2)
+
+
+def linear_radius(buildings, position, radius):
+    r_sq = radius * radius
+    return [i for i, b in enumerate(buildings)
+            if _distance_sq_to_box(position[0], position[2], footprint(b)) <= r_sq]
+
+
+def linear_nearest(buildings, position):
+    distances = [_distance_sq_to_box(position[0], position[2], footprint(b)) for b in buildings]
+    i = min(range(len(distances)), key=distances.__getitem__)
+    return i, math.sqrt(distances[i])
+
+
+def queries_per_second(query, points, min_seconds=0.3):
+    done = 0
+    start = time.perf_counter()
+    while True:
+        for p in points:
+            query(p)
+        done += len(points)
+        elapsed = time.perf_counter() - start
+        if elapsed > min_seconds:
+            return done / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 1000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--radius', type=float, default=10.0)
+    parser.add_argument('--cell-size', type=float, default=8.0)
+    parser.add_argument('--density', type=float, default=0.01,
+                        help='buildings per square unit; the world grows with the count')
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'colliders':>9} {'query':>10} {'linear q/s':>12} {'grid q/s':>12} {'speedup':>8}")
+    for count in args.counts:
+        half = math.sqrt(count / args.density) / 2
+        xz = rng.uniform(-half, half, (count, 2))
+        sizes = rng.uniform(2, 6, (count, 2))
+        buildings = [{'position': (x, 0.0, z), 'size': (w, 5.0, d)}
+                     for (x, z), (w, d) in zip(xz.tolist(), sizes.tolist())]
+
+        start = time.perf_counter()
+        grid = SpatialGrid(args.cell_size)
+        for i, building in enumerate(buildings):
+            grid.insert(i, *footprint(building))
+        build_ms = 1000 * (time.perf_counter() - start)
+
+        points = [(x, 0.0, z) for x, z in rng.uniform(-half, half, (args.queries, 2)).tolist()]
+        # Half of the collision probes land inside a building so both outcomes are timed
+        points[::2] = [buildings[i]['position'] for i in rng.integers(0, count, len(points[::2]))]
+
+        # Same answers before timing anything
+        for p in points[:20]:
+            assert bool(grid.query_point(p[0], p[2])) == linear_collision(buildings, p)
+            assert sorted(grid.query_radius(p[0], p[2], args.radius)) == linear_radius(buildings, p, args.radius)
+            assert math.isclose(grid.nearest(p[0], p[2])[1], linear_nearest(buildings, p)[1])
+
+        cases = [
+            ('collision', lambda p: linear_collision(buildings, p), lambda p: grid.query_point(p[0], p[2])),
+            ('radius', lambda p: linear_radius(buildings, p, args.radius),
+             lambda p: grid.query_radius(p[0], p[2], args.radius)),
+            ('nearest', lambda p: linear_nearest(buildings, p), lambda p: grid.nearest(p[0], p[2])),
+        ]
+        for name, linear, indexed in cases:
+            linear_rate = queries_per_second(linear, points[:max(1, min(len(points), 2000000 // count))])
+            grid_rate = queries_per_second(indexed, points)
+            print(f"{count:>9} {name:>10} {linear_rate:>12.0f} {grid_rate:>12.0f} {grid_rate / linear_rate:>7.1f}x")
+        print(f"{count:>9} {'build':>10} {'':>12} {build_ms:>10.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""GL state changes per frame for Game.render and World.draw: direct GL state vs. the render queue.
+
+Counts the fixed-function state calls (enable/disable, texture binds,
+polygon mode, blending, light parameters) issued from the game's modules
+while rendering offscreen. The "legacy" rows drive the same draw code with
+the state handling it had before it submitted to a RenderQueue:
+
+    python game/benchmarks/state_changes.py --frames 120 --buildings 200
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import redirect_stdout
+
+# gl_stats puts game/ on sys.path so the core package resolves
+import gl_stats  # noqa: F401
+from core.headless import use_offscreen_video
+
+use_offscreen_video()
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from OpenGL.GL import *
+from OpenGL.GLU import *
+
+from core.frustum import Frustum
+from core.entities.avatar_renderer import shared_renderer
+from core.render_queue import RenderQueue, UNLIT
+
+STATE_CALLS = ('glEnable', 'glDisable', 'glBindTexture', 'glPolygonMode',
+               'glBlendFunc', 'glLightfv')
+
+
+class StateCallCounter:
+    """Counts calls to the STATE_CALLS names in every loaded game module."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._patched = []
+        for name, module in list(sys.modules.items()):
+            if module is None or not (name in ('main', '__main__') or name.startswith('core')):
+                continue
+            for call in STATE_CALLS:
+                func = vars(module).get(call)
+                if func is not None:
+                    self._patched.append((module, call, func))
+                    setattr(module, call, self._wrap(call, func))
+
+    def _wrap(self, call, func):
+        def counted(*args, **kwargs):
+            self.counts[call] += 1
+            return func(*args, **kwargs)
+        return counted
+
+    def restore(self):
+        for module, call, func in self._patched:
+            setattr(module, call, func)
+
+
+class DirectQueue:
+    """RenderQueue stand-in that draws at once, in submission order.
+
+    Each draw sets its own state and puts lighting and polygon mode back
+    afterwards, as Terrain, AvatarRenderer and Game._draw_debug_grid did
+    before they submitted to a queue.
+    """
+
+    def submit(self, state, draw, layer=None, name=None):
+        if state.texture:
+            glEnable(GL_TEXTURE_2D)
+            glBindTexture(GL_TEXTURE_2D, state.texture)
+        elif state.polygon_mode == GL_LINE:
+            glDisable(GL_TEXTURE_2D)
+        if not state.lighting:
+            glDisable(GL_LIGHTING)
+        if state.polygon_mode == GL_LINE:
+            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+        draw()
+        if state.polygon_mode == GL_LINE:
+            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+        if not state.lighting:
+            glEnable(GL_LIGHTING)
+
+
+def legacy_render(game, alpha=None):
+    # Game.render before the render queue: light colours re-sent every frame
+    # and every draw toggling the state it needs
+    game.textures.upload_pending()
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    glLoadIdentity()
+    camera_pos, look_at = game.avatar.get_camera_position(alpha)
+    gluLookAt(*camera_pos, *look_at, 0, 1, 0)
+    glLightfv(GL_LIGHT0, GL_POSITION, [1, 1, 1, 0])
+    glLightfv(GL_LIGHT0, GL_AMBIENT, [0.3, 0.3, 0.3, 1])
+    glLightfv(GL_LIGHT0, GL_DIFFUSE, [1.0, 1.0, 1.0, 1])
+
+    queue = DirectQueue()
+    queue.submit(UNLIT, game._draw_debug_grid)
+    frustum = Frustum.from_camera(camera_pos, look_at, game.fovy, game.aspect, game.near, game.far)
+    game.terrain.submit(queue, game.textures.texture_id('grass'), frustum, color=(0.5, 0.8, 0.5))
+    shared_renderer().submit_store(queue, game.entities, alpha=alpha)
+    pygame.display.flip()
+
+
+def legacy_world_draw(world):
+    # World.draw before the render queue: texturing enabled by the terrain and
+    # again by the buildings, which bind their textures sorted by id
+    textures = world.textures
+    glEnable(GL_TEXTURE_2D)
+    glBindTexture(GL_TEXTURE_2D, textures.texture_id('grass'))
+    world._draw_terrain()
+    glEnable(GL_TEXTURE_2D)
+    for name in sorted(world.building_batches, key=textures.texture_id):
+        batch = world.building_batches[name]
+        if len(batch):
+            glBindTexture(GL_TEXTURE_2D, textures.texture_id(name))
+            batch.draw()
+
+
+def measure(draw, frames, warmup):
+    for _ in range(warmup):
+        draw()
+    counter = StateCallCounter()
+    try:
+        for _ in range(frames):
+            draw()
+    finally:
+        counter.restore()
+    return {call: counter.counts[call] / frames for call in STATE_CALLS}
+
+
+def report(label, path, per_frame):
+    calls = ' '.join(f"{call[2:]}={per_frame[call]:.1f}" for call in STATE_CALLS if per_frame[call])
+    print(f"{label:>12} {path:>10} {sum(per_frame.values()):>7.1f}  {calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--buildings', type=int, default=200)
+    parser.add_argument('--textures', type=int, default=4, help="building textures to spread them over")
+    parser.add_argument('--streaming', action='store_true')
+    args = parser.parse_args()
+
+    with redirect_stdout(sys.stderr):
+        from main import Game
+        from core.world import World
+        game = Game(width=640, height=360, streaming=args.streaming, render_mode='uncapped')
+    try:
+        if args.streaming:
+            # Let the first chunks arrive so the terrain actually draws
+            deadline = time.perf_counter() + 60
+            while not game.terrain.chunks_drawn and time.perf_counter() < deadline:
+                with redirect_stdout(sys.stderr):
+                    game.update()
+                    game.render()
+                time.sleep(0.05)
+        print(f"{'frame':>12} {'path':>10} {'calls':>7}  per frame")
+        with redirect_stdout(sys.stderr):
+            per_frame = measure(lambda: legacy_render(game, 0.5), args.frames, args.warmup)
+        report('Game.render', 'legacy', per_frame)
+        # The legacy path changed state behind the queue's cache
+        game.render_queue.cache.invalidate()
+        with redirect_stdout(sys.stderr):
+            per_frame = measure(lambda: game.render(0.5), args.frames, args.warmup)
+        report('Game.render', 'queued', per_frame)
+
+        world = World(textures=game.textures)
+        for i in range(args.buildings):
+            world.add_building(((i % 20) * 5 - 50, 0, (i // 20) * 5 - 50), (2, 3 + i % 4, 2),
+                               texture=f'building_{i % args.textures}')
+        report('World.draw', 'legacy', measure(lambda: legacy_world_draw(world), args.frames, args.warmup))
+        report('World.draw', 'standalone', measure(world.draw, args.frames, args.warmup))
+
+        # Through a long-lived queue, as Game.render uses it, the cache spans frames
+        queue = RenderQueue()
+
+        def queued():
+            world.submit(queue)
+            queue.flush()
+        report('World.draw', 'queued', measure(queued, args.frames, args.warmup))
+    finally:
+        with redirect_stdout(sys.stderr):
+            game.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Compare terrain build time and peak memory: legacy per-cell loop vs. batched builder.
+
+Run from the repository root:
+
+    python game/benchmarks/terrain_build.py --sizes 64 128 256 512
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from noise import snoise2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.heightmap import generate_height_map, build_mesh
+
+
+def legacy_build(size, cell_size=1.0):
+    # Verbatim port of the original Terrain.generate_terrain double loop
+    height_map = np.zeros((size, size))
+    for i in range(size):
+        for j in range(size):
+            height_map[i][j] = snoise2(i / 25.0, j / 25.0, 4, 0.5, 2.0)
+    height_map = (height_map - height_map.min()) / (height_map.max() - height_map.min())
+    height_map *= 2.0
+
+    def vertex(x, z):
+        return ((x - size / 2) * cell_size, height_map[x][z], (z - size / 2) * cell_size)
+
+    vertices, normals, texcoords = [], [], []
+    for z in range(size - 1):
+        for x in range(size - 1):
+            v1, v2, v3, v4 = vertex(x, z), vertex(x + 1, z), vertex(x + 1, z + 1), vertex(x, z + 1)
+            normal = np.cross(np.subtract(v2, v1), np.subtract(v3, v1))
+            length = np.linalg.norm(normal)
+            normal = (0, 1, 0) if length == 0 else normal / length
+            vertices.extend([v1, v2, v3, v4])
+            normals.extend([normal] * 4)
+            texcoords.extend([(x / 5, z / 5), ((x + 1) / 5, z / 5),
+                              ((x + 1) / 5, (z + 1) / 5), (x / 5, (z + 1) / 5)])
+    return height_map, vertices, normals, texcoords
+
+
+def batched_build(size, cell_size=1.0):
+    height_map = generate_height_map(size)
+    return (height_map,) + build_mesh(height_map, cell_size)
+
+
+def measure(builder, size):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = builder(size)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 128, 256, 512])
+    parser.add_argument('--legacy-max', type=int, default=512,
+                        help='skip the legacy builder above this size (it takes minutes)')
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'legacy s':>10} {'legacy MB':>10} {'batched s':>10} {'batched MB':>11} {'speedup':>8}")
+    for size in args.sizes:
+        new_time, new_peak = measure(batched_build, size)
+        if size <= args.legacy_max:
+            old_time, old_peak = measure(legacy_build, size)
+            print(f"{size:>6} {old_time:>10.3f} {old_peak / 2**20:>10.1f} "
+                  f"{new_time:>10.3f} {new_peak / 2**20:>11.1f} {old_time / new_time:>7.1f}x")
+        else:
+            print(f"{size:>6} {'-':>10} {'-':>10} {new_time:>10.3f} {new_peak / 2**20:>11.1f} {'-':>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Cold vs. warm terrain startup with the memory-mapped heightmap cache.
+
+    python game/benchmarks/terrain_cache.py --sizes 256 512 1024
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.terrain import Terrain
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 512, 1024])
+    parser.add_argument('--cache-dir', default=None,
+                        help='cache directory (a temporary one is used and removed by default)')
+    args = parser.parse_args()
+
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix='terrain-cache-')
+    results = []
+    try:
+        for size in args.sizes:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            uncached = Terrain(size=size)
+            cold = Terrain(size=size, cache_dir=cache_dir)
+            warm = Terrain(size=size, cache_dir=cache_dir)
+            assert warm.cache_hit and not cold.cache_hit
+            results.append((size, uncached.build_time, cold.build_time, warm.build_time))
+    finally:
+        if args.cache_dir is None:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"\n{'size':>6} {'no cache s':>11} {'cold s':>8} {'warm s':>8} {'speedup':>8}")
+    for size, uncached, cold, warm in results:
+        print(f"{size:>6} {uncached:>11.3f} {cold:>8.3f} {warm:>8.3f} {uncached / warm:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
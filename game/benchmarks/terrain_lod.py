@@ -0,0 +1,79 @@
+"""Triangles submitted per frame as the map grows, with frustum culling and LOD.
+
+    python game/benchmarks/terrain_lod.py --sizes 64 256 1024
+"""
+import argparse
+import time
+
+# gl_stats puts game/ on sys.path so the core package resolves
+from gl_stats import setup_camera
+from core.headless import use_egl_platform, HeadlessContext
+
+use_egl_platform()
+
+from OpenGL.GL import glGenTextures, glFinish
+
+from core.terrain import Terrain
+from core.chunks import ChunkedTerrain
+from core.frustum import Frustum
+from core.entities.avatar import Avatar
+
+
+def camera(width, height):
+    avatar = Avatar(position=(0, 1, 0))
+    avatar.rotate(30)
+    eye, target = avatar.get_camera_position()
+    setup_camera(width, height, eye, target)
+    return Frustum.from_camera(eye, target, 45, width / height, 0.1, 150.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 256, 1024])
+    parser.add_argument('--view-radius', type=int, nargs='+', default=[2, 4, 8],
+                        help='chunk view radii to compare for the streaming terrain')
+    args = parser.parse_args()
+
+    width, height = 640, 480
+    context = HeadlessContext(width, height)
+    frustum = camera(width, height)
+    texture = glGenTextures(1)
+
+    print(f"{'terrain':>22} {'all tris':>10} {'submitted':>10} {'draw ms':>8}")
+    for size in args.sizes:
+        terrain = Terrain(size=size)
+        for label, view, lod_distance in (('static', None, None), ('static+cull', frustum, None),
+                                          ('static+cull+lod', frustum, terrain.lod_distance)):
+            terrain.lod_distance = lod_distance
+            terrain.draw(texture, view)
+            glFinish()
+            start = time.perf_counter()
+            terrain.draw(texture, view)
+            glFinish()
+            elapsed = time.perf_counter() - start
+            total = 2 * len(terrain.indices) // 3
+            print(f"{label + ' ' + str(size):>22} {total:>10} {terrain.triangles_drawn:>10} {elapsed * 1000:>8.2f}")
+        terrain.release()
+
+    for radius in args.view_radius:
+        terrain = ChunkedTerrain(view_radius=radius, workers=4)
+        while len(terrain.chunks) < (2 * radius + 1) ** 2:
+            terrain.update((0, 0, 0))
+            time.sleep(0.01)
+        terrain.max_uploads_per_frame = len(terrain.chunks)
+        terrain.draw(texture, frustum)
+        glFinish()
+        start = time.perf_counter()
+        terrain.draw(texture, frustum)
+        glFinish()
+        elapsed = time.perf_counter() - start
+        span = (2 * radius + 1) * terrain.chunk_size
+        total = 2 * 2 * len(terrain.chunks) * terrain.chunk_size ** 2
+        print(f"{'chunked+lod ' + str(span):>22} {total:>10} {terrain.triangles_drawn:>10} {elapsed * 1000:>8.2f}")
+        terrain.release()
+
+    context.release()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""Noise sampling time for a process pool of 1..N workers (shared-memory output).
+
+    python game/benchmarks/terrain_parallel.py --size 2048 --workers 1 2 4 8 16
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.heightmap import generate_height_map
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=1024)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count()])
+    args = parser.parse_args()
+
+    reference = None
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8} {'identical':>10}")
+    for workers in sorted(set(args.workers)):
+        start = time.perf_counter()
+        height_map = generate_height_map(args.size, workers=workers)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = (height_map, elapsed)
+        identical = height_map.tobytes() == reference[0].tobytes()
+        print(f"{workers:>8} {elapsed:>9.3f} {reference[1] / elapsed:>7.2f}x {str(identical):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""GL call count and frame time for immediate-mode vs. buffered terrain drawing.
+
+Runs offscreen under EGL, so it works with Mesa llvmpipe on a headless box:
+
+    python game/benchmarks/terrain_render.py --sizes 50 100 200 --frames 20
+"""
+import argparse
+import time
+
+# gl_stats puts game/ on sys.path so the core package resolves
+from gl_stats import CallCounter, setup_camera, percentile
+from core.headless import use_egl_platform, HeadlessContext
+
+use_egl_platform()
+
+from OpenGL.GL import glFinish, glClear, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT, glGenTextures
+
+import core.terrain as terrain_module
+import core.gl_buffers as gl_buffers_module
+from core.terrain import Terrain
+
+
+def run(terrain, frames, counter):
+    texture = glGenTextures(1)
+    terrain.draw(texture)  # warm-up, uploads buffers on the buffered path
+    glFinish()
+    counter.reset()
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        terrain.draw(texture)
+        glFinish()
+        times.append(time.perf_counter() - start)
+    return counter.count / frames, times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 100, 200])
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    args = parser.parse_args()
+
+    context = HeadlessContext(args.width, args.height)
+    setup_camera(args.width, args.height)
+    counter = CallCounter(terrain_module, gl_buffers_module)
+
+    print(f"{'size':>6} {'path':>10} {'GL calls/frame':>15} {'p50 ms':>9} {'p95 ms':>9}")
+    try:
+        for size in args.sizes:
+            for use_vbo in (False, True):
+                terrain = Terrain(size=size, use_vbo=use_vbo)
+                calls, times = run(terrain, args.frames, counter)
+                terrain.release()
+                label = 'buffered' if use_vbo else 'immediate'
+                print(f"{size:>6} {label:>10} {calls:>15.0f} "
+                      f"{percentile(times, 50) * 1000:>9.2f} {percentile(times, 95) * 1000:>9.2f}")
+    finally:
+        counter.restore()
+        context.release()
+
+
+if __name__ == '__main__':
+    main()
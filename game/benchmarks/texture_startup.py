@@ -0,0 +1,112 @@
+"""Texture startup time: main-thread PIL loading vs. TextureManager with a cold and warm cache.
+
+Writes a set of synthetic JPEGs (a few large tiling textures plus many small
+icons), then loads them three ways in an offscreen GL context:
+
+    python game/benchmarks/texture_startup.py --large 6 --large-size 1024 --small 40
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+# gl_stats puts game/ on sys.path so the core package resolves
+from gl_stats import percentile
+from core.headless import use_egl_platform, HeadlessContext
+
+use_egl_platform()
+
+from OpenGL.GL import *
+
+from core.textures import TextureManager
+
+
+def write_images(root, large, large_size, small, small_size):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(large + small):
+        size = large_size if i < large else small_size
+        # Smooth noise compresses like a real photo texture rather than like static
+        coarse = rng.integers(0, 256, (size // 16 + 1, size // 16 + 1, 3), dtype=np.uint8)
+        image = Image.fromarray(coarse).resize((size, size), Image.BILINEAR)
+        path = os.path.join(root, f'texture_{i:03d}.jpg')
+        image.save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def load_on_main_thread(paths):
+    # Game._load_textures before the texture manager
+    ids = []
+    for path in paths:
+        image = Image.open(path)
+        ix, iy = image.size
+        data = image.tobytes('raw', 'RGBX', 0, -1)
+        texid = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, texid)
+        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexImage2D(GL_TEXTURE_2D, 0, 3, ix, iy, 0, GL_RGBA, GL_UNSIGNED_BYTE, data)
+        ids.append(texid)
+    glFinish()
+    glDeleteTextures(ids)
+
+
+def load_with_manager(paths, cache_dir, large, frame_time, workers):
+    manager = TextureManager(cache_dir=cache_dir, workers=workers)
+    for i, path in enumerate(paths):
+        manager.request(f'texture_{i}', path, repeat=i < large)
+    # Game loop stand-in: upload within budget, then leave the rest of the frame to the game
+    frames = []
+    while manager.ready_time is None:
+        start = time.perf_counter()
+        manager.upload_pending()
+        glFinish()
+        elapsed = time.perf_counter() - start
+        frames.append(elapsed)
+        time.sleep(max(0.0, frame_time - elapsed))
+    ready = manager.ready_time
+    summary = manager.summary()
+    manager.release()
+    return ready, frames, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--large', type=int, default=6)
+    parser.add_argument('--large-size', type=int, default=1024)
+    parser.add_argument('--small', type=int, default=40)
+    parser.add_argument('--small-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--fps', type=float, default=60.0)
+    args = parser.parse_args()
+
+    context = HeadlessContext(64, 64)
+    root = tempfile.mkdtemp(prefix='texture-bench-')
+    try:
+        paths = write_images(root, args.large, args.large_size, args.small, args.small_size)
+        cache_dir = os.path.join(root, 'cache')
+
+        start = time.perf_counter()
+        load_on_main_thread(paths)
+        blocking = time.perf_counter() - start
+        print(f"{'path':>14} {'ready ms':>10} {'main-thread max ms/frame':>25} {'p95 ms/frame':>13}")
+        print(f"{'main thread':>14} {blocking * 1000:>10.1f} {blocking * 1000:>25.1f} {'-':>13}")
+
+        for label in ('cold cache', 'warm cache'):
+            ready, frames, summary = load_with_manager(paths, cache_dir, args.large,
+                                                       1.0 / args.fps, args.workers)
+            print(f"{label:>14} {ready * 1000:>10.1f} {max(frames) * 1000:>25.1f} "
+                  f"{percentile(frames, 95) * 1000:>13.2f}")
+            print(f"{'':>14} {summary}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        context.release()
+
+
+if __name__ == '__main__':
+    main()
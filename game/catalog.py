@@ -0,0 +1,49 @@
+"""Content-version counter for the location and dialogue catalog.
+
+Every save or delete of a Location or Dialogue bumps the version (see
+signals.py), so cached API responses keyed on it go stale at once without
+tracking which ones an edit touched. Queryset update() and bulk_create()
+send no signals; call bump_catalog_version() after using them.
+
+The counter lives in Django's cache. With more than one server process
+that must be a shared backend (Memcached, Redis, database); the default
+local-memory cache is per process.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'game:catalog:version'
+
+
+def _seed_version():
+    # The key can vanish (culled, evicted, cache restarted) while responses cached
+    # under it live on; restarting from a fixed number would make those reachable
+    # again, so restart from one no earlier counter can have reached
+    seed = time.time_ns()
+    cache.add(VERSION_KEY, seed, timeout=None)
+    return cache.get(VERSION_KEY, seed)
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = _seed_version()
+    return version
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        _seed_version()
+        return cache.incr(VERSION_KEY)
+
+
+def catalog_cache_key(path):
+    return f'game:catalog:{catalog_version()}:{path}'
+
+
+def catalog_cache_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60)
@@ -0,0 +1,227 @@
+"""Background client for the Django REST API under /api/.
+
+The game loop never waits on the network: get() and post() only queue a
+request, worker threads run it over a kept-alive HTTP connection each, and
+finished results wait in a queue until poll() hands them to their callbacks
+on the game's thread.
+
+    api = ApiClient('http://127.0.0.1:8000', username='ana', password='...')
+    api.get('/api/locations/', callback=on_locations, max_age=60)
+    ...
+    api.poll()  # once a frame
+
+Identical GETs already in flight are coalesced into one request, and GET
+responses are cached for `max_age` seconds so repeated lookups answer from
+memory. POSTs are never cached or coalesced; pass `invalidates` to drop
+cached GETs they make stale.
+"""
+import http.client
+import json
+import queue
+import threading
+import time
+from collections import namedtuple
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+# status is None when the request never got a response; error says why
+ApiResult = namedtuple('ApiResult', 'method path status data error elapsed cached')
+
+_RETRYABLE = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class ApiClient:
+    def __init__(self, base_url, username=None, password=None, workers=2, timeout=10.0):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port
+        self.secure = url.scheme == 'https'
+        self.timeout = timeout
+        self.results = queue.Queue()   # Finished ApiResults with their callbacks, for poll()
+        self.connections_opened = 0
+        self.requests_sent = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()  # Guards the cookies, cache and in-flight table
+        self._cookies = {}
+        self._cache = {}               # GET key -> (expires at, ApiResult)
+        self._in_flight = {}           # GET key -> callbacks waiting on it
+        self._ready = threading.Event()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._worker, args=(i, username, password),
+                                          name=f'api-{i}', daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def get(self, path, params=None, callback=None, max_age=0):
+        """Queue a GET. A cached response younger than `max_age` seconds is reused."""
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] > time.monotonic():
+                self.cache_hits += 1
+                self.results.put((callback, cached[1]._replace(elapsed=0.0, cached=True)))
+                return
+            waiting = self._in_flight.get(path)
+            if waiting is not None:
+                self.coalesced += 1
+                waiting.append((callback, max_age))
+                return
+            self._in_flight[path] = [(callback, max_age)]
+        self._jobs.put(('GET', path, None, path))
+
+    def post(self, path, data=None, callback=None, invalidates=()):
+        """Queue a POST of `data` as JSON; cached GETs starting with any of `invalidates` are dropped."""
+        self._jobs.put(('POST', path, data, (callback, tuple(invalidates))))
+
+    def invalidate(self, prefix=''):
+        with self._lock:
+            for key in [k for k in self._cache if k.startswith(prefix)]:
+                del self._cache[key]
+
+    def poll(self, limit=None):
+        """Run callbacks for finished requests on the calling thread; never blocks."""
+        handled = []
+        while limit is None or len(handled) < limit:
+            try:
+                callback, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if callback is not None:
+                callback(result)
+            handled.append(result)
+        return handled
+
+    def close(self, wait=1.0):
+        # Workers are daemon threads, so one stuck on a slow request cannot hold up exit
+        self._closed = True
+        self._ready.set()
+        for _ in self._threads:
+            self._jobs.put(None)
+        deadline = time.monotonic() + wait
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+
+    # Worker threads
+
+    def _worker(self, index, username, password):
+        connection = None
+        if index == 0:
+            # Everyone waits for the session cookie before sending API requests
+            if username is not None:
+                connection = self._login(username, password)
+            self._ready.set()
+        self._ready.wait()
+        while True:
+            job = self._jobs.get()
+            if job is None or self._closed:
+                break
+            method, path, data, context = job
+            start = time.monotonic()
+            connection, status, body, error = self._send(connection, method, path, data)
+            result = ApiResult(method, path, status, body, error, time.monotonic() - start, False)
+            if method == 'GET':
+                self._finish_get(context, result)
+            else:
+                callback, invalidates = context
+                if status is not None and status < 400:
+                    for prefix in invalidates:
+                        self.invalidate(prefix)
+                self.results.put((callback, result))
+        if connection is not None:
+            connection.close()
+
+    def _finish_get(self, key, result):
+        with self._lock:
+            waiting = self._in_flight.pop(key)
+            max_age = max(age for _, age in waiting)
+            if max_age and result.status == 200:
+                self._cache[key] = (time.monotonic() + max_age, result)
+        for callback, _ in waiting:
+            self.results.put((callback, result))
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+        with self._lock:
+            self.connections_opened += 1
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _send(self, connection, method, path, data, form=False):
+        """Send one request on `connection` (reconnecting if needed).
+
+        Returns (connection, status, decoded body, error).
+        """
+        headers = {'Accept': 'application/json'}
+        body = None
+        if data is not None:
+            if form:
+                body = urlencode(data)
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            else:
+                body = json.dumps(data)
+                headers['Content-Type'] = 'application/json'
+        with self._lock:
+            if self._cookies:
+                headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self._cookies.items())
+            if method != 'GET' and 'csrftoken' in self._cookies:
+                headers['X-CSRFToken'] = self._cookies['csrftoken']
+
+        for attempt in range(2):
+            reused = connection is not None
+            if connection is None:
+                connection = self._connect()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                payload = response.read()
+            except _RETRYABLE as e:
+                # The server closed a kept-alive connection between requests; retry
+                # once on a fresh one
+                connection.close()
+                connection = None
+                if reused and attempt == 0:
+                    continue
+                return None, None, None, str(e) or type(e).__name__
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                return None, None, None, str(e) or type(e).__name__
+            break
+        self._store_cookies(response.headers.get_all('Set-Cookie') or ())
+        if response.will_close:
+            connection.close()
+            connection = None
+
+        decoded = None
+        if payload and response.headers.get_content_type() == 'application/json':
+            try:
+                decoded = json.loads(payload)
+            except ValueError:
+                pass
+        error = None if response.status < 400 else f"HTTP {response.status}"
+        return connection, response.status, decoded, error
+
+    def _store_cookies(self, headers):
+        with self._lock:
+            self.requests_sent += 1
+            for header in headers:
+                for name, morsel in SimpleCookie(header).items():
+                    self._cookies[name] = morsel.value
+
+    def _login(self, username, password):
+        # Session login through DRF's login page, which also sets the CSRF cookie
+        # that later POSTs must echo back
+        connection, status, _, error = self._send(None, 'GET', '/api-auth/login/', None)
+        if status is not None:
+            form = {'username': username, 'password': password,
+                    'csrfmiddlewaretoken': self._cookies.get('csrftoken', '')}
+            connection, status, _, error = self._send(connection, 'POST', '/api-auth/login/',
+                                                      form, form=True)
+        with self._lock:
+            logged_in = 'sessionid' in self._cookies
+        if not logged_in:
+            self.results.put((None, ApiResult('POST', '/api-auth/login/', status, None,
+                                              error or "login failed", 0.0, False)))
+        return connection
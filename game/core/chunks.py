@@ -0,0 +1,337 @@
+import math
+import multiprocessing
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from OpenGL.GL import *
+
+from .heightmap import (sample_noise, compute_normals, build_mesh, sample_heights,
+                        sample_gradients, gradients_to_normals)
+from .gl_buffers import MeshBuffer, IndexBuffer
+from .lod import lod_indices, max_level, select_levels, constrain_levels
+from .profiler import profiler, RateLimitedLogger
+from .render_queue import RenderState, WIREFRAME, OVERLAY, draw_now
+
+log = RateLimitedLogger(__name__)
+
+
+def generate_chunk(seed, cx, cz, chunk_size, cell_size=1.0, noise_scale=25.0, octaves=4,
+                   persistence=0.5, lacunarity=2.0, max_height=2.0):
+    """Generate one chunk's height map and mesh arrays; runs in a worker process.
+
+    Samples are taken at global grid coordinates, so the shared edge between
+    neighbouring chunks is evaluated from identical inputs and the seams match.
+    A one-sample border is generated so normals on the edges match as well.
+    """
+    start = time.perf_counter()
+    x0, z0 = cx * chunk_size, cz * chunk_size
+    xs = np.arange(x0 - 1, x0 + chunk_size + 2)
+    zs = np.arange(z0 - 1, z0 + chunk_size + 2)
+    elevation = sample_noise(xs, zs, noise_scale, octaves, persistence, lacunarity, base=seed)
+
+    # Fixed normalization: chunks never see the global min/max
+    padded = ((elevation + 1.0) * 0.5 * max_height).astype(np.float32)
+    normals = compute_normals(padded, cell_size)[1:-1, 1:-1]
+    height_map = np.ascontiguousarray(padded[1:-1, 1:-1])
+
+    vertices, normals, texcoords, _ = build_mesh(
+        height_map, cell_size, origin=(x0, z0), normals=normals)
+    return cx, cz, height_map, vertices, normals, texcoords, time.perf_counter() - start
+
+
+class Chunk:
+    def __init__(self, cx, cz, height_map, vertices, normals, texcoords):
+        self.cx = cx
+        self.cz = cz
+        self.height_map = height_map  # (chunk_size + 1) samples per side, indexed [x, z]
+        self.vertices = vertices
+        self.normals = normals
+        self.texcoords = texcoords
+        self.mins = vertices.min(axis=0)
+        self.maxs = vertices.max(axis=0)
+        self.center = (self.mins + self.maxs) / 2
+        self.mesh = None
+
+    def upload(self):
+        # Indices are shared per LOD level, so only vertex data lives with the chunk
+        self.mesh = MeshBuffer(self.vertices, self.normals, self.texcoords)
+
+    def release(self):
+        if self.mesh is not None:
+            self.mesh.delete()
+            self.mesh = None
+
+
+class ChunkMetrics:
+    def __init__(self, window=256):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.cancelled = 0
+        self.failed = 0        # Worker raised; the chunk is requested again next update
+        self.generated = 0
+        self.latencies = deque(maxlen=window)      # submit -> ready on the main thread
+        self.build_times = deque(maxlen=window)    # time spent inside the worker
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'cancelled': self.cancelled,
+            'failed': self.failed,
+            'generated': self.generated,
+            'latency_avg_ms': 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            'latency_p95_ms': 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+            'build_avg_ms': 1000 * sum(self.build_times) / len(self.build_times) if self.build_times else 0.0,
+        }
+
+
+class ChunkedTerrain:
+    """Terrain streamed in fixed-size chunks around a focus point.
+
+    Chunks are generated in a process pool and kept in a bounded LRU cache.
+    `update` only submits work and collects finished results, so it never
+    blocks the game loop; areas that are not ready yet report height 0.
+    With `blocking` set, sampling waits for (or generates) the chunks it
+    needs instead, so heights never depend on how far the workers have got;
+    recording and replaying input rely on that.
+    Drawing culls chunks against the view frustum and picks a geomipmap level
+    per chunk from its distance to the camera (see core/lod.py).
+    """
+
+    def __init__(self, seed=0, chunk_size=32, scale=1, view_radius=3, max_chunks=None,
+                 workers=2, max_uploads_per_frame=2, executor=None, blocking=False):
+        self.seed = seed
+        self.blocking = blocking
+        self.chunk_size = chunk_size
+        self.scale = scale
+        self.view_radius = view_radius
+        self.noise_scale = 25.0
+        self.octaves = 4
+        self.persistence = 0.5
+        self.lacunarity = 2.0
+        self.max_height = 2.0
+        visible = (2 * view_radius + 1) ** 2
+        self.max_chunks = max(max_chunks or 2 * visible, visible)
+        self.max_uploads_per_frame = max_uploads_per_frame
+        self.lod_distance = chunk_size * scale  # Full detail within one chunk of the camera
+        self.max_lod = max_level(chunk_size)
+        self.wireframe = True
+        self.focus = (0.0, 0.0, 0.0)
+        self.triangles_drawn = 0     # Triangles submitted by the last draw()
+        self.chunks_drawn = 0
+        self._index_buffers = {}     # (level, coarser edge mask) -> IndexBuffer
+        self.chunks = OrderedDict()  # (cx, cz) -> Chunk, least recently used first
+        self.pending = {}            # (cx, cz) -> (future, submit time)
+        self.metrics = ChunkMetrics()
+        self._owns_executor = executor is None
+        self.executor = executor or ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def chunk_key(self, x, z):
+        span = self.chunk_size * self.scale
+        return math.floor(x / span), math.floor(z / span)
+
+    def wanted_keys(self, x, z):
+        cx, cz = self.chunk_key(x, z)
+        r = self.view_radius
+        keys = [(cx + dx, cz + dz) for dz in range(-r, r + 1) for dx in range(-r, r + 1)]
+        # Nearest chunks first so they are generated first
+        keys.sort(key=lambda k: (k[0] - cx) ** 2 + (k[1] - cz) ** 2)
+        return keys
+
+    def update(self, position):
+        self.focus = tuple(position)
+        wanted = self.wanted_keys(position[0], position[2])
+        wanted_set = set(wanted)
+
+        for key in wanted:
+            if key in self.chunks:
+                self.chunks.move_to_end(key)
+                self.metrics.hits += 1
+            elif key not in self.pending:
+                self.metrics.misses += 1
+                self._submit(key)
+
+        # Drop queued work that has fallen out of range before it starts
+        for key in [k for k in self.pending if k not in wanted_set]:
+            future, _ = self.pending[key]
+            if future.cancel():
+                del self.pending[key]
+                self.metrics.cancelled += 1
+
+        self._collect()
+        self._evict(wanted_set)
+
+    def _generate_args(self, key):
+        return (self.seed, key[0], key[1], self.chunk_size, self.scale, self.noise_scale,
+                self.octaves, self.persistence, self.lacunarity, self.max_height)
+
+    def _submit(self, key):
+        future = self.executor.submit(generate_chunk, *self._generate_args(key))
+        self.pending[key] = (future, time.perf_counter())
+
+    def load_now(self, key):
+        """The chunk at `key`, waiting for its worker or generating it on this thread."""
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            return chunk
+        future, submitted = self.pending.pop(key, (None, time.perf_counter()))
+        result = None
+        if future is None:
+            self.metrics.misses += 1
+        elif not future.cancel():  # Already running: its result is as good as ours
+            try:
+                result = future.result()
+            except Exception as e:
+                self.metrics.failed += 1
+                log.warning('generate', "Chunk %s failed to generate: %r", key, e)
+        if result is None:
+            result = generate_chunk(*self._generate_args(key))
+        return self._add(key, result, submitted)
+
+    def _add(self, key, result, submitted):
+        cx, cz, height_map, vertices, normals, texcoords, build_time = result
+        chunk = self.chunks[key] = Chunk(cx, cz, height_map, vertices, normals, texcoords)
+        self.metrics.generated += 1
+        self.metrics.build_times.append(build_time)
+        self.metrics.latencies.append(time.perf_counter() - submitted)
+        return chunk
+
+    def _collect(self):
+        for key in [k for k, (future, _) in self.pending.items() if future.done()]:
+            future, submitted = self.pending.pop(key)
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                # Dropped from pending, so the next update() submits it again if still wanted
+                self.metrics.failed += 1
+                log.warning('generate', "Chunk %s failed to generate: %r", key, e)
+                continue
+            self._add(key, result, submitted)
+
+    def _evict(self, wanted_set):
+        while len(self.chunks) > self.max_chunks:
+            key, chunk = next(iter(self.chunks.items()))
+            if key in wanted_set:
+                break
+            del self.chunks[key]
+            chunk.release()
+            self.metrics.evictions += 1
+
+    def index_buffer(self, level, mask):
+        key = (level, mask)
+        if key not in self._index_buffers:
+            self._index_buffers[key] = IndexBuffer(lod_indices(self.chunk_size, level, mask))
+        return self._index_buffers[key]
+
+    def draw(self, grass_texture, frustum=None, color=(1.0, 1.0, 1.0)):
+        draw_now(self.submit, grass_texture, frustum, color)
+
+    def submit(self, queue, grass_texture, frustum=None, color=(1.0, 1.0, 1.0)):
+        # Spread GPU uploads over frames so a burst of new chunks cannot stall one
+        uploads = 0
+        ready = []
+        for chunk in self.chunks.values():
+            if chunk.mesh is None:
+                if uploads >= self.max_uploads_per_frame:
+                    continue
+                chunk.upload()
+                uploads += 1
+            ready.append(chunk)
+
+        self.triangles_drawn = 0
+        self.chunks_drawn = 0
+        if not ready:
+            return
+
+        if frustum is not None:
+            visible = frustum.visible_aabbs([c.mins for c in ready], [c.maxs for c in ready])
+            ready = [chunk for chunk, keep in zip(ready, visible) if keep]
+            if not ready:
+                return
+        eye = frustum.eye if frustum is not None and frustum.eye is not None else self.focus
+        levels = select_levels([c.center for c in ready], eye, self.lod_distance, self.max_lod)
+        levels = {(c.cx, c.cz): int(level) for c, level in zip(ready, levels)}
+        masks = constrain_levels(levels)
+        batches = [(chunk, self.index_buffer(levels[(chunk.cx, chunk.cz)], masks[(chunk.cx, chunk.cz)]))
+                   for chunk in ready]
+        self.chunks_drawn = len(batches)
+        triangles = sum(indices.count for _, indices in batches) // 3
+        self.triangles_drawn = 2 * triangles if self.wireframe else triangles
+
+        queue.submit(RenderState(texture=grass_texture), lambda: self._draw_batches(batches, color),
+                     name='terrain')
+        if self.wireframe:
+            queue.submit(WIREFRAME, lambda: self._draw_batches(batches, (1, 1, 1), wireframe=True),
+                         OVERLAY, 'terrain.wireframe')
+
+    def _draw_batches(self, batches, color, wireframe=False):
+        glColor3f(*color)
+        vertices = 0
+        for chunk, indices in batches:
+            chunk.mesh.bind(normals=not wireframe, texcoords=not wireframe)
+            indices.bind()
+            indices.draw_bound()
+            vertices += indices.count
+        batches[-1][0].mesh.unbind()
+        profiler.count('draw_calls', len(batches))
+        profiler.count('vertices', vertices)
+
+    def _sample(self, xs, zs, sampler, outputs):
+        # Route each query to its chunk; positions in chunks that are not loaded yet get 0
+        # unless blocking, which loads them first
+        gx = np.asarray(xs, dtype=np.float64) / self.scale
+        gz = np.asarray(zs, dtype=np.float64) / self.scale
+        shape = np.broadcast(gx, gz).shape
+        gx, gz = np.broadcast_to(gx, shape).ravel(), np.broadcast_to(gz, shape).ravel()
+        results = [np.zeros(len(gx)) for _ in range(outputs)]
+        cx = np.floor(gx / self.chunk_size).astype(np.int64)
+        cz = np.floor(gz / self.chunk_size).astype(np.int64)
+        keys, inverse = np.unique(np.stack([cx, cz], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        for i, (key_x, key_z) in enumerate(keys):
+            key = (int(key_x), int(key_z))
+            chunk = self.load_now(key) if self.blocking else self.chunks.get(key)
+            if chunk is None:
+                continue
+            rows = np.nonzero(inverse == i)[0]
+            values = sampler(chunk.height_map,
+                             gx[rows] - key_x * self.chunk_size,
+                             gz[rows] - key_z * self.chunk_size)
+            for out, value in zip(results, values):
+                out[rows] = value
+        return [out.reshape(shape) for out in results]
+
+    def get_heights(self, xs, zs):
+        return self._sample(xs, zs, lambda hm, gx, gz: (sample_heights(hm, gx, gz),), 1)[0]
+
+    def get_slopes(self, xs, zs):
+        dh_dx, dh_dz = self._sample(
+            xs, zs, lambda hm, gx, gz: sample_gradients(hm, gx, gz, self.scale), 2)
+        return dh_dx, dh_dz
+
+    def get_normals(self, xs, zs):
+        return gradients_to_normals(*self.get_slopes(xs, zs))
+
+    def get_height(self, x, z):
+        return float(self.get_heights(x, z))
+
+    def release(self):
+        for chunk in self.chunks.values():
+            chunk.release()
+        self.chunks.clear()
+        for indices in self._index_buffers.values():
+            indices.delete()
+        self._index_buffers.clear()
+        for future, _ in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        if self._owns_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -3,17 +3,60 @@ from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import numpy as np
+from .store import EntityStore
+from .avatar_renderer import shared_renderer
+from ..profiler import RateLimitedLogger
+
+log = RateLimitedLogger(__name__)
 
 class Avatar:
-    def __init__(self, position=(0, 0, 0)):
-        self.position = list(position)
-        self.rotation = 0
-        self.height = 1.8
+    # A view over one row of an EntityStore; pass a shared store to have
+    # EntityStore.update drive many avatars in one vectorized step
+    def __init__(self, position=(0, 0, 0), store=None):
+        self.store = store if store is not None else EntityStore(capacity=1)
+        self.index = self.store.add(position, height=1.8)
         self.radius = 0.3
-        self.animation_state = 'idle'
-        self.animation_frame = 0
-        self.walking = False
-        print(f"Avatar initialized at position {position}")
+        log.debug('init', "Avatar initialized at position %s", tuple(position))
+        
+    @property
+    def position(self):
+        return self.store.positions[self.index]
+    
+    @position.setter
+    def position(self, value):
+        self.store.positions[self.index] = value
+        
+    @property
+    def rotation(self):
+        return float(self.store.rotations[self.index])
+    
+    @rotation.setter
+    def rotation(self, value):
+        self.store.rotations[self.index] = value
+        
+    @property
+    def height(self):
+        return float(self.store.heights[self.index])
+    
+    @height.setter
+    def height(self, value):
+        self.store.heights[self.index] = value
+        
+    @property
+    def animation_frame(self):
+        return int(self.store.animation_frames[self.index])
+    
+    @property
+    def walking(self):
+        return bool(self.store.walking[self.index])
+    
+    @walking.setter
+    def walking(self, value):
+        self.store.walking[self.index] = value
+        
+    @property
+    def animation_state(self):
+        return 'walk' if self.walking else 'idle'
         
     def update(self, terrain):
         # Update avatar height based on terrain
@@ -22,106 +65,44 @@ class Avatar:
         
         # Update animation
         if self.walking:
-            self.animation_frame = (self.animation_frame + 1) % 60
-            self.animation_state = 'walk'
-        else:
-            self.animation_state = 'idle'
+            frames = self.store.animation_frames
+            frames[self.index] = (frames[self.index] + 1) % EntityStore.ANIMATION_FRAMES
             
     def draw(self):
-        glPushMatrix()
-        glTranslatef(*self.position)
-        glRotatef(self.rotation, 0, 1, 0)
-        
-        # Draw direction indicator (arrow)
-        glDisable(GL_LIGHTING)
-        glColor3f(1, 1, 0)  # Yellow
-        glBegin(GL_LINES)
-        glVertex3f(0, self.height/2, 0)
-        glVertex3f(0, self.height/2, self.radius * 2)
-        glVertex3f(0, self.height/2, self.radius * 2)
-        glVertex3f(0.2, self.height/2, self.radius * 1.5)
-        glVertex3f(0, self.height/2, self.radius * 2)
-        glVertex3f(-0.2, self.height/2, self.radius * 1.5)
-        glEnd()
-        glEnable(GL_LIGHTING)
-        
-        # Draw body (cylinder)
-        glColor3f(0.3, 0.3, 1.0)  # Blue color
-        quad = gluNewQuadric()
-        gluQuadricNormals(quad, GLU_SMOOTH)
-        glRotatef(90, 1, 0, 0)  # Rotate to stand upright
-        gluCylinder(quad, self.radius, self.radius, self.height, 16, 1)
-        
-        # Draw head (sphere)
-        glRotatef(-90, 1, 0, 0)  # Rotate back
-        glTranslatef(0, self.height * 0.8, 0)
-        glColor3f(1.0, 0.8, 0.6)  # Skin color
-        quad = gluNewQuadric()
-        gluQuadricNormals(quad, GLU_SMOOTH)
-        gluSphere(quad, self.radius * 0.7, 16, 16)
-        
-        glPopMatrix()
-        
-        # Draw debug info
-        self._draw_debug_info()
-        
-    def _draw_debug_info(self):
-        # Draw position marker
-        glDisable(GL_LIGHTING)
-        glColor3f(1, 0, 0)  # Red
-        glPointSize(5.0)
-        glBegin(GL_POINTS)
-        glVertex3f(*self.position)
-        glEnd()
-        
-        # Draw view direction
-        glColor3f(1, 1, 0)  # Yellow
-        glBegin(GL_LINES)
-        start = self.position
-        angle = np.radians(self.rotation)
-        end = [
-            start[0] + np.sin(angle) * 2,
-            start[1],
-            start[2] + np.cos(angle) * 2
-        ]
-        glVertex3f(*start)
-        glVertex3f(*end)
-        glEnd()
-        glEnable(GL_LIGHTING)
+        # Body, head and debug overlay come from meshes cached on the GPU;
+        # draw a whole EntityStore through AvatarRenderer.draw_store to batch them
+        shared_renderer().draw_store(self.store, [self.index])
         
     def move(self, forward, right):
-        # Calculate movement direction based on rotation
-        angle = np.radians(self.rotation)
-        dx = np.sin(angle) * forward + np.cos(angle) * right
-        dz = np.cos(angle) * forward - np.sin(angle) * right
-        
-        speed = 0.1
-        self.position[0] += dx * speed
-        self.position[2] += dz * speed
-        
-        self.walking = forward != 0 or right != 0
+        # Move relative to facing direction
+        self.store.move(self.index, forward, right, speed=0.1)
         if self.walking:
-            print(f"Moving to position: {self.position}")
+            log.debug('move', "Moving to position: %s", self.position)
         
     def rotate(self, angle):
-        self.rotation = (self.rotation + angle) % 360
+        self.store.rotate(self.index, angle)
         
-    def get_camera_position(self):
-        # Position camera behind and slightly above avatar
-        angle = np.radians(self.rotation)
+    def get_camera_position(self, alpha=None):
+        # Position camera behind and slightly above avatar; alpha follows the
+        # interpolated render position instead of the last simulated one
+        if alpha is None:
+            position, rotation = self.position, self.rotation
+        else:
+            position, rotation = self.store.interpolated(alpha, self.index)
+        angle = np.radians(rotation)
         camera_distance = 5
         camera_height = 3  # Increased height for better view
         
         camera_pos = [
-            self.position[0] - np.sin(angle) * camera_distance,
-            self.position[1] + camera_height,
-            self.position[2] - np.cos(angle) * camera_distance
+            position[0] - np.sin(angle) * camera_distance,
+            position[1] + camera_height,
+            position[2] - np.cos(angle) * camera_distance
         ]
         
         look_at = [
-            self.position[0],
-            self.position[1] + 1,
-            self.position[2]
+            position[0],
+            position[1] + 1,
+            position[2]
         ]
         
         return camera_pos, look_at
\ No newline at end of file
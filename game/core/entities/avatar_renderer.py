@@ -0,0 +1,281 @@
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GL import shaders
+
+from ..gl_buffers import MeshBuffer, interleave
+from ..profiler import profiler
+from ..render_queue import DEFAULT_STATE, UNLIT, draw_now
+
+BODY_COLOR = (0.3, 0.3, 1.0)
+HEAD_COLOR = (1.0, 0.8, 0.6)
+ARROW_COLOR = (1.0, 1.0, 0.0)
+MARKER_COLOR = (1.0, 0.0, 0.0)
+
+# Fixed-function lighting for one directional light, with the per-instance
+# Y rotation and translation that glRotatef/glTranslatef used to apply
+_VERTEX_SHADER = """
+#version 120
+attribute vec4 instance;  // xyz = position, w = rotation around Y in radians
+varying vec4 color;
+
+void main() {
+    float c = cos(instance.w);
+    float s = sin(instance.w);
+    vec3 p = vec3(c * gl_Vertex.x + s * gl_Vertex.z, gl_Vertex.y, -s * gl_Vertex.x + c * gl_Vertex.z);
+    vec3 n = vec3(c * gl_Normal.x + s * gl_Normal.z, gl_Normal.y, -s * gl_Normal.x + c * gl_Normal.z);
+    gl_Position = gl_ModelViewProjectionMatrix * vec4(p + instance.xyz, 1.0);
+
+    vec3 normal = normalize(gl_NormalMatrix * n);
+    vec3 light = normalize(gl_LightSource[0].position.xyz);
+    float diffuse = max(dot(normal, light), 0.0);
+    vec3 lit = gl_LightModel.ambient.rgb + gl_LightSource[0].ambient.rgb
+              + gl_LightSource[0].diffuse.rgb * diffuse;
+    color = vec4(gl_Color.rgb * lit, gl_Color.a);
+}
+"""
+
+_FRAGMENT_SHADER = """
+#version 120
+varying vec4 color;
+
+void main() {
+    gl_FragColor = color;
+}
+"""
+
+
+def cylinder_mesh(radius, height, slices=16):
+    # gluCylinder along +Z followed by glRotatef(90, 1, 0, 0): the body hangs
+    # from the entity origin down to -height
+    angles = np.linspace(0, 2 * np.pi, slices + 1)
+    ring = np.stack([np.sin(angles), np.zeros_like(angles), np.cos(angles)], axis=1)
+    top = ring * radius
+    bottom = top + (0, -height, 0)
+    vertices = np.concatenate([top, bottom]).astype(np.float32)
+    normals = np.concatenate([ring, ring]).astype(np.float32)
+    i = np.arange(slices, dtype=np.uint32)
+    n = slices + 1
+    indices = np.stack([i, i + n, i + 1, i + 1, i + n, i + n + 1], axis=1).ravel()
+    return vertices, normals, np.ascontiguousarray(indices, dtype=np.uint32)
+
+
+def sphere_mesh(radius, center, slices=16, stacks=16):
+    theta = np.linspace(0, np.pi, stacks + 1)[:, None]
+    phi = np.linspace(0, 2 * np.pi, slices + 1)[None, :]
+    normals = np.stack([
+        np.sin(theta) * np.sin(phi),
+        np.cos(theta) * np.ones_like(phi),
+        np.sin(theta) * np.cos(phi),
+    ], axis=-1).reshape(-1, 3)
+    vertices = normals * radius + np.asarray(center)
+    n = slices + 1
+    rows, cols = np.meshgrid(np.arange(stacks), np.arange(slices), indexing='ij')
+    a = (rows * n + cols).ravel()
+    b = a + n
+    indices = np.stack([a, b, a + 1, a + 1, b, b + 1], axis=1).ravel()
+    return (vertices.astype(np.float32), normals.astype(np.float32),
+            np.ascontiguousarray(indices, dtype=np.uint32))
+
+
+def _rotate_y(points, radians):
+    # points (V, 3), radians (N,) -> (N, V, 3); same rotation as glRotatef(deg, 0, 1, 0)
+    c = np.cos(radians)[:, None]
+    s = np.sin(radians)[:, None]
+    x, y, z = points[:, 0], points[:, 1], points[:, 2]
+    out = np.empty((len(radians), len(points), 3), dtype=np.float32)
+    out[..., 0] = c * x + s * z
+    out[..., 1] = y
+    out[..., 2] = -s * x + c * z
+    return out
+
+
+class AvatarRenderer:
+    """Draws any number of avatars from meshes built once and kept on the GPU.
+
+    Uses instanced drawing with a small shader when the context supports it,
+    otherwise pre-transforms all instances on the CPU and issues one draw per
+    mesh type. Debug overlays for every avatar go out in a single pass.
+    """
+
+    INSTANCE_LOCATION = 1
+
+    def __init__(self, radius=0.3, height=1.8, instanced=None):
+        self.radius = radius
+        self.height = height
+        self.debug = True
+        body = cylinder_mesh(radius, height)
+        head = sphere_mesh(radius * 0.7, (0, height * 0.8, 0))
+        self.meshes = [(body, BODY_COLOR), (head, HEAD_COLOR)]
+        self.buffers = [MeshBuffer(v, n, indices=i) for (v, n, i), _ in self.meshes]
+        self.instance_vbo = glGenBuffers(1)
+        self.batch_vbo = None
+        self.batch_ibo = None
+        self.program = None
+        if instanced is None:
+            instanced = self.instancing_supported()
+        if instanced:
+            self.program = self._link_program()
+        self.instanced = self.program is not None
+
+    def _link_program(self):
+        vertex = shaders.compileShader(_VERTEX_SHADER, GL_VERTEX_SHADER)
+        fragment = shaders.compileShader(_FRAGMENT_SHADER, GL_FRAGMENT_SHADER)
+        program = glCreateProgram()
+        glAttachShader(program, vertex)
+        glAttachShader(program, fragment)
+        # Generic attribute 0 aliases gl_Vertex in the compatibility profile
+        glBindAttribLocation(program, self.INSTANCE_LOCATION, 'instance')
+        glLinkProgram(program)
+        glDeleteShader(vertex)
+        glDeleteShader(fragment)
+        if not glGetProgramiv(program, GL_LINK_STATUS):
+            log = glGetProgramInfoLog(program)
+            glDeleteProgram(program)
+            raise RuntimeError(f"Avatar shader failed to link: {log}")
+        return program
+
+    @staticmethod
+    def instancing_supported():
+        try:
+            return bool(glDrawElementsInstanced) and bool(glVertexAttribDivisor) and bool(glCreateShader)
+        except Exception:
+            return False
+
+    def draw_store(self, store, indices=None, alpha=None):
+        draw_now(self.submit_store, store, indices, alpha)
+
+    def submit_store(self, queue, store, indices=None, alpha=None):
+        # alpha interpolates between the last two simulation ticks (see core/timestep.py)
+        if indices is None:
+            indices = np.nonzero(store.alive[:store.count])[0]
+        if alpha is None:
+            positions, rotations = store.positions[indices], store.rotations[indices]
+        else:
+            positions, rotations = store.interpolated(alpha, indices)
+        self.submit(queue, positions.reshape(-1, 3), np.radians(rotations).reshape(-1))
+
+    def draw(self, positions, rotations):
+        """Draw avatars at `positions` (N, 3) facing `rotations` (N,) radians."""
+        draw_now(self.submit, positions, rotations)
+
+    def submit(self, queue, positions, rotations):
+        if len(positions) == 0:
+            return
+        if self.instanced:
+            queue.submit(DEFAULT_STATE, lambda: self._draw_instanced(positions, rotations), name='avatars')
+        else:
+            queue.submit(DEFAULT_STATE, lambda: self._draw_batched(positions, rotations), name='avatars')
+        if self.debug:
+            queue.submit(UNLIT, lambda: self._draw_debug(positions, rotations), name='avatars.debug')
+
+    def _draw_instanced(self, positions, rotations):
+        instances = np.empty((len(positions), 4), dtype=np.float32)
+        instances[:, :3] = positions
+        instances[:, 3] = rotations
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        glBufferData(GL_ARRAY_BUFFER, instances.nbytes, instances, GL_STREAM_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        glUseProgram(self.program)
+        for mesh, (_, color) in zip(self.buffers, self.meshes):
+            glColor3f(*color)
+            mesh.bind(texcoords=False)
+            glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+            glEnableVertexAttribArray(self.INSTANCE_LOCATION)
+            glVertexAttribPointer(self.INSTANCE_LOCATION, 4, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
+            glVertexAttribDivisor(self.INSTANCE_LOCATION, 1)
+            glDrawElementsInstanced(GL_TRIANGLES, mesh.indices.count, GL_UNSIGNED_INT,
+                                    ctypes.c_void_p(0), len(positions))
+            profiler.count('draw_calls')
+            profiler.count('vertices', mesh.indices.count * len(positions))
+            glVertexAttribDivisor(self.INSTANCE_LOCATION, 0)
+            glDisableVertexAttribArray(self.INSTANCE_LOCATION)
+            mesh.unbind()
+        glUseProgram(0)
+
+    def _draw_batched(self, positions, rotations):
+        if self.batch_vbo is None:
+            self.batch_vbo = glGenBuffers(1)
+            self.batch_ibo = glGenBuffers(1)
+        count = len(positions)
+        for (vertices, normals, indices), color in self.meshes:
+            world = _rotate_y(vertices, rotations) + positions[:, None, :].astype(np.float32)
+            world_normals = _rotate_y(normals, rotations)
+            data = interleave(world.reshape(-1, 3), world_normals.reshape(-1, 3))
+            offsets = (np.arange(count, dtype=np.uint32) * len(vertices))[:, None]
+            all_indices = np.ascontiguousarray((indices[None, :] + offsets).ravel())
+
+            glColor3f(*color)
+            glBindBuffer(GL_ARRAY_BUFFER, self.batch_vbo)
+            glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STREAM_DRAW)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.batch_ibo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, all_indices.nbytes, all_indices, GL_STREAM_DRAW)
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glEnableClientState(GL_NORMAL_ARRAY)
+            glVertexPointer(3, GL_FLOAT, 32, ctypes.c_void_p(0))
+            glNormalPointer(GL_FLOAT, 32, ctypes.c_void_p(12))
+            glDrawElements(GL_TRIANGLES, len(all_indices), GL_UNSIGNED_INT, ctypes.c_void_p(0))
+            profiler.count('draw_calls')
+            profiler.count('vertices', len(all_indices))
+            glDisableClientState(GL_NORMAL_ARRAY)
+            glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def _draw_debug(self, positions, rotations):
+        # Facing arrow, position marker and view direction for every avatar, one pass
+        r, mid = self.radius, self.height / 2
+        arrow = np.array([
+            (0, mid, 0), (0, mid, r * 2),
+            (0, mid, r * 2), (0.2, mid, r * 1.5),
+            (0, mid, r * 2), (-0.2, mid, r * 1.5),
+        ], dtype=np.float32)
+        arrows = _rotate_y(arrow, rotations) + positions[:, None, :].astype(np.float32)
+        ends = positions + np.stack([np.sin(rotations) * 2, np.zeros_like(rotations),
+                                     np.cos(rotations) * 2], axis=1)
+        views = np.stack([positions, ends], axis=1).astype(np.float32)
+        lines = np.ascontiguousarray(np.concatenate([arrows, views], axis=1).reshape(-1, 3))
+        points = np.ascontiguousarray(positions, dtype=np.float32)
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glColor3f(*ARROW_COLOR)
+        glVertexPointer(3, GL_FLOAT, 0, lines)
+        glDrawArrays(GL_LINES, 0, len(lines))
+        glColor3f(*MARKER_COLOR)
+        glPointSize(5.0)
+        glVertexPointer(3, GL_FLOAT, 0, points)
+        glDrawArrays(GL_POINTS, 0, len(points))
+        profiler.count('draw_calls', 2)
+        profiler.count('vertices', len(lines) + len(points))
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def release(self):
+        for mesh in self.buffers:
+            mesh.delete()
+        self.buffers = []
+        names = [b for b in (self.instance_vbo, self.batch_vbo, self.batch_ibo) if b is not None]
+        glDeleteBuffers(len(names), names)
+        self.instance_vbo = self.batch_vbo = self.batch_ibo = None
+        if self.program is not None:
+            glDeleteProgram(self.program)
+            self.program = None
+
+
+_shared = None
+
+
+def shared_renderer():
+    # One renderer per process; created lazily because it needs a current GL context
+    global _shared
+    if _shared is None:
+        _shared = AvatarRenderer()
+    return _shared
+
+
+def release_shared_renderer():
+    global _shared
+    if _shared is not None:
+        _shared.release()
+        _shared = None
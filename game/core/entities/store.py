@@ -0,0 +1,144 @@
+import numpy as np
+
+
+class EntityStore:
+    """Structure-of-arrays storage for avatars and NPCs.
+
+    Every per-entity field lives in a NumPy array indexed by entity id, so a
+    tick updates all entities with a handful of array operations. Ids of
+    removed entities are reused. Arrays are reallocated when the store grows,
+    so hold on to ids rather than to slices of the arrays.
+    """
+
+    ANIMATION_FRAMES = 60
+
+    def __init__(self, capacity=16):
+        self.capacity = 0
+        self.count = 0  # High-water mark; rows >= count were never used
+        self._free = []
+        self.positions = np.zeros((0, 3))
+        self.rotations = np.zeros(0)        # Degrees around the Y axis
+        self.previous_positions = np.zeros((0, 3))  # State before the last tick, for interpolation
+        self.previous_rotations = np.zeros(0)
+        self.velocities = np.zeros((0, 3))  # Units per tick
+        self.heights = np.zeros(0)
+        self.animation_frames = np.zeros(0, dtype=np.int32)
+        self.walking = np.zeros(0, dtype=bool)
+        self.alive = np.zeros(0, dtype=bool)
+        self._grow(max(capacity, 1))
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive[:self.count]))
+
+    def _grow(self, capacity):
+        def resized(array):
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self.positions = resized(self.positions)
+        self.rotations = resized(self.rotations)
+        self.previous_positions = resized(self.previous_positions)
+        self.previous_rotations = resized(self.previous_rotations)
+        self.velocities = resized(self.velocities)
+        self.heights = resized(self.heights)
+        self.animation_frames = resized(self.animation_frames)
+        self.walking = resized(self.walking)
+        self.alive = resized(self.alive)
+        self.capacity = capacity
+
+    def add(self, position=(0, 0, 0), rotation=0.0, height=1.8, velocity=(0, 0, 0)):
+        if self._free:
+            index = self._free.pop()
+        else:
+            if self.count == self.capacity:
+                self._grow(self.capacity * 2)
+            index = self.count
+            self.count += 1
+        self.positions[index] = position
+        self.rotations[index] = rotation
+        self.previous_positions[index] = position
+        self.previous_rotations[index] = rotation
+        self.velocities[index] = velocity
+        self.heights[index] = height
+        self.animation_frames[index] = 0
+        self.walking[index] = False
+        self.alive[index] = True
+        return index
+
+    def add_many(self, positions, rotations=0.0, height=1.8, velocities=(0, 0, 0)):
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        n = len(positions)
+        needed = self.count + n
+        if needed > self.capacity:
+            self._grow(max(needed, self.capacity * 2))
+        rows = np.arange(self.count, needed)
+        self.count = needed
+        self.positions[rows] = positions
+        self.rotations[rows] = rotations
+        self.previous_positions[rows] = self.positions[rows]
+        self.previous_rotations[rows] = self.rotations[rows]
+        self.velocities[rows] = velocities
+        self.heights[rows] = height
+        self.animation_frames[rows] = 0
+        self.walking[rows] = np.any(self.velocities[rows][:, [0, 2]] != 0, axis=1)
+        self.alive[rows] = True
+        return rows
+
+    def remove(self, index):
+        # Removing twice would put the row on the free list twice and hand it out twice
+        if not self.alive[index]:
+            return
+        self.alive[index] = False
+        self.velocities[index] = 0
+        self.walking[index] = False
+        self._free.append(index)
+
+    def move(self, indices, forward, right, speed=0.1):
+        # Step entities relative to their facing, like the original Avatar.move
+        angle = np.radians(self.rotations[indices])
+        forward = np.asarray(forward, dtype=np.float64)
+        right = np.asarray(right, dtype=np.float64)
+        dx = np.sin(angle) * forward + np.cos(angle) * right
+        dz = np.cos(angle) * forward - np.sin(angle) * right
+        self.positions[indices, 0] += dx * speed
+        self.positions[indices, 2] += dz * speed
+        self.walking[indices] = (forward != 0) | (right != 0)
+
+    def rotate(self, indices, angle):
+        self.rotations[indices] = (self.rotations[indices] + angle) % 360
+
+    def set_velocities(self, indices, velocities):
+        self.velocities[indices] = velocities
+        self.walking[indices] = np.any(np.atleast_2d(self.velocities[indices])[:, [0, 2]] != 0, axis=1)
+
+    def snapshot(self):
+        # Call before each fixed tick so rendering can interpolate from this state
+        live = slice(0, self.count)
+        self.previous_positions[live] = self.positions[live]
+        self.previous_rotations[live] = self.rotations[live]
+
+    def interpolated(self, alpha, indices=None):
+        """(positions, rotations) `alpha` of the way from the previous tick to the current one."""
+        if indices is None:
+            indices = slice(0, self.count)
+        prev = self.previous_positions[indices]
+        positions = prev + (self.positions[indices] - prev) * alpha
+        # Turn the short way round, e.g. 350 -> 10 degrees goes through 0
+        prev_rot = self.previous_rotations[indices]
+        delta = (self.rotations[indices] - prev_rot + 180) % 360 - 180
+        return positions, (prev_rot + delta * alpha) % 360
+
+    def update(self, terrain):
+        """Advance one tick: integrate velocities, snap to the ground, step walk animations."""
+        live = slice(0, self.count)
+        alive = self.alive[live]
+        positions = self.positions[live]
+        positions[:, [0, 2]] += self.velocities[live][:, [0, 2]] * alive[:, None]
+
+        ground = terrain.get_heights(positions[:, 0], positions[:, 2])
+        positions[:, 1] = np.where(alive, ground + self.heights[live] / 2, positions[:, 1])
+
+        frames = self.animation_frames[live]
+        stepping = alive & self.walking[live]
+        frames[stepping] = (frames[stepping] + 1) % self.ANIMATION_FRAMES
@@ -0,0 +1,69 @@
+import numpy as np
+
+
+def perspective_matrix(fovy, aspect, near, far):
+    # Same matrix gluPerspective builds
+    f = 1.0 / np.tan(np.radians(fovy) / 2)
+    return np.array([
+        [f / aspect, 0, 0, 0],
+        [0, f, 0, 0],
+        [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0, 0, -1, 0],
+    ], dtype=np.float64)
+
+
+def look_at_matrix(eye, target, up=(0, 1, 0)):
+    # Same matrix gluLookAt builds
+    eye = np.asarray(eye, dtype=np.float64)
+    forward = np.asarray(target, dtype=np.float64) - eye
+    forward /= np.linalg.norm(forward)
+    side = np.cross(forward, up)
+    side /= np.linalg.norm(side)
+    true_up = np.cross(side, forward)
+    view = np.identity(4)
+    view[0, :3] = side
+    view[1, :3] = true_up
+    view[2, :3] = -forward
+    view[:3, 3] = -view[:3, :3] @ eye
+    return view
+
+
+class Frustum:
+    """View frustum as six inward-facing planes (a, b, c, d), a*x + b*y + c*z + d >= 0 inside."""
+
+    def __init__(self, planes, eye=None):
+        planes = np.asarray(planes, dtype=np.float64)
+        self.planes = planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+        self.eye = None if eye is None else np.asarray(eye, dtype=np.float64)
+
+    @classmethod
+    def from_matrix(cls, clip, eye=None):
+        # Gribb/Hartmann plane extraction from a column-vector clip matrix
+        rows = np.asarray(clip, dtype=np.float64)
+        planes = [
+            rows[3] + rows[0],  # left
+            rows[3] - rows[0],  # right
+            rows[3] + rows[1],  # bottom
+            rows[3] - rows[1],  # top
+            rows[3] + rows[2],  # near
+            rows[3] - rows[2],  # far
+        ]
+        return cls(planes, eye)
+
+    @classmethod
+    def from_camera(cls, eye, target, fovy, aspect, near, far, up=(0, 1, 0)):
+        clip = perspective_matrix(fovy, aspect, near, far) @ look_at_matrix(eye, target, up)
+        return cls.from_matrix(clip, eye)
+
+    def visible_aabbs(self, mins, maxs):
+        """Boolean mask of boxes that are at least partially inside the frustum."""
+        mins = np.asarray(mins, dtype=np.float64).reshape(-1, 3)
+        maxs = np.asarray(maxs, dtype=np.float64).reshape(-1, 3)
+        normals = self.planes[:, :3]
+        # For every plane take the box corner furthest along the plane normal
+        positive = np.where(normals[None, :, :] >= 0, maxs[:, None, :], mins[:, None, :])
+        distances = np.einsum('bpk,pk->bp', positive, normals) + self.planes[None, :, 3]
+        return np.all(distances >= 0, axis=1)
+
+    def intersects_aabb(self, mins, maxs):
+        return bool(self.visible_aabbs(mins, maxs)[0])
@@ -0,0 +1,110 @@
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+
+# Interleaved layout: position (3), normal (3), texcoord (2) as float32
+_FLOATS_PER_VERTEX = 8
+_STRIDE = _FLOATS_PER_VERTEX * 4
+_NORMAL_OFFSET = ctypes.c_void_p(3 * 4)
+_TEXCOORD_OFFSET = ctypes.c_void_p(6 * 4)
+
+
+def vbo_supported():
+    # Buffer objects are core since GL 1.5; PyOpenGL reports missing entry points as falsy
+    try:
+        return bool(glGenBuffers) and bool(glDrawElements)
+    except Exception:
+        return False
+
+
+def interleave(vertices, normals=None, texcoords=None):
+    count = len(vertices)
+    data = np.zeros((count, _FLOATS_PER_VERTEX), dtype=np.float32)
+    data[:, 0:3] = vertices
+    if normals is not None:
+        data[:, 3:6] = normals
+    if texcoords is not None:
+        data[:, 6:8] = texcoords
+    return data
+
+
+class IndexBuffer:
+    """Triangle indices in a GPU element buffer, shareable between meshes with the same topology."""
+
+    def __init__(self, indices, usage=GL_STATIC_DRAW):
+        indices = np.ascontiguousarray(indices, dtype=np.uint32)
+        self.count = len(indices)
+        self.ibo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, usage)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def bind(self):
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+
+    def draw_bound(self, mode=GL_TRIANGLES, first=0, count=None):
+        if count is None:
+            count = self.count - first
+        glDrawElements(mode, count, GL_UNSIGNED_INT, ctypes.c_void_p(first * 4))
+
+    def delete(self):
+        if self.ibo is not None:
+            glDeleteBuffers(1, [self.ibo])
+            self.ibo = None
+
+
+class MeshBuffer:
+    """Vertex (and optional index) data uploaded once to GPU buffer objects."""
+
+    def __init__(self, vertices, normals=None, texcoords=None, indices=None, usage=GL_STATIC_DRAW):
+        self.has_normals = normals is not None
+        self.has_texcoords = texcoords is not None
+        self.vertex_count = len(vertices)
+
+        data = interleave(vertices, normals, texcoords)
+        self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, usage)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        self.indices = None if indices is None else IndexBuffer(indices, usage)
+
+    def bind(self, normals=True, texcoords=True):
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, _STRIDE, ctypes.c_void_p(0))
+        if normals and self.has_normals:
+            glEnableClientState(GL_NORMAL_ARRAY)
+            glNormalPointer(GL_FLOAT, _STRIDE, _NORMAL_OFFSET)
+        if texcoords and self.has_texcoords:
+            glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+            glTexCoordPointer(2, GL_FLOAT, _STRIDE, _TEXCOORD_OFFSET)
+        if self.indices is not None:
+            self.indices.bind()
+
+    def unbind(self):
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw_bound(self, mode=GL_TRIANGLES, first=0, count=None):
+        if self.indices is not None:
+            self.indices.draw_bound(mode, first, count)
+        else:
+            glDrawArrays(mode, first, self.vertex_count - first if count is None else count)
+
+    def draw(self, mode=GL_TRIANGLES, normals=True, texcoords=True):
+        self.bind(normals, texcoords)
+        self.draw_bound(mode)
+        self.unbind()
+
+    def delete(self):
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
+        if self.indices is not None:
+            self.indices.delete()
+            self.indices = None
@@ -0,0 +1,70 @@
+"""Offscreen OpenGL contexts for benchmarks and tests.
+
+Uses EGL with Mesa's surfaceless platform, so it runs on a plain Linux box
+with the llvmpipe software rasterizer and no display server. Call
+`use_egl_platform()` before anything imports `OpenGL`, because PyOpenGL
+picks its platform at import time. `use_offscreen_video()` additionally
+points SDL at its offscreen driver, so pygame windows with an OpenGL
+context (the whole `Game`) work without a display as well.
+"""
+import ctypes
+import os
+
+
+def use_egl_platform():
+    os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+    os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+
+def use_offscreen_video():
+    # SDL's offscreen driver creates its GL context through EGL too
+    os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    use_egl_platform()
+
+
+class HeadlessContext:
+    def __init__(self, width=640, height=480):
+        from OpenGL import EGL
+
+        self.width = width
+        self.height = height
+        self._egl = EGL
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self.display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise RuntimeError("eglInitialize failed")
+
+        config_attribs = [
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RED_SIZE, 8,
+            EGL.EGL_GREEN_SIZE, 8,
+            EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_NONE,
+        ]
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        EGL.eglChooseConfig(self.display, (EGL.EGLint * len(config_attribs))(*config_attribs),
+                            ctypes.pointer(config), 1, ctypes.pointer(count))
+        if count.value == 0:
+            raise RuntimeError("No EGL config with an OpenGL pbuffer surface")
+
+        surface_attribs = [EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE]
+        self.surface = EGL.eglCreatePbufferSurface(
+            self.display, config, (EGL.EGLint * len(surface_attribs))(*surface_attribs))
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, None)
+        if not EGL.eglMakeCurrent(self.display, self.surface, self.surface, self.context):
+            raise RuntimeError("eglMakeCurrent failed")
+
+    def swap_buffers(self):
+        self._egl.eglSwapBuffers(self.display, self.surface)
+
+    def release(self):
+        EGL = self._egl
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglDestroySurface(self.display, self.surface)
+        EGL.eglTerminate(self.display)
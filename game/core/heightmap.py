@@ -0,0 +1,188 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from noise import snoise2
+
+# snoise2 treats FLT_MAX repeat intervals as "no tiling"; passing it explicitly
+# lets us reach the `base` argument without changing the flat-noise output.
+_NO_REPEAT = float(np.finfo(np.float32).max)
+
+
+def sample_noise(xs, zs, noise_scale=25.0, octaves=4, persistence=0.5, lacunarity=2.0, base=0):
+    """Evaluate fractal simplex noise on the grid spanned by xs (rows) and zs (columns).
+
+    snoise2 is a scalar C function, so every cell still costs one Python-level
+    call (about 0.5 us). Rows are written straight into a float64 array, so
+    no per-cell Python float outlives its row and memory stays at the output.
+    """
+    xs = (np.asarray(xs, dtype=np.float64) / noise_scale).tolist()
+    zs = (np.asarray(zs, dtype=np.float64) / noise_scale).tolist()
+    grid = np.empty((len(xs), len(zs)), dtype=np.float64)
+    for row, x in enumerate(xs):
+        grid[row] = np.fromiter((snoise2(x, z, octaves, persistence, lacunarity,
+                                         _NO_REPEAT, _NO_REPEAT, base) for z in zs),
+                                dtype=np.float64, count=len(zs))
+    return grid
+
+
+def _fill_tile(shm_name, shape, row_start, row_stop, zs, noise_params):
+    # Worker side of parallel_sample_noise: write one band of rows into shared memory
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        out[row_start:row_stop] = sample_noise(np.arange(row_start, row_stop), zs, *noise_params)
+    finally:
+        shm.close()
+    return row_start, row_stop
+
+
+def parallel_sample_noise(size, noise_scale=25.0, octaves=4, persistence=0.5, lacunarity=2.0,
+                          base=0, workers=None, tile_rows=None, executor=None):
+    """sample_noise over a (size, size) grid split into row bands across a process pool.
+
+    Workers write straight into a shared-memory buffer, so only the band
+    bounds travel back through the pool. Every sample is computed by the same
+    snoise2 call as the single-process path, so the result is bit-identical.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    tile_rows = tile_rows or max(1, -(-size // (workers * 4)))  # a few bands per worker
+    shape = (size, size)
+    shm = shared_memory.SharedMemory(create=True, size=size * size * 8)
+    owns_executor = executor is None
+    if owns_executor:
+        executor = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context('spawn'))
+    try:
+        zs = np.arange(size)
+        params = (noise_scale, octaves, persistence, lacunarity, base)
+        futures = [executor.submit(_fill_tile, shm.name, shape, start, min(start + tile_rows, size), zs, params)
+                   for start in range(0, size, tile_rows)]
+        for future in futures:
+            future.result()
+        return np.ndarray(shape, dtype=np.float64, buffer=shm.buf).copy()
+    finally:
+        if owns_executor:
+            executor.shutdown()
+        shm.close()
+        shm.unlink()
+
+
+def generate_height_map(size, noise_scale=25.0, octaves=4, persistence=0.5, lacunarity=2.0,
+                        base=0, max_height=2.0, workers=1):
+    """Return a (size, size) float32 height map indexed as [x, z], normalized to [0, max_height].
+
+    With workers > 1 the noise is sampled by parallel_sample_noise.
+    """
+    if workers > 1:
+        elevation = parallel_sample_noise(size, noise_scale, octaves, persistence, lacunarity,
+                                          base, workers=workers)
+    else:
+        cells = np.arange(size)
+        elevation = sample_noise(cells, cells, noise_scale, octaves, persistence, lacunarity, base)
+    low, high = elevation.min(), elevation.max()
+    span = high - low if high > low else 1.0
+    height_map = (elevation - low) / span * max_height
+    return np.ascontiguousarray(height_map, dtype=np.float32)
+
+
+def build_mesh(height_map, cell_size=1.0, tex_tiling=5.0, origin=None, normals=None):
+    """Build shared per-vertex arrays for a height map.
+
+    `origin` is the grid coordinate of sample [0, 0] (centered on the map when
+    omitted). Vertices are laid out row-major by z then x (index = z * size + x)
+    and returned together with triangle indices, two triangles per grid quad.
+    """
+    size_x, size_z = height_map.shape
+    if origin is None:
+        origin = (-size_x / 2, -size_z / 2)
+    x = np.arange(size_x, dtype=np.float32) + np.float32(origin[0])
+    z = np.arange(size_z, dtype=np.float32) + np.float32(origin[1])
+    heights = height_map.T  # [z, x]
+
+    vertices = np.empty((size_z, size_x, 3), dtype=np.float32)
+    vertices[..., 0] = x[None, :] * cell_size
+    vertices[..., 1] = heights
+    vertices[..., 2] = z[:, None] * cell_size
+
+    if normals is None:
+        normals = compute_normals(height_map, cell_size)
+
+    texcoords = np.empty((size_z, size_x, 2), dtype=np.float32)
+    texcoords[..., 0] = x[None, :] / tex_tiling
+    texcoords[..., 1] = z[:, None] / tex_tiling
+
+    indices = grid_indices(size_x, size_z)
+
+    return (
+        vertices.reshape(-1, 3),
+        normals.reshape(-1, 3),
+        texcoords.reshape(-1, 2),
+        indices,
+    )
+
+
+def compute_normals(height_map, cell_size=1.0):
+    """Per-vertex upward normals from central differences, shaped [z, x, 3]."""
+    heights = height_map.T.astype(np.float32)
+    if heights.shape[0] > 1 and heights.shape[1] > 1:
+        dh_dz, dh_dx = np.gradient(heights, cell_size)
+    else:
+        dh_dz = dh_dx = np.zeros_like(heights)
+    normals = np.empty(heights.shape + (3,), dtype=np.float32)
+    normals[..., 0] = -dh_dx
+    normals[..., 1] = 1.0
+    normals[..., 2] = -dh_dz
+    normals /= np.linalg.norm(normals, axis=2, keepdims=True)
+    return normals
+
+
+def grid_indices(size_x, size_z, step=1):
+    """Triangle indices for a (size_z, size_x) vertex grid, sampled every `step` vertices."""
+    xs = np.arange(0, size_x - 1, step, dtype=np.uint32)
+    zs = np.arange(0, size_z - 1, step, dtype=np.uint32)
+    top_left = (zs[:, None] * size_x + xs[None, :]).ravel()
+    top_right = top_left + step
+    bottom_left = top_left + step * size_x
+    bottom_right = bottom_left + step
+    quads = np.stack([top_left, top_right, bottom_right,
+                      top_left, bottom_right, bottom_left], axis=1)
+    return np.ascontiguousarray(quads.ravel(), dtype=np.uint32)
+
+
+def _bilinear_cells(height_map, gx, gz):
+    # Clamp into the grid and split into cell index + fractional offset
+    size_x, size_z = height_map.shape
+    gx = np.clip(np.asarray(gx, dtype=np.float64), 0, size_x - 1)
+    gz = np.clip(np.asarray(gz, dtype=np.float64), 0, size_z - 1)
+    x0 = np.minimum(np.floor(gx).astype(np.intp), max(size_x - 2, 0))
+    z0 = np.minimum(np.floor(gz).astype(np.intp), max(size_z - 2, 0))
+    x1 = np.minimum(x0 + 1, size_x - 1)
+    z1 = np.minimum(z0 + 1, size_z - 1)
+    h00 = height_map[x0, z0]
+    h10 = height_map[x1, z0]
+    h01 = height_map[x0, z1]
+    h11 = height_map[x1, z1]
+    return gx - x0, gz - z0, h00, h10, h01, h11
+
+
+def sample_heights(height_map, gx, gz):
+    """Bilinearly interpolated heights at fractional grid coordinates (clamped to the edges)."""
+    fx, fz, h00, h10, h01, h11 = _bilinear_cells(height_map, gx, gz)
+    top = h00 + (h10 - h00) * fx
+    bottom = h01 + (h11 - h01) * fx
+    return top + (bottom - top) * fz
+
+
+def sample_gradients(height_map, gx, gz, cell_size=1.0):
+    """(dh/dx, dh/dz) in world units of the bilinear surface at fractional grid coordinates."""
+    fx, fz, h00, h10, h01, h11 = _bilinear_cells(height_map, gx, gz)
+    dh_dx = ((h10 - h00) * (1 - fz) + (h11 - h01) * fz) / cell_size
+    dh_dz = ((h01 - h00) * (1 - fx) + (h11 - h10) * fx) / cell_size
+    return dh_dx, dh_dz
+
+
+def gradients_to_normals(dh_dx, dh_dz):
+    normals = np.stack([-dh_dx, np.ones_like(dh_dx), -dh_dz], axis=-1)
+    return normals / np.linalg.norm(normals, axis=-1, keepdims=True)
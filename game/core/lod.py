@@ -0,0 +1,134 @@
+"""Geomipmapping helpers shared by the terrain renderers.
+
+A patch is a square grid of `n` quads ((n + 1) ** 2 vertices, row-major by z
+then x). Level `l` samples every 2 ** l vertices. Cracks between a patch and
+a neighbour one level coarser are closed by snapping the finer patch's edge
+vertices onto the coarser vertex spacing, which collapses the extra edge
+vertices and leaves only edges the neighbour also has.
+"""
+import math
+
+import numpy as np
+
+# Edge bits for `coarser_edges`: set when the neighbour on that side is one level coarser
+EDGE_NEG_Z = 1
+EDGE_POS_X = 2
+EDGE_POS_Z = 4
+EDGE_NEG_X = 8
+
+
+def max_level(n):
+    return int(math.log2(n))
+
+
+def lod_indices(n, level, coarser_edges=0):
+    step = 2 ** level
+    if step > n:
+        raise ValueError(f"LOD level {level} is too coarse for a {n}-quad patch")
+    cells = np.arange(0, n, step)
+    x0, z0 = np.meshgrid(cells, cells)
+    x0, z0 = x0.ravel(), z0.ravel()
+    x1, z1 = x0 + step, z0 + step
+
+    # Two triangles per cell, same winding as heightmap.grid_indices
+    xs = np.stack([x0, x1, x1, x0, x1, x0], axis=1)
+    zs = np.stack([z0, z0, z1, z0, z1, z1], axis=1)
+
+    coarse = 2 * step
+    if coarser_edges & EDGE_NEG_Z:
+        on_edge = zs == 0
+        xs = np.where(on_edge, xs // coarse * coarse, xs)
+    if coarser_edges & EDGE_POS_Z:
+        on_edge = zs == n
+        xs = np.where(on_edge, xs // coarse * coarse, xs)
+    if coarser_edges & EDGE_NEG_X:
+        on_edge = xs == 0
+        zs = np.where(on_edge, zs // coarse * coarse, zs)
+    if coarser_edges & EDGE_POS_X:
+        on_edge = xs == n
+        zs = np.where(on_edge, zs // coarse * coarse, zs)
+
+    indices = (zs * (n + 1) + xs).reshape(-1, 3)
+    # Snapping collapses some triangles to lines; drop them
+    keep = ((indices[:, 0] != indices[:, 1]) &
+            (indices[:, 1] != indices[:, 2]) &
+            (indices[:, 0] != indices[:, 2]))
+    return np.ascontiguousarray(indices[keep].ravel(), dtype=np.uint32)
+
+
+def select_levels(centers, eye, lod_distance, top_level):
+    """Distance-based level per patch: level l covers distances up to lod_distance * 2 ** l."""
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    distance = np.linalg.norm(centers - np.asarray(eye, dtype=np.float64), axis=1)
+    ratio = np.maximum(distance / lod_distance, 1.0)
+    return np.clip(np.floor(np.log2(ratio)).astype(int), 0, top_level)
+
+
+def constrain_levels(levels):
+    """Lower levels until every patch is at most one level coarser than its neighbours.
+
+    `levels` maps (cx, cz) -> level and is updated in place. Returns the
+    coarser-edge mask for every patch.
+    """
+    neighbours = ((0, -1, EDGE_NEG_Z), (1, 0, EDGE_POS_X), (0, 1, EDGE_POS_Z), (-1, 0, EDGE_NEG_X))
+    changed = True
+    while changed:
+        changed = False
+        for (cx, cz), level in levels.items():
+            for dx, dz, _ in neighbours:
+                other = levels.get((cx + dx, cz + dz))
+                if other is not None and level > other + 1:
+                    level = other + 1
+                    changed = True
+            levels[(cx, cz)] = level
+
+    masks = {}
+    for (cx, cz), level in levels.items():
+        mask = 0
+        for dx, dz, bit in neighbours:
+            other = levels.get((cx + dx, cz + dz))
+            if other is not None and other > level:
+                mask |= bit
+        masks[(cx, cz)] = mask
+    return masks
+
+
+def patch_extents(size_x, size_z, patch):
+    """Inclusive vertex extents (x0, z0, x1, z1) of the `patch`-quad squares tiling a
+    (size_z, size_x) vertex grid, row by row; the last row and column may be narrower."""
+    return [(x0, z0, min(x0 + patch, size_x - 1), min(z0 + patch, size_z - 1))
+            for z0 in range(0, size_z - 1, patch)
+            for x0 in range(0, size_x - 1, patch)]
+
+
+def patch_lod_indices(size_x, x0, z0, n, level, coarser_edges=0):
+    """lod_indices for the n-quad patch at vertex (x0, z0) of a grid `size_x` vertices wide."""
+    local = lod_indices(n, level, coarser_edges)
+    zs, xs = np.divmod(local, n + 1)
+    return np.ascontiguousarray((zs + z0) * size_x + xs + x0, dtype=np.uint32)
+
+
+def patch_ordered_indices(size_x, size_z, patch):
+    """Full-resolution triangle indices for a (size_z, size_x) vertex grid, grouped by patch.
+
+    Each patch's triangles are contiguous, so a visible patch is drawn as one
+    index range. Returns the indices and a list of
+    (first_index, index_count, x0, z0, x1, z1) with inclusive vertex extents.
+    """
+    chunks = []
+    ranges = []
+    first = 0
+    for x0, z0, x1, z1 in patch_extents(size_x, size_z, patch):
+        xs = np.arange(x0, x1, dtype=np.uint32)
+        zs = np.arange(z0, z1, dtype=np.uint32)
+        top_left = (zs[:, None] * size_x + xs[None, :]).ravel()
+        top_right = top_left + 1
+        bottom_left = top_left + size_x
+        bottom_right = bottom_left + 1
+        quads = np.stack([top_left, top_right, bottom_right,
+                          top_left, bottom_right, bottom_left], axis=1).ravel()
+        chunks.append(quads)
+        ranges.append((first, len(quads), x0, z0, x1, z1))
+        first += len(quads)
+    indices = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint32)
+    return np.ascontiguousarray(indices, dtype=np.uint32), ranges
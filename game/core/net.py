@@ -0,0 +1,229 @@
+"""Wire protocol for the multiplayer position server, and the game's client for it.
+
+Every message is a little-endian u16 length followed by a payload whose
+first byte is its type. Clients send their avatar's state; the server
+(position_server.py next to manage.py) answers each tick with a snapshot of
+the other avatars near that client:
+
+    STATE     client -> server  x, y, z, rotation as float32
+    WELCOME   server -> client  the client's entity id, tick rate, interest radius
+    SNAPSHOT  server -> client  tick, server clock, then ENTER / UPDATE / LEAVE records
+
+Snapshots are quantized (1/64 unit, 1/65536 turn) and delta-compressed
+against what this client was last sent: entities that came into range are
+sent in full, moved ones as int16 deltas of just the components that
+changed, unchanged ones not at all.
+"""
+import socket
+import struct
+import time
+
+DEFAULT_PORT = 8765
+POSITION_SCALE = 64        # Quantization steps per world unit
+ROTATION_STEPS = 1 << 16   # Quantization steps per full turn
+MAX_MESSAGE = 0xFFFF
+
+LENGTH = struct.Struct('<H')
+STATE = struct.Struct('<Bffff')             # type, x, y, z, rotation (degrees)
+WELCOME = struct.Struct('<BHHf')            # type, entity id, tick rate, interest radius
+SNAPSHOT = struct.Struct('<BIdBBB')         # type, tick, server time, enters, updates, leaves
+ENTER = struct.Struct('<HiiiH')             # id, x, y, z, rotation (quantized)
+UPDATE = struct.Struct('<HB')               # id, mask of changed components, then int16 deltas
+DELTA = struct.Struct('<h')
+LEAVE = struct.Struct('<H')
+MSG_STATE, MSG_WELCOME, MSG_SNAPSHOT = 1, 2, 3
+
+_DELTAS = [struct.Struct('<' + 'h' * n) for n in range(5)]
+
+
+def frame(payload):
+    return LENGTH.pack(len(payload)) + payload
+
+
+def quantize(x, y, z, rotation):
+    return (round(x * POSITION_SCALE), round(y * POSITION_SCALE), round(z * POSITION_SCALE),
+            round(rotation * ROTATION_STEPS / 360) % ROTATION_STEPS)
+
+
+def dequantize(q):
+    return (q[0] / POSITION_SCALE, q[1] / POSITION_SCALE, q[2] / POSITION_SCALE,
+            q[3] * 360 / ROTATION_STEPS)
+
+
+def encode_update(entity_id, old, new):
+    """UPDATE record taking `old` to `new`, or None if a delta does not fit in int16."""
+    mask = 0
+    deltas = []
+    for bit, (a, b) in enumerate(zip(old, new)):
+        delta = b - a
+        if bit == 3:
+            # Rotation wraps; send the short way round
+            delta = (delta + ROTATION_STEPS // 2) % ROTATION_STEPS - ROTATION_STEPS // 2
+        if delta:
+            if not -32768 <= delta <= 32767:
+                return None
+            mask |= 1 << bit
+            deltas.append(delta)
+    return UPDATE.pack(entity_id, mask) + _DELTAS[len(deltas)].pack(*deltas)
+
+
+def encode_snapshot(tick, server_time, enters, updates, leaves):
+    """SNAPSHOT payload from already-packed ENTER and UPDATE records and leaving ids."""
+    return b''.join([SNAPSHOT.pack(MSG_SNAPSHOT, tick, server_time, len(enters), len(updates),
+                                   len(leaves)),
+                     *enters, *updates, *(LEAVE.pack(i) for i in leaves)])
+
+
+def apply_snapshot(payload, known):
+    """Apply a SNAPSHOT payload to `known` (id -> quantized state) in place.
+
+    Returns (tick, server_time, entered ids, updated ids, left ids).
+    """
+    _, tick, server_time, enters, updates, leaves = SNAPSHOT.unpack_from(payload)
+    offset = SNAPSHOT.size
+    entered, updated, left = [], [], []
+    for _ in range(enters):
+        entity_id, *q = ENTER.unpack_from(payload, offset)
+        offset += ENTER.size
+        known[entity_id] = tuple(q)
+        entered.append(entity_id)
+    for _ in range(updates):
+        entity_id, mask = UPDATE.unpack_from(payload, offset)
+        offset += UPDATE.size
+        q = list(known[entity_id])
+        for bit in range(4):
+            if mask & (1 << bit):
+                q[bit] += DELTA.unpack_from(payload, offset)[0]
+                offset += DELTA.size
+        q[3] %= ROTATION_STEPS
+        known[entity_id] = tuple(q)
+        updated.append(entity_id)
+    for _ in range(leaves):
+        entity_id, = LEAVE.unpack_from(payload, offset)
+        offset += LEAVE.size
+        known.pop(entity_id, None)
+        left.append(entity_id)
+    return tick, server_time, entered, updated, left
+
+
+class PositionClient:
+    """Non-blocking client for the game loop.
+
+    Connecting waits up to `timeout`; after that send_state() and poll()
+    never block. States are absolute, so when the socket cannot take more
+    data a new state is simply skipped rather than queued behind old ones.
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, timeout=2.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+        self.connected = True
+        self.entity_id = None
+        self.tick_rate = None
+        self.interest_radius = None
+        self.known = {}       # Remote entity id -> quantized (x, y, z, rotation)
+        self.entered = set()  # Changes since the last take_changes()
+        self.updated = set()
+        self.left = set()
+        self.last_tick = None
+        self.latency = None   # Seconds from the server's tick to our poll; same host only
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._outgoing = bytearray()
+        self._incoming = bytearray()
+        self._last_send = 0.0
+
+    def send_state(self, position, rotation):
+        """Queue our avatar's state, at most once per server tick."""
+        if not self.connected or self.tick_rate is None:
+            return
+        now = time.monotonic()
+        if now - self._last_send < 1.0 / self.tick_rate:
+            return
+        if not self._outgoing:
+            self._outgoing += frame(STATE.pack(MSG_STATE, position[0], position[1], position[2],
+                                               rotation))
+            self._last_send = now
+        self._flush()
+
+    def _flush(self):
+        try:
+            sent = self.sock.send(self._outgoing)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self.close()
+            return
+        self.bytes_sent += sent
+        del self._outgoing[:sent]
+
+    def poll(self):
+        """Read whatever has arrived and apply it; returns the number of messages handled."""
+        if not self.connected:
+            return 0
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                data = b''
+            if not data:
+                self.close()
+                break
+            self.bytes_received += len(data)
+            self._incoming += data
+        if self._outgoing:
+            self._flush()
+
+        handled = 0
+        buffer = self._incoming
+        offset = 0
+        while len(buffer) - offset >= LENGTH.size:
+            size, = LENGTH.unpack_from(buffer, offset)
+            if len(buffer) - offset - LENGTH.size < size:
+                break
+            payload = bytes(buffer[offset + LENGTH.size:offset + LENGTH.size + size])
+            offset += LENGTH.size + size
+            self._handle(payload)
+            handled += 1
+        del buffer[:offset]
+        return handled
+
+    def _handle(self, payload):
+        if payload[0] == MSG_WELCOME:
+            _, self.entity_id, self.tick_rate, self.interest_radius = WELCOME.unpack(payload)
+        elif payload[0] == MSG_SNAPSHOT:
+            tick, server_time, entered, updated, left = apply_snapshot(payload, self.known)
+            self.last_tick = tick
+            self.latency = time.monotonic() - server_time
+            for entity_id in left:
+                # Left and came back within one poll: still an update to the caller
+                if entity_id in self.entered:
+                    self.entered.discard(entity_id)
+                else:
+                    self.left.add(entity_id)
+                self.updated.discard(entity_id)
+            for entity_id in entered:
+                if entity_id in self.left:
+                    self.left.discard(entity_id)
+                    self.updated.add(entity_id)
+                else:
+                    self.entered.add(entity_id)
+            self.updated.update(i for i in updated if i not in self.entered)
+
+    def take_changes(self):
+        """(entered, updated, left) id sets since the last call; look states up in `known`."""
+        changes = self.entered, self.updated, self.left
+        self.entered, self.updated, self.left = set(), set(), set()
+        return changes
+
+    def state(self, entity_id):
+        """(x, y, z, rotation) of a remote entity in world units and degrees."""
+        return dequantize(self.known[entity_id])
+
+    def close(self):
+        if self.connected:
+            self.connected = False
+            self.sock.close()
@@ -3,27 +3,40 @@ from pygame.locals import *
 import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLU import *
+from .entities.store import EntityStore
 
 class Player:
-    def __init__(self, position=(0, 1, 0)):
-        self.position = list(position)
-        self.rotation = 0  # Rotation around Y axis (in degrees)
+    def __init__(self, position=(0, 1, 0), store=None):
+        # Position and rotation live in a row of an EntityStore
+        self.store = store if store is not None else EntityStore(capacity=1)
+        self.index = self.store.add(position)
         self.speed = 0.1
         self.turn_speed = 2.0
         self.camera_height = 1.7  # Height of camera from ground
         
-    def move(self, forward=0, right=0):
-        # Calculate movement direction based on rotation
-        angle = np.radians(self.rotation)
-        dx = np.sin(angle) * forward + np.cos(angle) * right
-        dz = np.cos(angle) * forward - np.sin(angle) * right
+    @property
+    def position(self):
+        return self.store.positions[self.index]
+    
+    @position.setter
+    def position(self, value):
+        self.store.positions[self.index] = value
         
-        # Update position
-        self.position[0] += dx * self.speed
-        self.position[2] += dz * self.speed
+    @property
+    def rotation(self):
+        # Rotation around Y axis (in degrees)
+        return float(self.store.rotations[self.index])
+    
+    @rotation.setter
+    def rotation(self, value):
+        self.store.rotations[self.index] = value
+        
+    def move(self, forward=0, right=0):
+        # Move relative to facing direction
+        self.store.move(self.index, forward, right, speed=self.speed)
         
     def rotate(self, angle):
-        self.rotation = (self.rotation + angle * self.turn_speed) % 360
+        self.store.rotate(self.index, angle * self.turn_speed)
         
     def update_camera(self):
         # Position camera at player's eye level
@@ -0,0 +1,212 @@
+"""Frame profiler and rate-limited logging for the game loop.
+
+`profiler` is a process-wide instance that is disabled by default. Code on
+hot paths wraps work in `profiler.scope(name)` and reports counters with
+`profiler.count(name, n)`; while disabled both return immediately, so the
+instrumentation can stay in place. When enabled, every frame between
+`begin_frame()` and `end_frame()` is kept in a fixed-size ring buffer that
+can be summarised or written out in Chrome's trace event format (open it in
+chrome://tracing or https://ui.perfetto.dev).
+"""
+import json
+import logging
+import time
+from collections import deque, namedtuple
+
+Frame = namedtuple('Frame', 'index start duration scopes counters')
+
+
+class _NullScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SCOPE = _NullScope()
+
+
+class _Scope:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.profiler._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        p = self.profiler
+        p._depth -= 1
+        p._scopes.append((self.name, self.start, end - self.start, p._depth))
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled=False, capacity=600):
+        self.enabled = enabled
+        self.frames = deque(maxlen=capacity)  # Most recent frames only
+        self.frame_index = 0
+        self.origin = time.perf_counter()
+        self._frame_start = None
+        self._scopes = []    # (name, start, duration, depth) in the open frame
+        self._counters = {}
+        self._depth = 0
+        self._patched = []
+
+    def scope(self, name):
+        """Context manager timing the enclosed block as `name`."""
+        if not self.enabled:
+            return _NULL_SCOPE
+        return _Scope(self, name)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self._frame_start = time.perf_counter()
+        self._scopes = []
+        self._counters = {}
+
+    def end_frame(self):
+        if not self.enabled or self._frame_start is None:
+            return
+        end = time.perf_counter()
+        self.frames.append(Frame(self.frame_index, self._frame_start, end - self._frame_start,
+                                 self._scopes, self._counters))
+        self.frame_index += 1
+        self._frame_start = None
+
+    def instrument_gl(self, *modules):
+        """Count every gl* call made through the given modules as the `gl_calls` counter.
+
+        Wraps the module-level names, so it costs a Python call per GL call;
+        use it for investigations rather than leaving it on.
+        """
+        for module in modules:
+            for name, value in list(vars(module).items()):
+                if name.startswith('gl') and callable(value) and not hasattr(value, '_profiled'):
+                    self._patched.append((module, name, value))
+                    setattr(module, name, self._counted(value))
+
+    def _counted(self, func):
+        def counted(*args, **kwargs):
+            if self.enabled:
+                self._counters['gl_calls'] = self._counters.get('gl_calls', 0) + 1
+            return func(*args, **kwargs)
+        counted._profiled = True
+        return counted
+
+    def restore_gl(self):
+        for module, name, value in self._patched:
+            setattr(module, name, value)
+        self._patched = []
+
+    def summary(self):
+        """Per-scope and per-counter averages over the frames in the ring buffer."""
+        frames = list(self.frames)
+        if not frames:
+            return {}
+        n = len(frames)
+        durations = sorted(f.duration for f in frames)
+        scopes = {}
+        counters = {}
+        for frame in frames:
+            for name, _, duration, _ in frame.scopes:
+                total, worst = scopes.get(name, (0.0, 0.0))
+                scopes[name] = (total + duration, max(worst, duration))
+            for name, value in frame.counters.items():
+                counters[name] = counters.get(name, 0) + value
+        return {
+            'frames': n,
+            'frame_avg_ms': 1000 * sum(durations) / n,
+            'frame_p95_ms': 1000 * durations[int(0.95 * (n - 1))],
+            'scopes_ms': {name: {'avg': 1000 * total / n, 'max': 1000 * worst}
+                          for name, (total, worst) in scopes.items()},
+            'counters_per_frame': {name: total / n for name, total in counters.items()},
+        }
+
+    def report(self):
+        """One-line version of summary() for the log."""
+        summary = self.summary()
+        if not summary:
+            return "no frames recorded"
+        scopes = ', '.join(f"{name} {stats['avg']:.2f}" for name, stats in summary['scopes_ms'].items())
+        counters = ', '.join(f"{name} {value:.0f}" for name, value in summary['counters_per_frame'].items())
+        return (f"frame {summary['frame_avg_ms']:.2f} ms avg, {summary['frame_p95_ms']:.2f} ms p95 "
+                f"over {summary['frames']} frames; ms/frame: {scopes}; per frame: {counters}")
+
+    def chrome_trace(self):
+        events = []
+        for frame in self.frames:
+            events.append(self._event('frame', frame.start, frame.duration, {'index': frame.index}))
+            for name, start, duration, depth in frame.scopes:
+                events.append(self._event(name, start, duration))
+            if frame.counters:
+                events.append({'name': 'counters', 'ph': 'C', 'pid': 0, 'tid': 0,
+                               'ts': (frame.start - self.origin) * 1e6, 'args': frame.counters})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def _event(self, name, start, duration, args=None):
+        event = {'name': name, 'ph': 'X', 'pid': 0, 'tid': 0,
+                 'ts': (start - self.origin) * 1e6, 'dur': duration * 1e6}
+        if args:
+            event['args'] = args
+        return event
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+class RateLimitedLogger:
+    """Wraps a logging.Logger and drops repeats of the same message key within `interval` seconds.
+
+    The next message that gets through says how many were dropped, unless
+    `report_suppressed` is off (for periodic status lines, where dropping is
+    the point). Messages below the logger's level cost one level check.
+    """
+
+    def __init__(self, name, interval=1.0, report_suppressed=True):
+        self.logger = logging.getLogger(name)
+        self.interval = interval
+        self.report_suppressed = report_suppressed
+        self._last = {}        # key -> time of the last message let through
+        self._suppressed = {}  # key -> messages dropped since then
+
+    def log(self, level, key, msg, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        last = self._last.get(key)
+        if last is not None and now - last < self.interval:
+            if self.report_suppressed:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return
+        self._last[key] = now
+        dropped = self._suppressed.pop(key, 0)
+        if dropped:
+            msg = f"{msg} ({dropped} similar messages suppressed)"
+        self.logger.log(level, msg, *args)
+
+    def debug(self, key, msg, *args):
+        self.log(logging.DEBUG, key, msg, *args)
+
+    def info(self, key, msg, *args):
+        self.log(logging.INFO, key, msg, *args)
+
+    def warning(self, key, msg, *args):
+        self.log(logging.WARNING, key, msg, *args)
+
+
+profiler = Profiler()
@@ -0,0 +1,134 @@
+"""Sorted draw submission with a cache of the fixed-function GL state.
+
+Draw code submits callables tagged with the RenderState they need instead
+of toggling GL_LIGHTING/GL_TEXTURE_2D and binding textures itself. On
+flush() the queue sorts items so equal states are adjacent and applies
+each state through a GLStateCache, which only issues the enable/disable,
+bind and polygon mode calls that actually change something -- including
+across frames, since the cache outlives the queue contents.
+
+Draw callables must leave the managed state alone; anything else they set
+(colours, client arrays, buffers, programs) is theirs to restore.
+"""
+from collections import namedtuple
+
+from OpenGL.GL import *
+
+from .profiler import profiler
+
+RenderState = namedtuple('RenderState', 'texture lighting polygon_mode blend')
+# texture 0 draws untextured; blend uses SRC_ALPHA, ONE_MINUS_SRC_ALPHA
+RenderState.__new__.__defaults__ = (0, True, GL_FILL, False)
+
+DEFAULT_STATE = RenderState()
+WIREFRAME = RenderState(texture=0, lighting=False, polygon_mode=GL_LINE)
+UNLIT = RenderState(texture=0, lighting=False)
+
+# Layers draw in order; overlays go after everything they are drawn over
+OPAQUE = 0
+OVERLAY = 1
+
+
+class GLStateCache:
+    """Shadow copy of the GL state RenderState covers; None means unknown."""
+
+    def __init__(self):
+        self.capabilities = {}  # GL_LIGHTING etc. -> bool
+        self.texture = None
+        self.polygon_mode = None
+        self.blend_func_set = False
+        self.changes = 0        # State calls issued
+        self.skipped = 0        # State calls avoided
+
+    def set_enabled(self, capability, enabled):
+        if self.capabilities.get(capability) == enabled:
+            self.skipped += 1
+            return
+        (glEnable if enabled else glDisable)(capability)
+        self.capabilities[capability] = enabled
+        self.changes += 1
+
+    def bind_texture(self, texture):
+        if self.texture == texture:
+            self.skipped += 1
+            return
+        glBindTexture(GL_TEXTURE_2D, texture)
+        self.texture = texture
+        self.changes += 1
+
+    def set_polygon_mode(self, mode):
+        if self.polygon_mode == mode:
+            self.skipped += 1
+            return
+        glPolygonMode(GL_FRONT_AND_BACK, mode)
+        self.polygon_mode = mode
+        self.changes += 1
+
+    def apply(self, state):
+        if state.texture:
+            self.set_enabled(GL_TEXTURE_2D, True)
+            self.bind_texture(state.texture)
+        else:
+            self.set_enabled(GL_TEXTURE_2D, False)
+        self.set_enabled(GL_LIGHTING, state.lighting)
+        self.set_polygon_mode(state.polygon_mode)
+        if state.blend and not self.blend_func_set:
+            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+            self.blend_func_set = True
+            self.changes += 1
+        self.set_enabled(GL_BLEND, state.blend)
+
+    def forget_texture(self):
+        # Texture uploads bind whatever they are filling in
+        self.texture = None
+
+    def invalidate(self):
+        """Forget everything, after code outside the cache changed GL state."""
+        self.capabilities.clear()
+        self.texture = None
+        self.polygon_mode = None
+        self.blend_func_set = False
+
+
+class RenderQueue:
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else GLStateCache()
+        self.items = []
+
+    def submit(self, state, draw, layer=OPAQUE, name='draw'):
+        """Queue `draw()` to run with `state` applied; `name` is its profiler scope."""
+        self.items.append((layer, state, len(self.items), draw, name))
+
+    @staticmethod
+    def _sort_key(item):
+        layer, state, order = item[:3]
+        if state.blend:
+            # Blended items keep submission order; callers sort them back to front
+            return (layer, True, 0, False, 0, order)
+        return (layer, False, state.texture, state.lighting, state.polygon_mode, order)
+
+    def flush(self, restore=False):
+        """Draw everything submitted since the last flush; `restore` ends in DEFAULT_STATE."""
+        cache = self.cache
+        changes = cache.changes
+        # Anything may have bound a texture between flushes (uploads, atlases)
+        cache.forget_texture()
+        for _, state, _, draw, name in sorted(self.items, key=self._sort_key):
+            cache.apply(state)
+            with profiler.scope(name):
+                draw()
+        self.items = []
+        if restore:
+            cache.apply(DEFAULT_STATE)
+        profiler.count('state_changes', cache.changes - changes)
+
+
+def draw_now(submit, *args, **kwargs):
+    """Run a submit(queue, ...) method straight away and restore DEFAULT_STATE.
+
+    For callers outside a frame's shared queue; a fresh cache knows nothing,
+    so the first item sets all of its state.
+    """
+    queue = RenderQueue()
+    submit(queue, *args, **kwargs)
+    queue.flush(restore=True)
@@ -0,0 +1,161 @@
+"""Per-tick input recording and replay.
+
+A log is a small header followed by tagged records, appended as the game
+runs:
+
+    TICK      held keys (bitmask) and mouse motion for one tick     6 bytes
+    REPEAT    the previous TICK again, `count` more times           3 bytes
+    CHECKSUM  CRC32 of the entity state after tick `tick`           9 bytes
+
+Held keys rarely change between ticks, so an idle or walking minute is a
+handful of records. Checksums let a replay confirm it reproduced the
+session exactly; a truncated log (the game crashed) replays up to its last
+complete record.
+
+Only the local simulation is reproduced. Streaming terrain is sampled with
+ChunkedTerrain.blocking while recording and replaying, so heights do not
+depend on worker timing. Other players' avatars from a position server are
+not in the log; the header flags such sessions and checksums leave those
+rows out.
+"""
+import struct
+import zlib
+from collections import namedtuple
+
+import numpy as np
+import pygame
+
+MAGIC = b'GINP'
+VERSION = 2  # 2: streaming sessions sample blocking terrain, checksums skip remote rows
+HEADER = struct.Struct('<4sBBHiH')  # magic, version, flags, tick rate, seed, checksum interval
+TICK = struct.Struct('<BBhh')       # tag, keys, mouse dx, mouse dy
+REPEAT = struct.Struct('<BH')       # tag, count
+CHECKSUM = struct.Struct('<BII')    # tag, tick, crc32
+TAG_TICK, TAG_REPEAT, TAG_CHECKSUM = 1, 2, 3
+FLAG_STREAMING = 1
+FLAG_NETWORKED = 2
+MOUSE_TURN = 0.5  # Degrees of turn per pixel of horizontal mouse motion
+
+KEY_FORWARD, KEY_BACK, KEY_LEFT, KEY_RIGHT = 1, 2, 4, 8
+KEY_BITS = ((pygame.K_w, KEY_FORWARD), (pygame.K_s, KEY_BACK),
+            (pygame.K_a, KEY_LEFT), (pygame.K_d, KEY_RIGHT))
+
+
+def key_mask(pressed):
+    """KEY_* bits for the movement keys held in a pygame.key.get_pressed() result."""
+    keys = 0
+    for key, bit in KEY_BITS:
+        if pressed[key]:
+            keys |= bit
+    return keys
+
+
+class InputFrame(namedtuple('InputFrame', 'keys mouse_dx mouse_dy')):
+    """Everything the simulation reads from the player for one tick."""
+    __slots__ = ()
+
+    @property
+    def movement(self):
+        # (forward, right), each -1, 0 or 1
+        return (bool(self.keys & KEY_FORWARD) - bool(self.keys & KEY_BACK),
+                bool(self.keys & KEY_RIGHT) - bool(self.keys & KEY_LEFT))
+
+
+def apply_input(avatar, frame):
+    """Turn and move `avatar` for one tick of input, before the store updates."""
+    if frame.mouse_dx:
+        avatar.rotate(frame.mouse_dx * MOUSE_TURN)
+    forward, right = frame.movement
+    if forward or right:
+        avatar.move(forward, right)
+
+
+def state_checksum(store, rows=None):
+    """CRC32 of everything a tick changes in an EntityStore, for `rows` or all of them."""
+    live = slice(0, store.count) if rows is None else np.asarray(rows, dtype=np.int64)
+    crc = zlib.crc32(store.positions[live].tobytes())
+    crc = zlib.crc32(store.rotations[live].tobytes(), crc)
+    return zlib.crc32(store.animation_frames[live].tobytes(), crc)
+
+
+def _clamp16(value):
+    return max(-32768, min(32767, int(value)))
+
+
+class InputRecorder:
+    def __init__(self, path, tick_rate=60, seed=0, streaming=False, checksum_interval=60,
+                 networked=False):
+        self.path = path
+        self.checksum_interval = checksum_interval
+        self.ticks = 0
+        self._previous = None
+        self._repeats = 0
+        self.file = open(path, 'wb')
+        flags = (FLAG_STREAMING if streaming else 0) | (FLAG_NETWORKED if networked else 0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, flags, tick_rate, seed, checksum_interval))
+
+    def record(self, frame, checksum=None):
+        """Append the input of the tick just simulated; `checksum()` is called every interval."""
+        frame = InputFrame(frame.keys, _clamp16(frame.mouse_dx), _clamp16(frame.mouse_dy))
+        if frame == self._previous and self._repeats < 0xFFFF:
+            self._repeats += 1
+        else:
+            self._flush_repeats()
+            self.file.write(TICK.pack(TAG_TICK, *frame))
+            self._previous = frame
+        self.ticks += 1
+        if checksum is not None and self.ticks % self.checksum_interval == 0:
+            self._flush_repeats()
+            self.file.write(CHECKSUM.pack(TAG_CHECKSUM, self.ticks, checksum()))
+            self.file.flush()
+
+    def _flush_repeats(self):
+        if self._repeats:
+            self.file.write(REPEAT.pack(TAG_REPEAT, self._repeats))
+            self._repeats = 0
+
+    def close(self):
+        if not self.file.closed:
+            self._flush_repeats()
+            self.file.close()
+
+
+class InputReplay:
+    """A recorded log, expanded to one InputFrame per tick."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError(f"{path} is not an input log")
+        magic, version, flags, self.tick_rate, self.seed, self.checksum_interval = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} input log")
+        self.streaming = bool(flags & FLAG_STREAMING)
+        self.networked = bool(flags & FLAG_NETWORKED)  # Other players were connected
+        self.frames = []
+        self.checksums = {}  # tick -> crc32 of the state after it
+        self._parse(data, HEADER.size)
+
+    def _parse(self, data, offset):
+        sizes = {TAG_TICK: TICK, TAG_REPEAT: REPEAT, TAG_CHECKSUM: CHECKSUM}
+        while offset < len(data):
+            record = sizes.get(data[offset])
+            if record is None:
+                raise ValueError(f"corrupt input log at byte {offset}")
+            if offset + record.size > len(data):
+                break  # Truncated final record
+            if record is TICK:
+                _, keys, dx, dy = TICK.unpack_from(data, offset)
+                self.frames.append(InputFrame(keys, dx, dy))
+            elif record is REPEAT:
+                _, count = REPEAT.unpack_from(data, offset)
+                self.frames.extend([self.frames[-1]] * count)
+            else:
+                _, tick, crc = CHECKSUM.unpack_from(data, offset)
+                self.checksums[tick] = crc
+            offset += record.size
+
+    def __len__(self):
+        return len(self.frames)
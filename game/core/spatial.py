@@ -0,0 +1,182 @@
+import math
+
+
+def _distance_sq_to_box(x, z, box):
+    # Squared distance from a point to an axis-aligned rectangle; 0 inside it
+    min_x, min_z, max_x, max_z = box
+    dx = max(min_x - x, 0.0, x - max_x)
+    dz = max(min_z - z, 0.0, z - max_z)
+    return dx * dx + dz * dz
+
+
+class SpatialGrid:
+    """Uniform grid over the XZ plane for colliders and trigger areas.
+
+    Items are any hashable key with an axis-aligned bounding rectangle
+    (min_x, min_z, max_x, max_z). Each item is registered in every cell its
+    rectangle overlaps, so queries only look at the cells around the query
+    area instead of every item. Pick a cell size around the size of a
+    typical item; items much larger than a cell are fine but cost more to
+    insert and move.
+    """
+
+    def __init__(self, cell_size=8.0):
+        self.cell_size = float(cell_size)
+        self.cells = {}   # (cx, cz) -> set of keys
+        self.bounds = {}  # key -> (min_x, min_z, max_x, max_z)
+        self._extent = None  # Cell range ever occupied; only grows, bounds nearest()
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def __contains__(self, key):
+        return key in self.bounds
+
+    def _cell_range(self, min_x, min_z, max_x, max_z):
+        s = self.cell_size
+        return (math.floor(min_x / s), math.floor(min_z / s),
+                math.floor(max_x / s), math.floor(max_z / s))
+
+    def _grow_extent(self, box):
+        cx0, cz0, cx1, cz1 = self._cell_range(*box)
+        if self._extent is None:
+            self._extent = (cx0, cz0, cx1, cz1)
+        else:
+            e = self._extent
+            self._extent = (min(e[0], cx0), min(e[1], cz0), max(e[2], cx1), max(e[3], cz1))
+
+    def _cells_for(self, box):
+        cx0, cz0, cx1, cz1 = self._cell_range(*box)
+        for cz in range(cz0, cz1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                yield cx, cz
+
+    def insert(self, key, min_x, min_z, max_x, max_z):
+        if key in self.bounds:
+            raise KeyError(f"{key!r} is already in the grid")
+        box = (float(min_x), float(min_z), float(max_x), float(max_z))
+        self.bounds[key] = box
+        self._grow_extent(box)
+        for cell in self._cells_for(box):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        box = self.bounds.pop(key)
+        for cell in self._cells_for(box):
+            members = self.cells[cell]
+            members.discard(key)
+            if not members:
+                del self.cells[cell]
+
+    def move(self, key, min_x, min_z, max_x, max_z):
+        old = self.bounds[key]
+        box = (float(min_x), float(min_z), float(max_x), float(max_z))
+        self.bounds[key] = box
+        # Most moves stay within the same cells; only touch the sets when they don't
+        if self._cell_range(*old) == self._cell_range(*box):
+            return
+        for cell in self._cells_for(old):
+            members = self.cells[cell]
+            members.discard(key)
+            if not members:
+                del self.cells[cell]
+        self._grow_extent(box)
+        for cell in self._cells_for(box):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def clear(self):
+        self.cells.clear()
+        self.bounds.clear()
+        self._extent = None
+
+    def _candidates(self, box):
+        cx0, cz0, cx1, cz1 = self._cell_range(*box)
+        # Very large query areas: walking occupied cells is cheaper than walking empty ones
+        if (cx1 - cx0 + 1) * (cz1 - cz0 + 1) > len(self.cells):
+            found = set()
+            for (cx, cz), members in self.cells.items():
+                if cx0 <= cx <= cx1 and cz0 <= cz <= cz1:
+                    found.update(members)
+            return found
+        found = set()
+        for cz in range(cz0, cz1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                members = self.cells.get((cx, cz))
+                if members:
+                    found.update(members)
+        return found
+
+    def query_aabb(self, min_x, min_z, max_x, max_z):
+        """Keys whose rectangles overlap the given rectangle (touching edges count)."""
+        box = (min_x, min_z, max_x, max_z)
+        result = []
+        for key in self._candidates(box):
+            b = self.bounds[key]
+            if b[0] <= max_x and min_x <= b[2] and b[1] <= max_z and min_z <= b[3]:
+                result.append(key)
+        return result
+
+    def query_point(self, x, z):
+        """Keys whose rectangles strictly contain the point."""
+        members = self.cells.get((math.floor(x / self.cell_size), math.floor(z / self.cell_size)))
+        if not members:
+            return []
+        result = []
+        for key in members:
+            b = self.bounds[key]
+            if b[0] < x < b[2] and b[1] < z < b[3]:
+                result.append(key)
+        return result
+
+    def query_radius(self, x, z, radius):
+        """Keys whose rectangles come within `radius` of the point."""
+        r_sq = radius * radius
+        candidates = self._candidates((x - radius, z - radius, x + radius, z + radius))
+        return [key for key in candidates if _distance_sq_to_box(x, z, self.bounds[key]) <= r_sq]
+
+    def nearest(self, x, z, max_distance=None):
+        """(key, distance) of the item closest to the point, or None.
+
+        Searches rings of cells outwards from the point and stops once the
+        ring is further away than the best match found so far.
+        """
+        if not self.bounds:
+            return None
+        s = self.cell_size
+        cx, cz = math.floor(x / s), math.floor(z / s)
+        best_key, best_sq = None, math.inf
+        limit_sq = math.inf if max_distance is None else max_distance * max_distance
+        seen = set()
+        # Beyond this ring there are no occupied cells left
+        e = self._extent
+        max_ring = max(abs(cx - e[0]), abs(cx - e[2]), abs(cz - e[1]), abs(cz - e[3]))
+        ring = 0
+        while ring <= max_ring:
+            # Closest any point in this ring can be to the query point
+            ring_distance = max(ring - 1, 0) * s
+            if ring_distance * ring_distance > min(best_sq, limit_sq):
+                break
+            for cell in self._ring(cx, cz, ring):
+                for key in self.cells.get(cell, ()):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    d_sq = _distance_sq_to_box(x, z, self.bounds[key])
+                    if d_sq < best_sq:
+                        best_key, best_sq = key, d_sq
+            ring += 1
+        if best_key is None or best_sq > limit_sq:
+            return None
+        return best_key, math.sqrt(best_sq)
+
+    @staticmethod
+    def _ring(cx, cz, ring):
+        if ring == 0:
+            yield cx, cz
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cz - ring
+            yield cx + dx, cz + ring
+        for dz in range(-ring + 1, ring):
+            yield cx - ring, cz + dz
+            yield cx + ring, cz + dz
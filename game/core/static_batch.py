@@ -0,0 +1,197 @@
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+
+from .gl_buffers import interleave, vbo_supported
+from .profiler import profiler
+
+# Six faces, four corners each: position offsets in units of (width, height, depth)
+# relative to the centre of the footprint, wound counter-clockwise seen from outside
+_BOX_CORNERS = np.array([
+    # -Z (front)
+    (0.5, 0, -0.5), (-0.5, 0, -0.5), (-0.5, 1, -0.5), (0.5, 1, -0.5),
+    # +Z (back)
+    (-0.5, 0, 0.5), (0.5, 0, 0.5), (0.5, 1, 0.5), (-0.5, 1, 0.5),
+    # -X
+    (-0.5, 0, -0.5), (-0.5, 0, 0.5), (-0.5, 1, 0.5), (-0.5, 1, -0.5),
+    # +X
+    (0.5, 0, 0.5), (0.5, 0, -0.5), (0.5, 1, -0.5), (0.5, 1, 0.5),
+    # +Y (roof)
+    (-0.5, 1, 0.5), (0.5, 1, 0.5), (0.5, 1, -0.5), (-0.5, 1, -0.5),
+    # -Y (floor)
+    (-0.5, 0, -0.5), (0.5, 0, -0.5), (0.5, 0, 0.5), (-0.5, 0, 0.5),
+], dtype=np.float32)
+_BOX_NORMALS = np.repeat(np.array([
+    (0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0), (0, 1, 0), (0, -1, 0),
+], dtype=np.float32), 4, axis=0)
+_BOX_TEXCOORDS = np.tile(np.array([(0, 0), (1, 0), (1, 1), (0, 1)], dtype=np.float32), (6, 1))
+_BOX_INDICES = (np.arange(6, dtype=np.uint32)[:, None] * 4
+                + np.array([0, 1, 2, 0, 2, 3], dtype=np.uint32)).ravel()
+
+BOX_VERTICES = len(_BOX_CORNERS)
+BOX_INDICES = len(_BOX_INDICES)
+_FLOATS_PER_VERTEX = 8
+_STRIDE = _FLOATS_PER_VERTEX * 4
+
+
+def _box_texcoords(uv=(0.0, 0.0, 1.0, 1.0)):
+    # Each face covers the (u0, v0, u1, v1) region, e.g. an image's slot in an atlas page
+    u0, v0, u1, v1 = uv
+    return _BOX_TEXCOORDS * np.array([u1 - u0, v1 - v0], dtype=np.float32) + np.array([u0, v0], dtype=np.float32)
+
+
+def box_vertices(position, size, uv=(0.0, 0.0, 1.0, 1.0)):
+    """Interleaved vertex data for a closed box standing on `position`.
+
+    `size` is (width, height, depth); the box is centred on position in X
+    and Z and extends upwards from it, like the buildings in World. Every
+    face maps the texture region `uv`.
+    """
+    vertices = _BOX_CORNERS * np.asarray(size, dtype=np.float32) + np.asarray(position, dtype=np.float32)
+    return interleave(vertices, _BOX_NORMALS, _box_texcoords(uv))
+
+
+class StaticBatch:
+    """Boxes sharing one texture, merged into a single vertex and index buffer.
+
+    Every box owns a fixed-size slot of vertices. Removing a box moves the
+    last slot into the hole, so the live boxes stay contiguous and the
+    batch always draws with one call. Changed slots are remembered and
+    only those are re-uploaded with glBufferSubData on the next draw; the
+    whole buffer is rebuilt only when it has to grow.
+    """
+
+    def __init__(self, capacity=64, use_vbo=True):
+        self.use_vbo = use_vbo
+        self.capacity = 0
+        self.count = 0
+        self.data = np.zeros((0, BOX_VERTICES, _FLOATS_PER_VERTEX), dtype=np.float32)
+        self.indices = np.zeros(0, dtype=np.uint32)
+        self.uv = (0.0, 0.0, 1.0, 1.0)  # Texture region every face maps; see set_uv
+        self.keys = []    # slot -> key
+        self.slots = {}   # key -> slot
+        self.vbo = None
+        self.ibo = None
+        self._gpu_capacity = 0
+        self._dirty = set()
+        self._grow(max(capacity, 1))
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def _grow(self, capacity):
+        data = np.zeros((capacity, BOX_VERTICES, _FLOATS_PER_VERTEX), dtype=np.float32)
+        data[:self.count] = self.data[:self.count]
+        self.data = data
+        offsets = np.arange(capacity, dtype=np.uint32)[:, None] * BOX_VERTICES
+        self.indices = np.ascontiguousarray((_BOX_INDICES[None, :] + offsets).ravel())
+        self.capacity = capacity
+
+    def add(self, key, position, size):
+        if key in self.slots:
+            raise KeyError(f"{key!r} is already in the batch")
+        if self.count == self.capacity:
+            self._grow(self.capacity * 2)
+        slot = self.count
+        self.data[slot] = box_vertices(position, size, self.uv)
+        self.keys.append(key)
+        self.slots[key] = slot
+        self.count += 1
+        self._dirty.add(slot)
+
+    def set_uv(self, uv):
+        """Map every face to `uv`, e.g. once the batch's texture lands in an atlas page."""
+        uv = tuple(uv)
+        if uv == self.uv:
+            return
+        self.uv = uv
+        self.data[:self.count, :, 6:8] = _box_texcoords(uv)
+        self._dirty.update(range(self.count))
+
+    def remove(self, key):
+        slot = self.slots.pop(key)
+        last = self.count - 1
+        if slot != last:
+            moved = self.keys[last]
+            self.data[slot] = self.data[last]
+            self.keys[slot] = moved
+            self.slots[moved] = slot
+            self._dirty.add(slot)
+        self.keys.pop()
+        self.count -= 1
+        self._dirty.discard(last)
+
+    def _sync(self):
+        if self.vbo is None:
+            self.vbo = glGenBuffers(1)
+            self.ibo = glGenBuffers(1)
+        if self._gpu_capacity != self.capacity:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBufferData(GL_ARRAY_BUFFER, self.data.nbytes, self.data, GL_STATIC_DRAW)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+            self._gpu_capacity = self.capacity
+        elif self._dirty:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            slot_bytes = BOX_VERTICES * _STRIDE
+            # One upload per run of consecutive dirty slots
+            dirty = sorted(self._dirty)
+            start = prev = dirty[0]
+            for slot in dirty[1:] + [None]:
+                if slot is not None and slot == prev + 1:
+                    prev = slot
+                    continue
+                chunk = np.ascontiguousarray(self.data[start:prev + 1])
+                glBufferSubData(GL_ARRAY_BUFFER, start * slot_bytes, chunk.nbytes, chunk)
+                if slot is not None:
+                    start = prev = slot
+        self._dirty.clear()
+
+    def draw(self):
+        if self.count == 0:
+            return
+        count = self.count * BOX_INDICES
+        profiler.count('draw_calls')
+        profiler.count('vertices', count)
+        if self.use_vbo and vbo_supported():
+            self._sync()
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+            self._set_pointers(ctypes.c_void_p(0), ctypes.c_void_p(12), ctypes.c_void_p(24))
+            glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+            self._unset_pointers()
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            return
+
+        # Client-side arrays: still one draw call, just no buffer objects
+        base = self.data.ctypes.data
+        self._set_pointers(ctypes.c_void_p(base), ctypes.c_void_p(base + 12), ctypes.c_void_p(base + 24))
+        glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, self.indices)
+        self._unset_pointers()
+
+    @staticmethod
+    def _set_pointers(vertices, normals, texcoords):
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, GL_FLOAT, _STRIDE, vertices)
+        glNormalPointer(GL_FLOAT, _STRIDE, normals)
+        glTexCoordPointer(2, GL_FLOAT, _STRIDE, texcoords)
+
+    @staticmethod
+    def _unset_pointers():
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def release(self):
+        if self.vbo is not None:
+            glDeleteBuffers(2, [self.vbo, self.ibo])
+            self.vbo = self.ibo = None
+        self._gpu_capacity = 0
+        self._dirty = set(range(self.count))
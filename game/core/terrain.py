@@ -3,114 +3,269 @@ from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import numpy as np
-from noise import snoise2
+import logging
+import time
+from .heightmap import (generate_height_map, build_mesh, sample_heights,
+                        sample_gradients, gradients_to_normals)
+from .gl_buffers import MeshBuffer, IndexBuffer, vbo_supported
+from .lod import (constrain_levels, max_level, patch_extents, patch_lod_indices,
+                  patch_ordered_indices, select_levels)
+from .terrain_cache import TerrainCache
+from .profiler import profiler
+from .render_queue import RenderState, WIREFRAME, OVERLAY, draw_now
+
+logger = logging.getLogger(__name__)
 
 class Terrain:
-    def __init__(self, size=50, scale=1):
+    def __init__(self, size=50, scale=1, use_vbo=True, patch_size=16, cache_dir=None, workers=1):
         self.size = size
         self.scale = scale
+        self.workers = workers        # Processes used to sample noise; output is identical
+        self.patch_size = patch_size  # Quads per side of a frustum-culling and LOD patch
+        self.use_vbo = use_vbo   # Falls back to immediate mode when False or unsupported
+        self.noise_scale = 25.0  # Increased scale for more visible variations
+        self.octaves = 4         # Reduced octaves for simpler terrain
+        self.persistence = 0.5
+        self.lacunarity = 2.0
+        self.max_height = 2.0    # Reduced maximum height for testing
         self.height_map = None
-        self.vertices = []
-        self.normals = []
-        self.texcoords = []
-        self.generate_terrain()
-        print(f"Terrain generated with size {size}x{size}")
+        self.vertices = None
+        self.normals = None
+        self.texcoords = None
+        self.indices = None
+        self.patches = []        # (first_index, index_count) per culling patch
+        self.patch_mins = None
+        self.patch_maxs = None
+        self.patch_cells = patch_extents(size, size, patch_size)  # (x0, z0, x1, z1) per patch
+        # Geomipmapping needs power-of-two patches; full detail within one patch of the camera
+        self.max_lod = max_level(patch_size) if patch_size & (patch_size - 1) == 0 else 0
+        self.lod_distance = patch_size * scale  # None draws every patch at full detail
+        self.mesh = None         # GPU buffers, created lazily on the GL thread
+        self._lod_buffers = {}   # (patch, level, coarser edge mask) -> IndexBuffer
+        self.triangles_drawn = 0 # Triangles submitted by the last draw()
+        self.cache = TerrainCache(cache_dir) if cache_dir else None
+        self.cache_hit = False
+        self.build_time = 0.0
+        
+        start = time.perf_counter()
+        if not self._load_cached():
+            self.generate_terrain()
+            self._store_cached()
+        self.build_time = time.perf_counter() - start
+        source = "loaded from cache" if self.cache_hit else "generated"
+        logger.info("Terrain %s with size %dx%d in %.1f ms", source, size, size,
+                    self.build_time * 1000)
+        
+    def cache_params(self):
+        # Everything that changes the generated arrays
+        return {
+            'size': self.size,
+            'scale': self.scale,
+            'patch_size': self.patch_size,
+            'noise_scale': self.noise_scale,
+            'octaves': self.octaves,
+            'persistence': self.persistence,
+            'lacunarity': self.lacunarity,
+            'max_height': self.max_height,
+        }
+        
+    def _load_cached(self):
+        if self.cache is None:
+            return False
+        arrays = self.cache.load(self.cache_params())
+        if arrays is None:
+            return False
+        # Memory-mapped, read-only views; nothing is copied until GPU upload
+        self.height_map = arrays['height_map']
+        self.vertices = arrays['vertices']
+        self.normals = arrays['normals']
+        self.texcoords = arrays['texcoords']
+        self.indices = arrays['indices']
+        self.patches = [(int(first), int(count)) for first, count in arrays['patches']]
+        self.patch_mins = arrays['patch_mins']
+        self.patch_maxs = arrays['patch_maxs']
+        self.cache_hit = True
+        return True
+        
+    def _store_cached(self):
+        if self.cache is None:
+            return
+        try:
+            self.cache.store(self.cache_params(), {
+                'height_map': self.height_map,
+                'vertices': self.vertices,
+                'normals': self.normals,
+                'texcoords': self.texcoords,
+                'indices': self.indices,
+                'patches': np.array(self.patches, dtype=np.int64).reshape(-1, 2),
+                'patch_mins': self.patch_mins,
+                'patch_maxs': self.patch_maxs,
+            })
+        except OSError as e:
+            logger.warning("Could not write terrain cache: %s", e)
         
     def generate_terrain(self):
-        # Generate height map using Perlin noise
-        self.height_map = np.zeros((self.size, self.size))
-        scale = 25.0  # Increased scale for more visible variations
-        octaves = 4   # Reduced octaves for simpler terrain
-        persistence = 0.5
-        lacunarity = 2.0
-        
-        print("Generating height map...")
-        for i in range(self.size):
-            for j in range(self.size):
-                x = i/scale
-                y = j/scale
-                elevation = snoise2(x, y, octaves, persistence, lacunarity)
-                self.height_map[i][j] = elevation
-        
-        # Normalize height map
-        self.height_map = (self.height_map - self.height_map.min()) / (self.height_map.max() - self.height_map.min())
-        self.height_map *= 2.0  # Reduced maximum height for testing
-        
-        print("Generating vertices and normals...")
-        # Generate vertices, normals, and texture coordinates
-        for z in range(self.size - 1):
-            for x in range(self.size - 1):
-                # Vertices for current quad
-                v1 = self._get_vertex(x, z)
-                v2 = self._get_vertex(x + 1, z)
-                v3 = self._get_vertex(x + 1, z + 1)
-                v4 = self._get_vertex(x, z + 1)
-                
-                # Calculate normal for lighting
-                normal = self._calculate_normal(v1, v2, v3)
-                
-                self.vertices.extend([v1, v2, v3, v4])
-                self.normals.extend([normal] * 4)
-                
-                # Texture coordinates
-                self.texcoords.extend([
-                    (x/5, z/5),          # Increased tiling for better visibility
-                    ((x+1)/5, z/5),
-                    ((x+1)/5, (z+1)/5),
-                    (x/5, (z+1)/5)
-                ])
-        
-        print(f"Generated {len(self.vertices)} vertices")
-    
-    def _get_vertex(self, x, z):
-        return (
-            (x - self.size/2) * self.scale,
-            self.height_map[x][z],
-            (z - self.size/2) * self.scale
+        # Generate height map using Perlin noise, one whole-grid pass
+        logger.debug("Generating height map...")
+        self.height_map = generate_height_map(
+            self.size,
+            noise_scale=self.noise_scale,
+            octaves=self.octaves,
+            persistence=self.persistence,
+            lacunarity=self.lacunarity,
+            max_height=self.max_height,
+            workers=self.workers,
         )
+        
+        logger.debug("Generating vertices and normals...")
+        # Shared per-vertex arrays (float32) plus triangle indices into them
+        self.vertices, self.normals, self.texcoords, _ = build_mesh(
+            self.height_map, cell_size=self.scale
+        )
+        
+        # Group triangles by patch so each visible patch is one index range
+        self.indices, ranges = patch_ordered_indices(self.size, self.size, self.patch_size)
+        grid = self.vertices.reshape(self.size, self.size, 3)
+        self.patches = [(first, count) for first, count, *_ in ranges]
+        self.patch_mins = np.array([grid[z0:z1 + 1, x0:x1 + 1].min(axis=(0, 1))
+                                    for _, _, x0, z0, x1, z1 in ranges])
+        self.patch_maxs = np.array([grid[z0:z1 + 1, x0:x1 + 1].max(axis=(0, 1))
+                                    for _, _, x0, z0, x1, z1 in ranges])
+        
+        logger.debug("Generated %d vertices", len(self.vertices))
     
-    def _calculate_normal(self, v1, v2, v3):
-        # Calculate surface normal for lighting
-        u = np.subtract(v2, v1)
-        v = np.subtract(v3, v1)
-        normal = np.cross(u, v)
-        length = np.linalg.norm(normal)
-        if length == 0:
-            return (0, 1, 0)  # Default normal if calculation fails
-        return normal / length
-    
-    def draw(self, grass_texture):
-        glEnable(GL_TEXTURE_2D)
-        glBindTexture(GL_TEXTURE_2D, grass_texture)
-        
-        glBegin(GL_QUADS)
-        for i in range(0, len(self.vertices), 4):
-            for j in range(4):
-                glNormal3fv(self.normals[i + j])
-                glTexCoord2fv(self.texcoords[i + j])
-                glVertex3fv(self.vertices[i + j])
-        glEnd()
+    def draw(self, grass_texture, frustum=None, color=(1.0, 1.0, 1.0)):
+        draw_now(self.submit, grass_texture, frustum, color)
+        
+    def submit(self, queue, grass_texture, frustum=None, color=(1.0, 1.0, 1.0)):
+        # Textured, lit surface plus a white wireframe overlay for debugging
+        surface = RenderState(texture=grass_texture)
+        if self.use_vbo and vbo_supported():
+            if self.mesh is None:
+                self.mesh = MeshBuffer(self.vertices, self.normals, self.texcoords, self.indices)
+            ranges, coarse = self.visible_batches(frustum)
+            indices = sum(count for _, count in ranges) + sum(buffer.count for buffer in coarse)
+            self.triangles_drawn = 2 * indices // 3
+            queue.submit(surface, lambda: self._draw_ranges(ranges, coarse, color), name='terrain')
+            queue.submit(WIREFRAME,
+                         lambda: self._draw_ranges(ranges, coarse, (1, 1, 1), wireframe=True),
+                         OVERLAY, 'terrain.wireframe')
+        else:
+            self.triangles_drawn = 2 * len(self.indices) // 3
+            queue.submit(surface, lambda: self._draw_immediate(color), name='terrain')
+            queue.submit(WIREFRAME, lambda: self._draw_immediate((1, 1, 1), wireframe=True),
+                         OVERLAY, 'terrain.wireframe')
+            
+    def visible_batches(self, frustum=None):
+        """Patches inside the frustum as (ranges, buffers).
+
+        Full-detail patches are index ranges of the mesh, adjacent ones merged;
+        patches at a coarser level each get an IndexBuffer (see lod_buffer).
+        Without a frustum everything is drawn at full detail.
+        """
+        if frustum is None:
+            return [(0, len(self.indices))], []
+        visible = np.flatnonzero(frustum.visible_aabbs(self.patch_mins, self.patch_maxs))
+        levels = self.patch_levels(visible, frustum.eye)
+        ranges = []
+        buffers = []
+        for patch in visible:
+            level, mask = levels.get(patch, (0, 0))
+            if level or mask:
+                buffers.append(self.lod_buffer(patch, level, mask))
+                continue
+            first, count = self.patches[patch]
+            if ranges and ranges[-1][0] + ranges[-1][1] == first:
+                ranges[-1] = (ranges[-1][0], ranges[-1][1] + count)
+            else:
+                ranges.append((first, count))
+        return ranges, buffers
+        
+    def patch_levels(self, patches, eye):
+        """(level, coarser edge mask) per patch index from its distance to `eye`.
+
+        Patches narrower than patch_size (the last row and column when it does
+        not divide the map) cannot be coarsened, so they and their neighbours
+        stay at full detail and no edge between them needs snapping.
+        """
+        if eye is None or self.lod_distance is None or not self.max_lod or not len(patches):
+            return {}
+        n = self.patch_size
+        keys = {}
+        for patch in patches:
+            x0, z0, _, _ = self.patch_cells[patch]
+            keys[(x0 // n, z0 // n)] = patch
+        centers = (self.patch_mins[patches] + self.patch_maxs[patches]) / 2
+        chosen = select_levels(centers, eye, self.lod_distance, self.max_lod)
+        levels = {key: int(level) for key, level in zip(keys, chosen)}
+        for (px, pz), patch in keys.items():
+            x0, z0, x1, z1 = self.patch_cells[patch]
+            if x1 - x0 < n or z1 - z0 < n:
+                for key in ((px, pz), (px - 1, pz), (px + 1, pz), (px, pz - 1), (px, pz + 1)):
+                    if key in levels:
+                        levels[key] = 0
+        masks = constrain_levels(levels)
+        return {patch: (levels[key], masks[key]) for key, patch in keys.items()}
         
-        # Draw wireframe overlay for debugging
-        glDisable(GL_TEXTURE_2D)
-        glDisable(GL_LIGHTING)
-        glColor3f(1, 1, 1)  # White wireframe
-        glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+    def lod_buffer(self, patch, level, mask):
+        key = (patch, level, mask)
+        if key not in self._lod_buffers:
+            x0, z0, _, _ = self.patch_cells[patch]
+            self._lod_buffers[key] = IndexBuffer(
+                patch_lod_indices(self.size, x0, z0, self.patch_size, level, mask))
+        return self._lod_buffers[key]
         
-        glBegin(GL_QUADS)
-        for i in range(0, len(self.vertices), 4):
-            for j in range(4):
-                glVertex3fv(self.vertices[i + j])
+    def _draw_ranges(self, ranges, buffers, color, wireframe=False):
+        glColor3f(*color)
+        self.mesh.bind(normals=not wireframe, texcoords=not wireframe)
+        for first, count in ranges:
+            self.mesh.draw_bound(GL_TRIANGLES, first, count)
+        for indices in buffers:
+            indices.bind()
+            indices.draw_bound()
+        self.mesh.unbind()
+        profiler.count('draw_calls', len(ranges) + len(buffers))
+        profiler.count('vertices', sum(count for _, count in ranges) +
+                       sum(indices.count for indices in buffers))
+        
+    def release(self):
+        if self.mesh is not None:
+            self.mesh.delete()
+            self.mesh = None
+        for indices in self._lod_buffers.values():
+            indices.delete()
+        self._lod_buffers.clear()
+            
+    def _draw_immediate(self, color, wireframe=False):
+        profiler.count('draw_calls')
+        profiler.count('vertices', len(self.indices))
+        glColor3f(*color)
+        glBegin(GL_TRIANGLES)
+        for i in self.indices:
+            if not wireframe:
+                glNormal3fv(self.normals[i])
+                glTexCoord2fv(self.texcoords[i])
+            glVertex3fv(self.vertices[i])
         glEnd()
         
-        glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
-        glEnable(GL_LIGHTING)
+    def world_to_grid(self, xs, zs):
+        # Inverse of the vertex placement in build_mesh: x = (i - size/2) * scale
+        gx = np.asarray(xs, dtype=np.float64) / self.scale + self.size / 2
+        gz = np.asarray(zs, dtype=np.float64) / self.scale + self.size / 2
+        return gx, gz
         
-    def get_height(self, x, z):
-        # Get interpolated height at any point
-        terrain_x = int((x + self.size/2) / self.scale)
-        terrain_z = int((z + self.size/2) / self.scale)
+    def get_heights(self, xs, zs):
+        # Bilinear heights for arrays of world positions, clamped at the map edge
+        gx, gz = self.world_to_grid(xs, zs)
+        return sample_heights(self.height_map, gx, gz)
+        
+    def get_slopes(self, xs, zs):
+        # (dh/dx, dh/dz) of the interpolated surface at each position
+        gx, gz = self.world_to_grid(xs, zs)
+        return sample_gradients(self.height_map, gx, gz, self.scale)
         
-        if 0 <= terrain_x < self.size-1 and 0 <= terrain_z < self.size-1:
-            return self.height_map[terrain_x][terrain_z]
-        return 0
\ No newline at end of file
+    def get_normals(self, xs, zs):
+        return gradients_to_normals(*self.get_slopes(xs, zs))
+        
+    def get_height(self, x, z):
+        return float(self.get_heights(x, z))
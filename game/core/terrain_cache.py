@@ -0,0 +1,104 @@
+"""Content-addressed on-disk cache for generated terrain arrays.
+
+Each entry is a directory named after a hash of the generation parameters
+and FORMAT_VERSION, holding one .npy file per array and a manifest with
+their shapes, dtypes and digests. Warm loads memory-map the .npy files, so
+nothing is recomputed or copied into process memory up front.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout or meaning of cached arrays changes
+FORMAT_VERSION = 1
+
+_DIGEST_BLOCK = 16 * 2**20
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'language_game', 'terrain')
+
+
+def _digest(array):
+    digest = hashlib.blake2b(digest_size=16)
+    flat = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+    for start in range(0, len(flat), _DIGEST_BLOCK):
+        digest.update(flat[start:start + _DIGEST_BLOCK])
+    return digest.hexdigest()
+
+
+class TerrainCache:
+    def __init__(self, root=None, verify=True):
+        self.root = root or default_cache_dir()
+        self.verify = verify  # Hash array contents on load, not just shapes
+
+    def key(self, params):
+        payload = json.dumps({'version': FORMAT_VERSION, 'params': params}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def path(self, params):
+        return os.path.join(self.root, self.key(params))
+
+    def load(self, params):
+        """Memory-mapped arrays for `params`, or None on a miss.
+
+        Stale or corrupt entries are deleted so the caller rebuilds them.
+        """
+        entry = self.path(params)
+        manifest_path = os.path.join(entry, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            return None
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('version') != FORMAT_VERSION or manifest.get('params') != params:
+                raise ValueError("stale cache entry")
+            arrays = {}
+            for name, meta in manifest['arrays'].items():
+                array = np.load(os.path.join(entry, f'{name}.npy'), mmap_mode='r')
+                if list(array.shape) != meta['shape'] or str(array.dtype) != meta['dtype']:
+                    raise ValueError(f"shape/dtype mismatch for {name}")
+                if self.verify and _digest(array) != meta['digest']:
+                    raise ValueError(f"checksum mismatch for {name}")
+                arrays[name] = array
+            return arrays
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Discarding terrain cache entry %s: %s", entry, e)
+            self.discard(params)
+            return None
+
+    def store(self, params, arrays):
+        os.makedirs(self.root, exist_ok=True)
+        entry = self.path(params)
+        # Write into a scratch directory and rename it into place so readers
+        # never observe a half-written entry
+        scratch = tempfile.mkdtemp(prefix='.tmp-', dir=self.root)
+        try:
+            manifest = {'version': FORMAT_VERSION, 'params': params, 'arrays': {}}
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                np.save(os.path.join(scratch, f'{name}.npy'), array)
+                manifest['arrays'][name] = {
+                    'shape': list(array.shape),
+                    'dtype': str(array.dtype),
+                    'digest': _digest(array),
+                }
+            with open(os.path.join(scratch, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f, sort_keys=True)
+            if os.path.exists(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(scratch, entry)
+        except OSError:
+            shutil.rmtree(scratch, ignore_errors=True)
+            raise
+
+    def discard(self, params):
+        shutil.rmtree(self.path(params), ignore_errors=True)
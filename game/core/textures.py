@@ -0,0 +1,363 @@
+"""Texture loading off the main thread.
+
+Images are decoded to RGBA in a thread pool and the decoded pixels are kept
+in an on-disk cache (see core/terrain_cache.py), so warm starts memory-map
+them instead of decoding JPEGs again. The GL thread calls
+`TextureManager.upload_pending` once per frame; it uploads finished images
+in row bands until the frame's time budget is spent. Mipmap levels are
+built by the decode workers and cached with the base image, so the GL
+thread never waits on mipmap generation. Until a texture is ready, lookups
+return a checkerboard. Small textures that do not need to repeat are packed into
+shared atlas pages.
+"""
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+import numpy as np
+from OpenGL.GL import *
+from PIL import Image
+
+from .terrain_cache import TerrainCache
+
+_UPLOAD_BAND_BYTES = 256 * 1024  # Rows uploaded between budget checks
+
+logger = logging.getLogger(__name__)
+
+
+def default_texture_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'language_game', 'textures')
+
+
+def checkerboard(size=64):
+    # Same one-pixel black and white pattern the game used as its missing-texture fallback
+    i, j = np.indices((size, size))
+    c = np.where((i + j) % 2 == 0, 255, 0).astype(np.uint8)
+    return np.ascontiguousarray(np.stack([c, c, c, np.full_like(c, 255)], axis=-1))
+
+
+def decode_image(path):
+    """RGBA pixels of an image file, bottom row first as glTexImage2D expects."""
+    with Image.open(path) as image:
+        rgba = np.asarray(image.convert('RGBA'))
+    return np.ascontiguousarray(rgba[::-1])
+
+
+def mip_chain(pixels, max_level=None):
+    """The image followed by 2x2 box-filtered levels down to 1x1 (or `max_level`)."""
+    levels = [pixels]
+    while max(levels[-1].shape[:2]) > 1 and (max_level is None or len(levels) <= max_level):
+        p = levels[-1].astype(np.uint16)
+        # Odd rows/columns are dropped; a single row or column is averaged with itself
+        p = p[0:-1:2] + p[1::2] if p.shape[0] > 1 else p * 2
+        p = p[:, 0:-1:2] + p[:, 1::2] if p.shape[1] > 1 else p * 2
+        levels.append(((p + 2) // 4).astype(np.uint8))
+    return levels
+
+
+def _split_levels(flat, height, width):
+    # Views into one flat array holding a mip_chain() back to back
+    levels = []
+    offset = 0
+    while True:
+        size = height * width * 4
+        levels.append(flat[offset:offset + size].reshape(height, width, 4))
+        offset += size
+        if height == 1 and width == 1:
+            return levels
+        height, width = max(height // 2, 1), max(width // 2, 1)
+
+
+class Texture:
+    """A GL texture, or a region of an atlas page: bind `id` and map texcoords into `uv`."""
+
+    def __init__(self, texture_id, width, height, uv=(0.0, 0.0, 1.0, 1.0), atlas=None):
+        self.id = texture_id
+        self.width = width
+        self.height = height
+        self.uv = uv        # (u0, v0, u1, v1) of this image within the bound texture
+        self.atlas = atlas  # TextureAtlas the image lives in, if any
+
+
+class TextureAtlas:
+    """One square texture page with images packed into shelves (rows of equal height).
+
+    Slots are aligned to ALIGN pixels, so mip level l of an image lands on
+    whole texels at (x >> l, y >> l) and every level can be uploaded
+    directly instead of regenerating mipmaps for the page.
+    """
+
+    ALIGN = 16
+    MAX_LEVEL = 4  # log2(ALIGN)
+
+    def __init__(self, size=1024, padding=2):
+        self.size = size
+        self.padding = padding  # Edge pixels repeated around each image so mip levels don't bleed
+        self.shelves = []       # [y, height, next free x]
+        self.next_y = 0
+        self.id = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.id)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, self.MAX_LEVEL)
+        for level in range(self.MAX_LEVEL + 1):
+            glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA8, size >> level, size >> level, 0,
+                         GL_RGBA, GL_UNSIGNED_BYTE, None)
+
+    def _slot_size(self, width, height):
+        a = self.ALIGN
+        return (-(-(width + 2 * self.padding) // a) * a,
+                -(-(height + 2 * self.padding) // a) * a)
+
+    def allocate(self, width, height):
+        w, h = self._slot_size(width, height)
+        for shelf in self.shelves:
+            y, shelf_height, x = shelf
+            if h <= shelf_height and x + w <= self.size:
+                shelf[2] += w
+                return x, y
+        if self.next_y + h > self.size or w > self.size:
+            return None
+        self.shelves.append([self.next_y, h, w])
+        self.next_y += h
+        return 0, self.shelves[-1][0]
+
+    def insert(self, pixels):
+        height, width = pixels.shape[:2]
+        spot = self.allocate(width, height)
+        if spot is None:
+            return None
+        x, y = spot
+        p = self.padding
+        w, h = self._slot_size(width, height)
+        padded = np.pad(pixels, ((p, h - height - p), (p, w - width - p), (0, 0)), mode='edge')
+        glBindTexture(GL_TEXTURE_2D, self.id)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        for level, data in enumerate(mip_chain(padded, self.MAX_LEVEL)):
+            glTexSubImage2D(GL_TEXTURE_2D, level, x >> level, y >> level, data.shape[1], data.shape[0],
+                            GL_RGBA, GL_UNSIGNED_BYTE, np.ascontiguousarray(data))
+        s = float(self.size)
+        uv = ((x + p) / s, (y + p) / s, (x + p + width) / s, (y + p + height) / s)
+        return Texture(self.id, width, height, uv, atlas=self)
+
+    def release(self):
+        if self.id is not None:
+            glDeleteTextures([self.id])
+            self.id = None
+
+
+class _Upload:
+    def __init__(self, name, levels, repeat, atlas):
+        self.name = name
+        self.levels = levels
+        self.repeat = repeat
+        self.atlas = atlas
+        self.texture_id = None
+        self.level = 0
+        self.next_row = 0
+
+
+class TextureManager:
+    def __init__(self, cache_dir=None, workers=4, upload_budget_ms=4.0, atlas_size=1024,
+                 atlas_max_size=128):
+        self.cache = TerrainCache(cache_dir, verify=False) if cache_dir else None
+        self.upload_budget = upload_budget_ms / 1000.0
+        self.atlas_size = atlas_size
+        self.atlas_max_size = atlas_max_size  # Larger images get their own texture
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='texture-decode')
+        self.textures = {}      # name -> Texture once uploaded
+        self.pending = {}       # name -> (future, repeat, atlas)
+        self.uploads = deque()  # _Upload in progress on the GL thread
+        self.atlases = []
+        self.default = None
+        self.stats = {'requested': 0, 'cached': 0, 'decoded': 0, 'missing': 0,
+                      'decode_time': 0.0, 'upload_time': 0.0}
+        self.started = time.perf_counter()
+        self.ready_time = None  # Seconds from creation until every request was uploaded
+
+    def request(self, name, path, repeat=False, atlas=None):
+        """Start loading `path` in the background; `get(name)` returns a placeholder until then.
+
+        `atlas` packs the image into a shared page when None and the image is
+        small; textures drawn with texcoords outside 0..1 need `repeat=True`.
+        """
+        if name in self.textures or name in self.pending:
+            return
+        self.stats['requested'] += 1
+        self.ready_time = None
+        future = self.executor.submit(self._decode, path)
+        self.pending[name] = (future, repeat, atlas)
+
+    def _decode(self, path):
+        # Runs on a worker thread; no GL calls here
+        start = time.perf_counter()
+        params = None
+        if self.cache is not None:
+            info = os.stat(path)
+            params = {'path': os.path.abspath(path), 'mtime_ns': info.st_mtime_ns, 'bytes': info.st_size}
+            arrays = self.cache.load(params)
+            if arrays is not None:
+                levels = _split_levels(arrays['levels'], *arrays['shape'])
+                return levels, True, time.perf_counter() - start
+        levels = mip_chain(decode_image(path))
+        if params is not None:
+            # One file for the whole chain keeps warm loads to a single mmap per texture
+            try:
+                self.cache.store(params, {
+                    'shape': np.array(levels[0].shape[:2], dtype=np.int64),
+                    'levels': np.concatenate([level.ravel() for level in levels]),
+                })
+            except OSError as e:
+                # The image decoded fine; it just has to be decoded again next start
+                logger.warning("Could not write texture cache for %s: %s", path, e)
+        return levels, False, time.perf_counter() - start
+
+    def default_texture(self):
+        if self.default is None:
+            pixels = checkerboard()
+            texture_id = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, texture_id)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, 64, 64, 0, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            self.default = Texture(texture_id, 64, 64)
+        return self.default
+
+    def get(self, name):
+        texture = self.textures.get(name)
+        return texture if texture is not None else self.default_texture()
+
+    def texture_id(self, name):
+        return self.get(name).id
+
+    def upload_pending(self, budget=None):
+        """Upload decoded textures on the GL thread for at most `budget` seconds.
+
+        At least one band of rows is uploaded per call so loading always
+        makes progress, even with a tiny budget.
+        """
+        budget = self.upload_budget if budget is None else budget
+        start = time.perf_counter()
+        self._collect()
+        while self.uploads:
+            job = self.uploads[0]
+            if self._upload_band(job):
+                self.uploads.popleft()
+            if time.perf_counter() - start >= budget:
+                break
+        self.stats['upload_time'] += time.perf_counter() - start
+        if self.ready_time is None and not self.pending and not self.uploads:
+            self.ready_time = time.perf_counter() - self.started
+
+    def _collect(self):
+        for name in [n for n, (future, _, _) in self.pending.items() if future.done()]:
+            future, repeat, atlas = self.pending.pop(name)
+            try:
+                levels, cached, decode_time = future.result()
+            except OSError as e:
+                logger.warning("Texture file not found or unreadable: %s", e)
+                self.stats['missing'] += 1
+                continue
+            self.stats['cached' if cached else 'decoded'] += 1
+            self.stats['decode_time'] += decode_time
+            height, width = levels[0].shape[:2]
+            if atlas is None:
+                atlas = not repeat and max(width, height) <= self.atlas_max_size
+            self.uploads.append(_Upload(name, levels, repeat, atlas))
+
+    def _insert_atlas(self, name, pixels):
+        for page in self.atlases:
+            texture = page.insert(pixels)
+            if texture is not None:
+                self.textures[name] = texture
+                return True
+        page = TextureAtlas(self.atlas_size)
+        texture = page.insert(pixels)
+        if texture is None:
+            page.release()  # Too big for any page; upload it on its own
+            return False
+        self.atlases.append(page)
+        self.textures[name] = texture
+        return True
+
+    def _upload_band(self, job):
+        # Returns True once every mip level of the image is on the GPU
+        if job.atlas:
+            job.atlas = False
+            if self._insert_atlas(job.name, job.levels[0]):
+                job.levels = None
+                return True
+        if job.texture_id is None:
+            job.texture_id = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, job.texture_id)
+            wrap = GL_REPEAT if job.repeat else GL_CLAMP_TO_EDGE
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(job.levels) - 1)
+            for level, pixels in enumerate(job.levels):
+                glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA8, pixels.shape[1], pixels.shape[0], 0,
+                             GL_RGBA, GL_UNSIGNED_BYTE, None)
+        else:
+            glBindTexture(GL_TEXTURE_2D, job.texture_id)
+
+        pixels = job.levels[job.level]
+        height, width = pixels.shape[:2]
+        rows = max(1, _UPLOAD_BAND_BYTES // (width * 4))
+        end = min(height, job.next_row + rows)
+        band = np.ascontiguousarray(pixels[job.next_row:end])
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexSubImage2D(GL_TEXTURE_2D, job.level, 0, job.next_row, width, end - job.next_row,
+                        GL_RGBA, GL_UNSIGNED_BYTE, band)
+        job.next_row = end
+        if end < height:
+            return False
+        job.level += 1
+        job.next_row = 0
+        if job.level < len(job.levels):
+            return False
+
+        height, width = job.levels[0].shape[:2]
+        self.textures[job.name] = Texture(job.texture_id, width, height)
+        job.levels = None  # Drop the (possibly memory-mapped) pixels
+        return True
+
+    def wait(self, timeout=None):
+        """Block until every requested texture is uploaded; for loading screens and tools."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self.pending or self.uploads:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            wait_futures([future for future, _, _ in self.pending.values()], timeout=remaining)
+            self.upload_pending(budget=float('inf'))
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+        return True
+
+    def summary(self):
+        s = self.stats
+        ready = f"{self.ready_time * 1000:.1f} ms" if self.ready_time is not None else "not ready"
+        return (f"Textures ready in {ready}: {s['cached']} from cache, {s['decoded']} decoded, "
+                f"{s['missing']} missing; decode {s['decode_time'] * 1000:.1f} ms, "
+                f"upload {s['upload_time'] * 1000:.1f} ms")
+
+    def release(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        ids = {t.id for t in self.textures.values() if t.atlas is None}
+        ids.update(job.texture_id for job in self.uploads if job.texture_id is not None)
+        if self.default is not None:
+            ids.add(self.default.id)
+        if ids:
+            glDeleteTextures(list(ids))
+        for page in self.atlases:
+            page.release()
+        self.textures.clear()
+        self.pending.clear()
+        self.uploads.clear()
+        self.atlases = []
+        self.default = None
@@ -0,0 +1,34 @@
+class FixedTimestep:
+    """Turns variable frame times into a whole number of fixed simulation steps.
+
+    Frame time is added to an accumulator and spent in `step`-sized ticks,
+    so the simulation advances by the same amount per tick whatever the
+    render rate. The remainder is left for the next frame and exposed as
+    `alpha` for interpolating between the last two simulated states. After
+    a long stall at most `max_steps` ticks run in one frame and the rest of
+    the backlog is dropped, so a slow frame cannot snowball into slower ones.
+    """
+
+    def __init__(self, step=1 / 60, max_steps=5):
+        self.step = step
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.ticks = 0         # Steps run so far
+        self.dropped = 0.0     # Seconds of backlog discarded by the catch-up cap
+
+    def advance(self, frame_time):
+        """Add `frame_time` seconds and return how many steps to run now."""
+        self.accumulator += frame_time
+        steps = int(self.accumulator // self.step)
+        self.accumulator -= steps * self.step
+        if steps > self.max_steps:
+            # Keep the fractional remainder, drop the whole steps we can't catch up on
+            self.dropped += (steps - self.max_steps) * self.step
+            steps = self.max_steps
+        self.ticks += steps
+        return steps
+
+    @property
+    def alpha(self):
+        # How far rendering is between the previous and the current step, 0..1
+        return min(self.accumulator / self.step, 1.0)
@@ -3,55 +3,56 @@ from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import numpy as np
-from PIL import Image
+from .heightmap import grid_indices
+from .gl_buffers import MeshBuffer, vbo_supported
+from .spatial import SpatialGrid
+from .static_batch import StaticBatch
+from .textures import TextureManager
+from .render_queue import RenderState, draw_now
 
 class World:
-    def __init__(self):
+    def __init__(self, use_vbo=True, textures=None):
         self.terrain_size = 100
         self.terrain_scale = 1
-        self.buildings = []
-        self.textures = {}
+        self.use_vbo = use_vbo
+        self.terrain_mesh = None
+        self.colliders = SpatialGrid(cell_size=8.0)  # building id -> footprint on the XZ plane
+        self._building_ids = {}  # id -> building dict
+        self.building_batches = {}  # texture name -> StaticBatch of its buildings
+        self._next_building_id = 0
+        self._owns_textures = textures is None
+        self.textures = textures if textures is not None else TextureManager()
         self._init_textures()
         self._generate_terrain()
         self._init_buildings()
         
     def _init_textures(self):
-        # Load textures for terrain and buildings
-        texture_files = {
-            'grass': 'game/assets/textures/grass.jpg',
-            'building': 'game/assets/textures/building.jpg'
-        }
-        
-        for name, path in texture_files.items():
-            texture = self._load_texture(path)
-            self.textures[name] = texture
+        # Load textures for terrain and buildings; decoded in the background
+        self.textures.request('grass', 'game/assets/textures/grass.jpg', repeat=True)
+        # Small and never tiled, so it is packed into an atlas page with other props
+        self.textures.request('building', 'game/assets/textures/building.jpg')
             
-    def _load_texture(self, path):
-        image = Image.open(path)
-        ix = image.size[0]
-        iy = image.size[1]
-        image = image.tobytes('raw', 'RGBX', 0, -1)
-        
-        texture_id = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, texture_id)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexImage2D(GL_TEXTURE_2D, 0, 3, ix, iy, 0, GL_RGBA, GL_UNSIGNED_BYTE, image)
-        return texture_id
-        
     def _generate_terrain(self):
         # Create a simple flat terrain with slight elevation variations
-        vertices = []
-        texcoords = []
-        for z in range(self.terrain_size):
-            for x in range(self.terrain_size):
-                # Add slight random elevation
-                y = np.sin(x * 0.1) * 0.2 + np.cos(z * 0.1) * 0.2
-                vertices.append((x - self.terrain_size/2, y, z - self.terrain_size/2))
-                texcoords.append((x/10, z/10))
-                
-        self.terrain_vertices = vertices
-        self.terrain_texcoords = texcoords
+        n = self.terrain_size
+        x = np.arange(n, dtype=np.float32)
+        z = np.arange(n, dtype=np.float32)
+        xx, zz = np.meshgrid(x, z)  # [z, x], vertex index = z * n + x
+        
+        vertices = np.empty((n, n, 3), dtype=np.float32)
+        vertices[..., 0] = xx - n/2
+        vertices[..., 1] = np.sin(xx * 0.1) * 0.2 + np.cos(zz * 0.1) * 0.2
+        vertices[..., 2] = zz - n/2
+        
+        texcoords = np.stack([xx / 10, zz / 10], axis=-1).astype(np.float32)
+        
+        self.terrain_vertices = vertices.reshape(-1, 3)
+        self.terrain_texcoords = texcoords.reshape(-1, 2)
+        self.terrain_indices = grid_indices(n, n)
+        
+    @property
+    def buildings(self):
+        return list(self._building_ids.values())
         
     def _init_buildings(self):
         # Add some sample buildings
@@ -62,77 +63,78 @@ class World:
         ]
         
         for pos in building_positions:
-            self.buildings.append({
-                'position': pos,
-                'size': (3, 5, 3)  # width, height, depth
-            })
+            self.add_building(pos, (3, 5, 3))
+            
+    def add_building(self, position, size, texture='building'):
+        # size is (width, height, depth)
+        building = {
+            'id': self._next_building_id,
+            'position': position,
+            'size': size,
+            'texture': texture
+        }
+        self._next_building_id += 1
+        self._building_ids[building['id']] = building
+        self.colliders.insert(building['id'], *self._footprint(building))
+        if texture not in self.building_batches:
+            self.building_batches[texture] = StaticBatch(use_vbo=self.use_vbo)
+        self.building_batches[texture].add(building['id'], position, size)
+        return building
+        
+    def remove_building(self, building):
+        self.colliders.remove(building['id'])
+        del self._building_ids[building['id']]
+        self.building_batches[building['texture']].remove(building['id'])
+        
+    def _footprint(self, building):
+        pos = building['position']
+        size = building['size']
+        return (pos[0] - size[0]/2, pos[2] - size[2]/2,
+                pos[0] + size[0]/2, pos[2] + size[2]/2)
             
     def draw(self):
-        self._draw_terrain()
-        self._draw_buildings()
+        draw_now(self.submit)
+        
+    def submit(self, queue):
+        if self._owns_textures:
+            self.textures.upload_pending()
+        queue.submit(RenderState(texture=self.textures.texture_id('grass')), self._draw_terrain,
+                     name='world.terrain')
+        # One draw call per texture; the queue sorts them so binds are not repeated,
+        # and batches whose textures share an atlas page share one bind
+        for name, batch in self.building_batches.items():
+            if len(batch):
+                texture = self.textures.get(name)
+                batch.set_uv(texture.uv)
+                queue.submit(RenderState(texture=texture.id), batch.draw, name='world.buildings')
         
     def _draw_terrain(self):
-        glEnable(GL_TEXTURE_2D)
-        glBindTexture(GL_TEXTURE_2D, self.textures['grass'])
+        if self.use_vbo and vbo_supported():
+            if self.terrain_mesh is None:
+                self.terrain_mesh = MeshBuffer(self.terrain_vertices,
+                                               texcoords=self.terrain_texcoords,
+                                               indices=self.terrain_indices)
+            self.terrain_mesh.draw()
+            return
         
-        glBegin(GL_QUADS)
-        for z in range(self.terrain_size - 1):
-            for x in range(self.terrain_size - 1):
-                # Get vertices for current quad
-                v1 = self.terrain_vertices[z * self.terrain_size + x]
-                v2 = self.terrain_vertices[z * self.terrain_size + (x + 1)]
-                v3 = self.terrain_vertices[(z + 1) * self.terrain_size + (x + 1)]
-                v4 = self.terrain_vertices[(z + 1) * self.terrain_size + x]
-                
-                # Get texture coordinates
-                t1 = self.terrain_texcoords[z * self.terrain_size + x]
-                t2 = self.terrain_texcoords[z * self.terrain_size + (x + 1)]
-                t3 = self.terrain_texcoords[(z + 1) * self.terrain_size + (x + 1)]
-                t4 = self.terrain_texcoords[(z + 1) * self.terrain_size + x]
-                
-                # Draw quad
-                glTexCoord2f(*t1); glVertex3f(*v1)
-                glTexCoord2f(*t2); glVertex3f(*v2)
-                glTexCoord2f(*t3); glVertex3f(*v3)
-                glTexCoord2f(*t4); glVertex3f(*v4)
+        glBegin(GL_TRIANGLES)
+        for i in self.terrain_indices:
+            glTexCoord2fv(self.terrain_texcoords[i])
+            glVertex3fv(self.terrain_vertices[i])
         glEnd()
         
-    def _draw_buildings(self):
-        glEnable(GL_TEXTURE_2D)
-        glBindTexture(GL_TEXTURE_2D, self.textures['building'])
-        
-        for building in self.buildings:
-            pos = building['position']
-            size = building['size']
-            
-            glPushMatrix()
-            glTranslatef(*pos)
-            
-            # Draw a simple textured cube
-            glBegin(GL_QUADS)
-            # Front face
-            glTexCoord2f(0, 0); glVertex3f(-size[0]/2, 0, -size[2]/2)
-            glTexCoord2f(1, 0); glVertex3f(size[0]/2, 0, -size[2]/2)
-            glTexCoord2f(1, 1); glVertex3f(size[0]/2, size[1], -size[2]/2)
-            glTexCoord2f(0, 1); glVertex3f(-size[0]/2, size[1], -size[2]/2)
-            # Back face
-            glTexCoord2f(0, 0); glVertex3f(-size[0]/2, 0, size[2]/2)
-            glTexCoord2f(1, 0); glVertex3f(size[0]/2, 0, size[2]/2)
-            glTexCoord2f(1, 1); glVertex3f(size[0]/2, size[1], size[2]/2)
-            glTexCoord2f(0, 1); glVertex3f(-size[0]/2, size[1], size[2]/2)
-            # Other faces...
-            glEnd()
-            
-            glPopMatrix()
-            
     def check_collision(self, position):
-        # Simple collision detection with buildings
-        for building in self.buildings:
-            bpos = building['position']
-            bsize = building['size']
-            
-            # Check if position is inside building bounds
-            if (abs(position[0] - bpos[0]) < bsize[0]/2 and
-                abs(position[2] - bpos[2]) < bsize[2]/2):
-                return True
-        return False 
\ No newline at end of file
+        # Is position inside any building footprint?
+        return bool(self.colliders.query_point(position[0], position[2]))
+        
+    def buildings_near(self, position, radius):
+        # Buildings whose footprint is within radius of position
+        ids = self.colliders.query_radius(position[0], position[2], radius)
+        return [self._building_ids[i] for i in ids]
+        
+    def nearest_building(self, position, max_distance=None):
+        # (building, distance to its footprint) or None
+        found = self.colliders.nearest(position[0], position[2], max_distance)
+        if found is None:
+            return None
+        return self._building_ids[found[0]], found[1]
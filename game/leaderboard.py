@@ -0,0 +1,92 @@
+"""Top players by score, globally and per current location.
+
+Each board's top LEADERBOARD_SIZE entries are cached and kept current as
+scores change: record_score() moves one player within a cached board, so a
+correct answer costs a cache read and write instead of re-ranking players.
+Scores only go up this way. Anything else that could reorder a board goes
+through PlayerProgress.save() or delete() (changing location, admin
+edits), whose signals call invalidate_leaderboards(); the next read
+rebuilds from the score indexes.
+
+Boards are keyed under a generation counter. Bumping it with cache.incr()
+is atomic, so a writer that loses the race for a board's lock just drops
+every board instead of risking a stale one.
+"""
+from django.core.cache import cache
+
+from .models import PlayerProgress
+
+LEADERBOARD_SIZE = 50
+GENERATION_KEY = 'game:leaderboard:generation'
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def _board_key(generation, location_id):
+    return f'game:leaderboard:{generation}:{location_id or "global"}'
+
+
+def invalidate_leaderboards():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+
+
+def _query_board(location_id):
+    players = PlayerProgress.objects.order_by('-score', 'id')
+    if location_id is not None:
+        players = players.filter(current_location_id=location_id)
+    return [tuple(row) for row in
+            players.values_list('score', 'id', 'user__username')[:LEADERBOARD_SIZE]]
+
+
+def top_players(location_id=None, limit=LEADERBOARD_SIZE):
+    """[(score, progress id, username)] best first, ties broken by who started first."""
+    key = _board_key(_generation(), location_id)
+    board = cache.get(key)
+    if board is None:
+        # Only cache the result if no score changed while it was being read
+        changes = cache.get(f'{key}:changes')
+        board = _query_board(location_id)
+        if cache.get(f'{key}:changes') == changes:
+            cache.add(key, board, timeout=None)
+    return board[:limit]
+
+
+def record_score(progress_id, username, score, location_id):
+    """Move a player whose score just went up within the cached boards they are on."""
+    generation = _generation()
+    for scope in {None, location_id}:
+        key = _board_key(generation, scope)
+        try:
+            cache.incr(f'{key}:changes')
+        except ValueError:
+            cache.add(f'{key}:changes', 1, timeout=None)
+        lock = f'{key}:lock'
+        if not cache.add(lock, 1, timeout=5):
+            invalidate_leaderboards()
+            return
+        try:
+            board = cache.get(key)
+            if board is not None:
+                cache.set(key, _updated(board, progress_id, username, score), timeout=None)
+        finally:
+            cache.delete(lock)
+
+
+def _updated(board, progress_id, username, score):
+    board = [entry for entry in board if entry[1] != progress_id]
+    entry = (score, progress_id, username)
+    full = len(board) >= LEADERBOARD_SIZE
+    if full and (-score, progress_id) > (-board[-1][0], board[-1][1]):
+        return board  # Still below the cut
+    board.append(entry)
+    board.sort(key=lambda e: (-e[0], e[1]))
+    return board[:LEADERBOARD_SIZE]
@@ -3,14 +3,53 @@ from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 import numpy as np
+import argparse
+import logging
+import os
+import sys
+import time
 from core.terrain import Terrain
+from core.chunks import ChunkedTerrain
+from core.frustum import Frustum
+from core.terrain_cache import default_cache_dir
 from core.entities.avatar import Avatar
-from PIL import Image
+from core.entities.store import EntityStore
+from core.entities.avatar_renderer import shared_renderer, release_shared_renderer
+from core.textures import TextureManager, default_texture_cache_dir
+from core.timestep import FixedTimestep
+from core.profiler import profiler, RateLimitedLogger
+from core.render_queue import RenderQueue, UNLIT
+from core.replay import (InputFrame, InputRecorder, InputReplay, apply_input, key_mask,
+                         state_checksum)
+from core.net import PositionClient, DEFAULT_PORT
+from core.api import ApiClient
+
+RENDER_MODES = ('capped', 'uncapped', 'vsync')
+
+logger = logging.getLogger(__name__)
+stats_log = RateLimitedLogger(__name__, interval=1.0, report_suppressed=False)
 
 class Game:
-    def __init__(self, width=1280, height=720):
+    def __init__(self, width=1280, height=720, streaming=False, seed=0, terrain_cache_dir=None,
+                 terrain_workers=1, texture_cache_dir=None, tick_rate=60, max_catchup_steps=5,
+                 render_mode='capped', fps_cap=60, profile=False, trace_path=None,
+                 profile_gl_calls=False, record_path=None, grab_input=True, server=None,
+                 api_url=None, api_user=None, api_password=None):
         pygame.init()
-        pygame.display.set_mode((width, height), DOUBLEBUF | OPENGL)
+        # The profiler is shared with the core modules; writing a trace implies profiling
+        profiler.enabled = profile or trace_path is not None
+        self.trace_path = trace_path
+        self.render_mode = render_mode
+        self.fps_cap = fps_cap
+        if render_mode == 'vsync':
+            try:
+                pygame.display.set_mode((width, height), DOUBLEBUF | OPENGL, vsync=1)
+            except pygame.error as e:
+                logger.warning("vsync unavailable (%s), capping at %d FPS instead", e, fps_cap)
+                self.render_mode = 'capped'
+                pygame.display.set_mode((width, height), DOUBLEBUF | OPENGL)
+        else:
+            pygame.display.set_mode((width, height), DOUBLEBUF | OPENGL)
         pygame.display.set_caption("3D World MVP - Debug Mode")
         
         # Initialize OpenGL
@@ -20,72 +59,96 @@ class Game:
         glShadeModel(GL_SMOOTH)
         glEnable(GL_COLOR_MATERIAL)
         glColorMaterial(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE)
+        glLightfv(GL_LIGHT0, GL_AMBIENT, [0.3, 0.3, 0.3, 1])
+        glLightfv(GL_LIGHT0, GL_DIFFUSE, [1.0, 1.0, 1.0, 1])
+        
+        # Draws are queued with the state they need and sorted; the queue's
+        # state cache skips enables and binds that would change nothing
+        self.render_queue = RenderQueue()
         
-        # Set up the perspective
+        # Set up the perspective (kept for frustum culling)
+        self.fovy = 45
+        self.aspect = width/height
+        self.near = 0.1
+        self.far = 150.0
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
-        gluPerspective(45, (width/height), 0.1, 150.0)
+        gluPerspective(self.fovy, self.aspect, self.near, self.far)
         glMatrixMode(GL_MODELVIEW)
         
         # Set clear color to dark blue for debugging
         glClearColor(0.0, 0.0, 0.2, 1.0)
         
+        # Start decoding textures first so it overlaps with terrain generation
+        self.textures = TextureManager(cache_dir=texture_cache_dir)
+        self._load_textures()
+        self._textures_reported = False
+        
         # Initialize game objects
-        self.terrain = Terrain(size=50, scale=1)  # Reduced size for testing
-        self.avatar = Avatar(position=(0, 5, 0))  # Raised position for better view
-        self.textures = self._load_textures()
+        self.streaming = streaming
+        if streaming:
+            # Unbounded world generated in the background around the avatar; a recorded
+            # session waits for the chunks it stands on so a replay sees the same ground
+            self.terrain = ChunkedTerrain(seed=seed, workers=max(terrain_workers, 2),
+                                          blocking=record_path is not None)
+        else:
+            self.terrain = Terrain(size=50, scale=1, cache_dir=terrain_cache_dir,
+                                   workers=terrain_workers)  # Reduced size for testing
+        self.entities = EntityStore()  # Avatar and future NPCs, updated together each tick
+        self.avatar = Avatar(position=(0, 5, 0), store=self.entities)  # Raised position for better view
         self.running = True
         
-        # Lock mouse for camera control
-        pygame.mouse.set_visible(False)
-        pygame.event.set_grab(True)
+        # Simulation runs in fixed ticks independent of the render rate;
+        # input gathered each frame is applied on the next tick
+        self.timestep = FixedTimestep(1.0 / tick_rate, max_catchup_steps)
+        self.held_keys = 0          # core.replay KEY_* bits held this frame
+        self.mouse_motion = [0, 0]  # Pixels moved since the last tick consumed it
+        
+        # Every tick's input can be logged for replaying the session later
+        self.recorder = None
+        if record_path:
+            self.recorder = InputRecorder(record_path, tick_rate, seed, streaming,
+                                          networked=bool(server))
         
-        print("Game initialized successfully")
+        # Other players from a position server (position_server.py); polled each
+        # tick without blocking, their avatars live in the same EntityStore
+        self.network = None
+        self.remote_rows = {}   # Server entity id -> EntityStore row
+        self.remote_moved = {}  # Server entity id -> server tick it last moved on
+        if server:
+            host, _, port = server.partition(':')
+            self.network = PositionClient(host or '127.0.0.1', int(port or DEFAULT_PORT))
+        
+        # Django REST API; requests run on background threads and their callbacks
+        # run from poll() in the frame loop
+        self.api = None
+        self.locations = []
+        self.progress = None
+        if api_url:
+            self.api = ApiClient(api_url, api_user, api_password)
+            self.api.get('/api/locations/', callback=self._on_locations, max_age=300)
+            self.api.get('/api/progress/', callback=self._on_progress)
+        
+        if grab_input:
+            # Lock mouse for camera control
+            pygame.mouse.set_visible(False)
+            pygame.event.set_grab(True)
+        
+        if profile_gl_calls:
+            # Every module that draws imports gl* names into its own namespace
+            profiler.instrument_gl(*[module for name, module in sys.modules.items()
+                                     if name == __name__ or name.startswith('core.')])
+        
+        logger.info("Game initialized successfully")
         
     def _load_textures(self):
-        textures = {}
+        # Decoded in the background; the checkerboard stands in until each one is uploaded
         texture_files = {
             'grass': 'game/assets/textures/grass.jpg',
         }
         
         for name, path in texture_files.items():
-            try:
-                image = Image.open(path)
-                ix = image.size[0]
-                iy = image.size[1]
-                image = image.tobytes('raw', 'RGBX', 0, -1)
-                
-                texid = glGenTextures(1)
-                glBindTexture(GL_TEXTURE_2D, texid)
-                glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-                glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-                glTexImage2D(GL_TEXTURE_2D, 0, 3, ix, iy, 0, GL_RGBA, GL_UNSIGNED_BYTE, image)
-                
-                textures[name] = texid
-            except FileNotFoundError:
-                print(f"Warning: Texture file not found: {path}")
-                # Create a simple checkerboard texture
-                textures[name] = self._create_default_texture()
-                
-        return textures
-        
-    def _create_default_texture(self):
-        texid = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, texid)
-        
-        # Create a simple checkerboard pattern
-        size = 64
-        pattern = []
-        for i in range(size):
-            for j in range(size):
-                c = 255 if (i + j) % 2 == 0 else 0
-                pattern.extend([c, c, c, 255])
-                
-        glTexImage2D(GL_TEXTURE_2D, 0, 3, size, size, 0, GL_RGBA, GL_UNSIGNED_BYTE, bytes(pattern))
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
-        glTexParameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-        
-        return texid
+            self.textures.request(name, path, repeat=True)  # Terrain texcoords tile the image
         
     def handle_events(self):
         for event in pygame.event.get():
@@ -95,47 +158,154 @@ class Game:
                 if event.key == pygame.K_ESCAPE:
                     self.running = False
             elif event.type == pygame.MOUSEMOTION:
-                # Rotate avatar based on mouse movement
-                self.avatar.rotate(event.rel[0] * 0.5)
+                # Turns the avatar on the next tick
+                self.mouse_motion[0] += event.rel[0]
+                self.mouse_motion[1] += event.rel[1]
                 
         # Handle continuous keyboard input
-        keys = pygame.key.get_pressed()
-        forward = keys[pygame.K_w] - keys[pygame.K_s]
-        right = keys[pygame.K_d] - keys[pygame.K_a]
+        self.held_keys = key_mask(pygame.key.get_pressed())
         
-        if forward or right:
-            self.avatar.move(forward, right)
+    def next_input(self):
+        # Held keys plus the mouse motion gathered since the previous tick
+        frame = InputFrame(self.held_keys, *self.mouse_motion)
+        self.mouse_motion = [0, 0]
+        return frame
                     
-    def update(self):
-        self.avatar.update(self.terrain)
+    def update(self, frame=None):
+        # One fixed simulation tick; replays pass recorded input instead of the live one
+        if frame is None:
+            frame = self.next_input()
+        self.entities.snapshot()
+        apply_input(self.avatar, frame)
+        if self.network is not None:
+            self._sync_network()
+        if self.streaming:
+            self.terrain.update(self.avatar.position)
+        self.entities.update(self.terrain)
+        if self.recorder is not None:
+            self.recorder.record(frame, lambda: state_checksum(self.entities, self.local_rows()))
+            
+    def local_rows(self):
+        # EntityStore rows simulated here; remote avatars follow the server, not the input
+        remote = set(self.remote_rows.values())
+        return [row for row in np.flatnonzero(self.entities.alive[:self.entities.count])
+                if row not in remote]
+            
+    def _sync_network(self):
+        # Send our state, then mirror remote avatars that came into range, moved or left
+        network = self.network
+        network.send_state(self.avatar.position, self.avatar.rotation)
+        network.poll()
+        entered, updated, left = network.take_changes()
+        store = self.entities
+        for entity_id in left:
+            row = self.remote_rows.pop(entity_id, None)
+            if row is not None:
+                store.remove(row)
+            self.remote_moved.pop(entity_id, None)
+        for entity_id in entered | updated:
+            x, y, z, rotation = network.state(entity_id)
+            row = self.remote_rows.get(entity_id)
+            if row is None:
+                self.remote_rows[entity_id] = store.add((x, y, z), rotation)
+                continue
+            if store.positions[row, 0] != x or store.positions[row, 2] != z:
+                self.remote_moved[entity_id] = network.last_tick
+            store.positions[row] = (x, y, z)
+            store.rotations[row] = rotation
+        # Snapshots come slower than ticks and skip avatars that stood still, so
+        # keep the walk animation going until one has not moved for a server tick
+        for entity_id, row in self.remote_rows.items():
+            moved = self.remote_moved.get(entity_id)
+            store.walking[row] = moved is not None and network.last_tick - moved <= 1
+        if not network.connected and self.remote_rows:
+            logger.warning("Lost connection to the position server")
+            for row in self.remote_rows.values():
+                store.remove(row)
+            self.remote_rows.clear()
+            self.remote_moved.clear()
+        
+    def _on_locations(self, result):
+        if result.error:
+            logger.warning("Could not load locations: %s", result.error)
+            return
+        self.locations = result.data
+        logger.info("Loaded %d locations", len(self.locations))
+        
+    def _on_progress(self, result):
+        if result.error:
+            logger.warning("Could not load player progress: %s", result.error)
+            return
+        self.progress = result.data[0] if result.data else None
+        if self.progress is not None:
+            logger.info("Score %d, %d dialogues completed", self.progress['score'],
+                        self.progress['completed_count'])
+        
+    def replay(self, log, render_every=0):
+        """Run every tick of an InputReplay as fast as possible and check its checksums.
+
+        Renders every `render_every` ticks (0 never), so a replay can measure
+        the simulation alone or the whole frame.
+        """
+        if self.streaming:
+            self.terrain.blocking = True  # As when the session was recorded
+        mismatches = []
+        start = time.perf_counter()
+        for tick, frame in enumerate(log.frames, 1):
+            self.update(frame)
+            expected = log.checksums.get(tick)
+            if expected is not None and expected != state_checksum(self.entities, self.local_rows()):
+                mismatches.append(tick)
+            if render_every and tick % render_every == 0:
+                pygame.event.pump()
+                self.render()
+        elapsed = time.perf_counter() - start
+        return {
+            'ticks': len(log),
+            'seconds': elapsed,
+            'ticks_per_second': len(log) / elapsed if elapsed else 0.0,
+            'realtime_factor': len(log) / log.tick_rate / elapsed if elapsed else 0.0,
+            'checksums': len(log.checksums),
+            'mismatches': len(mismatches),
+            'first_mismatch': mismatches[0] if mismatches else None,
+        }
+        
+    def render(self, alpha=None):
+        # alpha places entities between the last two ticks; None draws the latest tick
+        # Hand finished textures to GL within this frame's upload budget
+        with profiler.scope('textures.upload'):
+            self.textures.upload_pending()
+        if self.textures.ready_time is not None and not self._textures_reported:
+            logger.info("%s", self.textures.summary())
+            self._textures_reported = True
         
-    def render(self):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glLoadIdentity()
         
         # Update camera to follow avatar
-        camera_pos, look_at = self.avatar.get_camera_position()
+        camera_pos, look_at = self.avatar.get_camera_position(alpha)
         gluLookAt(*camera_pos, *look_at, 0, 1, 0)
         
-        # Set up lighting
+        # The light position is transformed by the current modelview matrix, so it
+        # is re-sent after the camera moves; its colours are set once in __init__
         glLightfv(GL_LIGHT0, GL_POSITION, [1, 1, 1, 0])
-        glLightfv(GL_LIGHT0, GL_AMBIENT, [0.3, 0.3, 0.3, 1])
-        glLightfv(GL_LIGHT0, GL_DIFFUSE, [1.0, 1.0, 1.0, 1])
         
-        # Draw debug grid
-        self._draw_debug_grid()
+        queue = self.render_queue
+        queue.submit(UNLIT, self._draw_debug_grid, name='debug_grid')
         
-        # Draw terrain with enhanced visibility
-        glColor3f(0.5, 0.8, 0.5)  # Set color to light green
-        self.terrain.draw(self.textures['grass'])
+        # Terrain in light green, culled to the camera frustum
+        frustum = Frustum.from_camera(camera_pos, look_at, self.fovy, self.aspect, self.near, self.far)
+        self.terrain.submit(queue, self.textures.texture_id('grass'), frustum, color=(0.5, 0.8, 0.5))
         
-        # Draw avatar
-        self.avatar.draw()
+        # The avatar and any other entities in one batch
+        shared_renderer().submit_store(queue, self.entities, alpha=alpha)
         
-        pygame.display.flip()
+        queue.flush()
+        
+        with profiler.scope('flip'):
+            pygame.display.flip()
         
     def _draw_debug_grid(self):
-        glDisable(GL_LIGHTING)
         glBegin(GL_LINES)
         
         # Draw grid lines
@@ -160,27 +330,128 @@ class Game:
         glVertex3f(0, 0, 5)
         
         glEnd()
-        glEnable(GL_LIGHTING)
         
     def run(self):
-        print("Starting game loop")
+        logger.info("Starting game loop")
         clock = pygame.time.Clock()
-        frame_count = 0
+        previous = time.perf_counter()
         
         while self.running:
-            self.handle_events()
-            self.update()
-            self.render()
+            now = time.perf_counter()
+            frame_time, previous = now - previous, now
             
-            frame_count += 1
-            if frame_count % 60 == 0:  # Print debug info every 60 frames
-                print(f"FPS: {clock.get_fps():.1f}")
-                print(f"Avatar position: {self.avatar.position}")
+            profiler.begin_frame()
+            with profiler.scope('handle_events'):
+                self.handle_events()
+            if self.api is not None:
+                with profiler.scope('api.poll'):
+                    self.api.poll()
+            for _ in range(self.timestep.advance(frame_time)):
+                with profiler.scope('update'):
+                    self.update()
+            with profiler.scope('render'):
+                self.render(self.timestep.alpha)
+            profiler.end_frame()
+            self._log_stats(clock)
             
-            clock.tick(60)
+            # vsync paces frames in flip(); tick() without a rate only measures FPS
+            clock.tick(self.fps_cap if self.render_mode == 'capped' else 0)
+        
+        self.shutdown()
+        
+    def _log_stats(self, clock):
+        # At most once a second whatever the frame rate; terminal output stalls frames
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        stats_log.info('fps', "FPS: %.1f, avatar at %s, terrain triangles %d",
+                 clock.get_fps(), self.avatar.position, self.terrain.triangles_drawn)
+        if self.streaming:
+            stats_log.info('chunks', "Chunks: %s", self.terrain.metrics.summary())
+        if profiler.enabled:
+            stats_log.info('profile', "Profile: %s", profiler.report())
         
+    def shutdown(self):
+        if self.trace_path:
+            profiler.write_chrome_trace(self.trace_path)
+            logger.info("Wrote %d frames to %s", len(profiler.frames), self.trace_path)
+        profiler.restore_gl()
+        if self.network is not None:
+            self.network.close()
+        if self.api is not None:
+            self.api.close()
+        if self.recorder is not None:
+            self.recorder.close()
+            logger.info("Recorded %d ticks to %s", self.recorder.ticks, self.recorder.path)
+        self.terrain.release()
+        release_shared_renderer()
+        self.textures.release()
         pygame.quit()
 
 if __name__ == "__main__":
-    game = Game()
+    parser = argparse.ArgumentParser(description="3D World MVP")
+    parser.add_argument('--streaming', action='store_true',
+                        help="stream chunked terrain around the avatar instead of a fixed map")
+    parser.add_argument('--seed', type=int, default=0, help="terrain seed for streaming mode")
+    parser.add_argument('--terrain-cache', default=default_cache_dir(),
+                        help="directory for the memory-mapped terrain cache")
+    parser.add_argument('--no-terrain-cache', action='store_true',
+                        help="always regenerate the terrain")
+    parser.add_argument('--terrain-workers', type=int, default=1,
+                        help="processes used to generate terrain")
+    parser.add_argument('--texture-cache', default=default_texture_cache_dir(),
+                        help="directory for decoded, memory-mapped textures")
+    parser.add_argument('--no-texture-cache', action='store_true',
+                        help="always decode texture images")
+    parser.add_argument('--tick-rate', type=int, default=60, help="simulation ticks per second")
+    parser.add_argument('--render-mode', choices=RENDER_MODES, default='capped',
+                        help="cap rendering at --fps-cap, render as fast as possible, or follow vsync")
+    parser.add_argument('--fps-cap', type=int, default=60)
+    parser.add_argument('--profile', action='store_true',
+                        help="time loop phases and count draw calls, logged once a second")
+    parser.add_argument('--profile-gl-calls', action='store_true',
+                        help="also count every GL call while profiling (slow)")
+    parser.add_argument('--trace', metavar='PATH',
+                        help="write recent frames as a Chrome trace on exit (implies --profile)")
+    parser.add_argument('--log-level', default='INFO',
+                        choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'))
+    parser.add_argument('--server', metavar='HOST:PORT',
+                        help="join a position server (position_server.py; "
+                             f"port {DEFAULT_PORT} by default)")
+    parser.add_argument('--api', metavar='URL',
+                        help="Django site to load progress from, e.g. http://127.0.0.1:8000")
+    parser.add_argument('--api-user', help="username for --api; the password is read from "
+                                           "GAME_API_PASSWORD")
+    parser.add_argument('--record', metavar='PATH', help="log every tick's input to PATH")
+    parser.add_argument('--replay', metavar='PATH',
+                        help="replay a recorded session as fast as possible, then exit")
+    parser.add_argument('--replay-render-every', type=int, default=0, metavar='N',
+                        help="render every N replayed ticks (default: simulate only)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=args.log_level, format='%(message)s')
+    cache_dir = None if args.no_terrain_cache else args.terrain_cache
+    texture_cache_dir = None if args.no_texture_cache else args.texture_cache
+    options = dict(terrain_cache_dir=cache_dir, terrain_workers=args.terrain_workers,
+                   texture_cache_dir=texture_cache_dir, render_mode=args.render_mode,
+                   fps_cap=args.fps_cap, profile=args.profile or args.profile_gl_calls,
+                   trace_path=args.trace, profile_gl_calls=args.profile_gl_calls)
+    
+    if args.replay:
+        # The log decides the world and tick rate; input comes only from the log
+        log = InputReplay(args.replay)
+        if log.networked:
+            logger.warning("%s was recorded with other players connected; they are not replayed "
+                           "and only the local avatar is checked", args.replay)
+        game = Game(streaming=log.streaming, seed=log.seed, tick_rate=log.tick_rate,
+                    grab_input=False, **options)
+        summary = game.replay(log, args.replay_render_every)
+        game.shutdown()
+        logger.info("Replayed %(ticks)d ticks in %(seconds).2f s (%(realtime_factor).1fx real time), "
+                    "%(mismatches)d of %(checksums)d checksums differ", summary)
+        sys.exit(1 if summary['mismatches'] else 0)
+    
+    game = Game(streaming=args.streaming, seed=args.seed, tick_rate=args.tick_rate,
+                record_path=args.record, server=args.server, api_url=args.api,
+                api_user=args.api_user, api_password=os.environ.get('GAME_API_PASSWORD'),
+                **options)
     game.run() 
\ No newline at end of file
@@ -0,0 +1,84 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from game.catalog import bump_catalog_version
+from game.models import Dialogue, Location
+from game.views import DialogueViewSet, LocationViewSet
+
+
+class Command(BaseCommand):
+    help = ("Requests per second for catalog list and detail endpoints: uncached, warm "
+            "cache, and conditional GETs answered with 304. Runs in a transaction that "
+            "is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locations', type=int, default=20)
+        parser.add_argument('--dialogues', type=int, default=50, help="per location")
+        parser.add_argument('--seconds', type=float, default=2.0, help="per measurement")
+        parser.add_argument('--json', action='store_true', help="print results as JSON")
+
+    def handle(self, *args, **options):
+        results = []
+        with transaction.atomic():
+            client, urls = self._setup(options['locations'], options['dialogues'])
+            for name, url in urls:
+                row = {'endpoint': name}
+                self._set_caching(False)
+                row['uncached_rps'] = self._rate(client, url, options['seconds'])
+                self._set_caching(True)
+                etag = client.get(url)['ETag']
+                row['warm_rps'] = self._rate(client, url, options['seconds'])
+                row['not_modified_rps'] = self._rate(client, url, options['seconds'],
+                                                     HTTP_IF_NONE_MATCH=etag)
+                row['speedup'] = row['warm_rps'] / row['uncached_rps']
+                results.append(row)
+            transaction.set_rollback(True)
+        # Responses cached from the rolled-back rows must not outlive them
+        bump_catalog_version()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'endpoint':<18} {'uncached/s':>11} {'warm/s':>9} {'304/s':>9} "
+                          f"{'speedup':>8}")
+        for r in results:
+            self.stdout.write(f"{r['endpoint']:<18} {r['uncached_rps']:>11.0f} "
+                              f"{r['warm_rps']:>9.0f} {r['not_modified_rps']:>9.0f} "
+                              f"{r['speedup']:>7.1f}x")
+
+    def _setup(self, locations, per_location):
+        places = [Location.objects.create(name=f'Place {i}', description='A place to visit. ' * 10)
+                  for i in range(locations)]
+        dialogues = Dialogue.objects.bulk_create(
+            Dialogue(location=place, npc_text=f'¿Dónde está la estación {i}?',
+                     correct_response=f'Está allí {i}', hint='Where is the station?',
+                     difficulty=i % 3 + 1)
+            for place in places for i in range(per_location))
+        bump_catalog_version()  # bulk_create sends no signals
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(User.objects.create_user('bench-catalog'))
+        place, dialogue = places[0], dialogues[0]
+        return client, [
+            ('locations', '/api/locations/'),
+            ('location', f'/api/locations/{place.pk}/'),
+            ('dialogues', f'/api/dialogues/?location={place.pk}'),
+            ('dialogue', f'/api/dialogues/{dialogue.pk}/?location={place.pk}'),
+        ]
+
+    def _set_caching(self, enabled):
+        LocationViewSet.catalog_cache = enabled
+        DialogueViewSet.catalog_cache = enabled
+
+    def _rate(self, client, url, seconds, **headers):
+        client.get(url, **headers)
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            client.get(url, **headers)
+            count += 1
+        return count / (time.perf_counter() - start)
@@ -0,0 +1,103 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from game.matching import normalize
+from game.models import Dialogue
+from game.views import is_correct_answer
+
+WORDS = ('adiós', 'mañana', 'estación', 'dónde', 'está', 'el', 'la', 'tren', 'qué', 'tal',
+         'gracias', 'por', 'favor', 'café', 'con', 'leche', 'número', 'teléfono', 'cuánto',
+         'cuesta', 'habitación', 'baño', 'izquierda', 'derecha', 'señor', 'señora', 'niño',
+         'árbol', 'música', 'película', 'difícil', 'fácil', 'también', 'aquí', 'allí')
+
+
+def full_levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j - 1] + (x != y), previous[j] + 1, current[j - 1] + 1))
+        previous = current
+    return previous[-1]
+
+
+def naive_check(dialogue, answer):
+    # What a per-request version would do: normalize both sides, full distance
+    expected = [normalize(dialogue.correct_response)]
+    expected += [normalize(a) for a in dialogue.alternative_responses.splitlines() if a]
+    answer = normalize(answer)
+    return any(full_levenshtein(answer, e) <= 2 for e in expected)
+
+
+class Command(BaseCommand):
+    help = ("Time answer normalization and matching over a synthetic corpus of dialogues. "
+            "Nothing is written to the database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dialogues', type=int, default=100_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help="print results as JSON")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        dialogues = [self._dialogue(rng) for _ in range(options['dialogues'])]
+
+        start = time.perf_counter()
+        for dialogue in dialogues:
+            dialogue.normalize_answers()
+        precompute = time.perf_counter() - start
+
+        results = {'dialogues': len(dialogues),
+                   'precompute_us_per_dialogue': 1e6 * precompute / len(dialogues)}
+        for kind in ('exact', 'unaccented', 'typo', 'wrong'):
+            answers = [self._answer(rng, d, kind) for d in dialogues]
+            pairs = list(zip(dialogues, answers))
+            start = time.perf_counter()
+            accepted = sum(is_correct_answer(d, a) for d, a in pairs)
+            elapsed = time.perf_counter() - start
+            results[f'{kind}_us'] = 1e6 * elapsed / len(pairs)
+            results[f'{kind}_accepted'] = accepted / len(pairs)
+
+            sample = pairs[:10_000]
+            start = time.perf_counter()
+            for d, a in sample:
+                naive_check(d, a)
+            results[f'{kind}_naive_us'] = 1e6 * (time.perf_counter() - start) / len(sample)
+            start = time.perf_counter()
+            for d, a in pairs:
+                a.strip().lower() == d.correct_response.strip().lower()
+            results[f'{kind}_exact_compare_us'] = 1e6 * (time.perf_counter() - start) / len(pairs)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{results['dialogues']} dialogues, normalized in "
+                          f"{results['precompute_us_per_dialogue']:.1f} us each")
+        self.stdout.write(f"{'answer':<11} {'accepted':>8} {'match us':>9} {'naive us':>9} "
+                          f"{'lower() us':>10}")
+        for kind in ('exact', 'unaccented', 'typo', 'wrong'):
+            self.stdout.write(f"{kind:<11} {results[f'{kind}_accepted']:>8.1%} "
+                              f"{results[f'{kind}_us']:>9.2f} {results[f'{kind}_naive_us']:>9.2f} "
+                              f"{results[f'{kind}_exact_compare_us']:>10.2f}")
+
+    def _dialogue(self, rng):
+        phrase = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+        alternatives = '\n'.join(' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4)))
+                                 for _ in range(rng.randint(0, 2)))
+        return Dialogue(npc_text='', correct_response=f'¡{phrase.capitalize()}!', hint='',
+                        alternative_responses=alternatives)
+
+    def _answer(self, rng, dialogue, kind):
+        text = dialogue.correct_response
+        if kind == 'exact':
+            return text
+        plain = normalize(text)
+        if kind == 'unaccented':
+            return plain
+        if kind == 'typo':
+            i = rng.randrange(len(plain))
+            return plain[:i] + rng.choice('aeiou') + plain[i + 1:]
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
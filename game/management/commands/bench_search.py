@@ -0,0 +1,111 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from game import search
+from game.models import Dialogue, Location
+
+WORDS = ('dónde', 'está', 'el', 'la', 'tren', 'qué', 'tal', 'gracias', 'por', 'favor', 'café',
+         'con', 'leche', 'número', 'teléfono', 'cuánto', 'cuesta', 'habitación', 'baño',
+         'izquierda', 'derecha', 'señor', 'señora', 'mañana', 'estación', 'música', 'película',
+         'difícil', 'fácil', 'también', 'aquí', 'allí', 'mercado', 'plaza', 'museo', 'playa')
+
+# (label, text): a common word, accents left off, a prefix, two words, a rare word, no match
+QUERIES = (
+    ('common', 'tren'),
+    ('unaccented', 'estacion'),
+    ('prefix', 'pelic'),
+    ('two words', 'cafe leche'),
+    ('rare', 'calle77'),
+    ('no match', 'zapato'),
+)
+
+
+class Command(BaseCommand):
+    help = ("Time full-text search against icontains over a generated set of dialogues: "
+            "the API's top 20 ranked results and the admin's match count. Runs in a "
+            "transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dialogues', type=int, default=500_000)
+        parser.add_argument('--locations', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5, help="timings per query; median kept")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help="print results as JSON")
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            raise CommandError("full-text search needs SQLite's FTS5")
+        rng = random.Random(options['seed'])
+        columns = ('npc_text', 'hint', 'correct_response')
+        results = []
+        with transaction.atomic():
+            start = time.perf_counter()
+            self._generate(rng, options['locations'], options['dialogues'])
+            inserted = time.perf_counter() - start
+            dialogues = Dialogue.objects.all()
+            for label, text in QUERIES:
+                row = {'query': label, 'text': text}
+                row['fts_top20_ms'] = self._time(
+                    lambda: search.search(dialogues, text, 20), options['repeat'])
+                row['icontains_top20_ms'] = self._time(
+                    lambda: list(search.icontains(dialogues, text, columns).order_by('pk')[:20]),
+                    options['repeat'])
+                row['fts_count_ms'] = self._time(
+                    lambda: search.matching(dialogues, text).count(), options['repeat'])
+                row['icontains_count_ms'] = self._time(
+                    lambda: search.icontains(dialogues, text, columns).count(),
+                    options['repeat'])
+                row['fts_matches'] = search.matching(dialogues, text).count()
+                row['icontains_matches'] = search.icontains(dialogues, text, columns).count()
+                results.append(row)
+            transaction.set_rollback(True)
+
+        if options['json']:
+            self.stdout.write(json.dumps({'dialogues': options['dialogues'],
+                                          'insert_rows_per_s': options['dialogues'] / inserted,
+                                          'queries': results}, indent=2))
+            return
+        self.stdout.write(f"{options['dialogues']} dialogues inserted at "
+                          f"{options['dialogues'] / inserted:.0f} rows/s (index kept by triggers)")
+        self.stdout.write(f"{'query':<11} {'fts top20':>10} {'like top20':>11} {'fts count':>10} "
+                          f"{'like count':>11} {'fts hits':>9} {'like hits':>10}")
+        for r in results:
+            self.stdout.write(f"{r['query']:<11} {r['fts_top20_ms']:>8.1f}ms "
+                              f"{r['icontains_top20_ms']:>9.1f}ms {r['fts_count_ms']:>8.1f}ms "
+                              f"{r['icontains_count_ms']:>9.1f}ms {r['fts_matches']:>9} "
+                              f"{r['icontains_matches']:>10}")
+
+    def _generate(self, rng, locations, count):
+        places = Location.objects.bulk_create(
+            Location(name=f'{rng.choice(WORDS).capitalize()} {i}',
+                     description=' '.join(rng.choices(WORDS, k=12)))
+            for i in range(locations))
+        batch = []
+        for i in range(count):
+            batch.append(Dialogue(
+                location=places[i % locations],
+                npc_text=f"¿{' '.join(rng.choices(WORDS, k=rng.randint(4, 10)))}?",
+                # A street name per thousand rows, for a term that is rare
+                hint=f"{' '.join(rng.choices(WORDS, k=3))} calle{i // 1000}",
+                correct_response=' '.join(rng.choices(WORDS, k=rng.randint(2, 5))),
+                difficulty=i % 3 + 1))
+            batch[-1].normalize_answers()
+            if len(batch) == 10_000:
+                Dialogue.objects.bulk_create(batch)
+                batch = []
+        Dialogue.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _time(self, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query()
+            timings.append(1000 * (time.perf_counter() - start))
+        return statistics.median(timings)
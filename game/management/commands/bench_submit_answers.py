@@ -0,0 +1,72 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from game.models import Dialogue, Location, PlayerProgress
+
+
+class Command(BaseCommand):
+    help = ("Compare answering N dialogues with N check_answer calls against one "
+            "submit_answers call. Runs in a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--json', action='store_true', help="print results as JSON")
+
+    def handle(self, *args, **options):
+        results = []
+        with transaction.atomic():
+            client, location, dialogues = self._setup(max(options['sizes']))
+            for size in options['sizes']:
+                batch = dialogues[:size]
+                single = self._time(options['repeat'], lambda: [
+                    client.post(f'/api/dialogues/{d.pk}/check_answer/?location={location.pk}',
+                                {'answer': d.correct_response}, format='json')
+                    for d in batch])
+                bulk = self._time(options['repeat'], lambda: client.post(
+                    '/api/dialogues/submit_answers/',
+                    {'answers': [{'dialogue_id': d.pk, 'answer': d.correct_response}
+                                 for d in batch]},
+                    format='json'))
+                results.append({'answers': size,
+                                'single_ms': 1000 * single,
+                                'bulk_ms': 1000 * bulk,
+                                'single_answers_per_s': size / single,
+                                'bulk_answers_per_s': size / bulk,
+                                'speedup': single / bulk})
+            transaction.set_rollback(True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'answers':>8} {'single ms':>10} {'bulk ms':>9} {'speedup':>8}")
+        for r in results:
+            self.stdout.write(f"{r['answers']:>8} {r['single_ms']:>10.1f} {r['bulk_ms']:>9.1f} "
+                              f"{r['speedup']:>7.1f}x")
+
+    def _setup(self, count):
+        user = User.objects.create_user('bench-submit-answers')
+        location = Location.objects.create(name='Benchmark', description='')
+        dialogues = Dialogue.objects.bulk_create(
+            Dialogue(location=location, npc_text=f'Frase {i}', correct_response=f'respuesta {i}',
+                     hint='', difficulty=1)
+            for i in range(count))
+        PlayerProgress.objects.create(user=user, current_location=location)
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+        return client, location, dialogues
+
+    def _time(self, repeat, run):
+        # Best of `repeat`, after one warm-up run
+        run()
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        return best
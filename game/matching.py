@@ -0,0 +1,86 @@
+"""Lenient answer matching for check_answer.
+
+Answers are compared in a normalized form: case-folded, accents removed,
+punctuation dropped and whitespace collapsed, so "¡Adiós!" and "adios"
+are the same answer. Dialogue stores the normalized forms of its accepted
+answers when it is saved, so a check only normalizes what the learner
+typed. Within that, a few typos are forgiven: answers up to
+max_edits(len) insertions, deletions or substitutions away still count.
+"""
+import re
+import unicodedata
+
+# Normalized answers this short must match exactly; longer ones allow a typo
+# per EDIT_EVERY characters, up to MAX_EDITS
+EXACT_UP_TO = 3
+EDIT_EVERY = 8
+MAX_EDITS = 2
+
+_PUNCTUATION = re.compile(r'[^\w\s]|_')
+
+
+def normalize(text):
+    """Case-folded, accent-free text with punctuation removed and single spaces."""
+    text = text.casefold()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(_PUNCTUATION.sub(' ', text).split())
+
+
+def max_edits(length):
+    if length <= EXACT_UP_TO:
+        return 0
+    return min(MAX_EDITS, 1 + (length - EXACT_UP_TO - 1) // EDIT_EVERY)
+
+
+def within_distance(a, b, limit):
+    """True if the Levenshtein distance between a and b is at most `limit`.
+
+    Only the diagonal band of width 2 * limit + 1 is computed, and it stops
+    as soon as a whole row is over the limit, so a clear miss costs a few
+    comparisons.
+    """
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > limit:
+        return False
+    # Shared prefixes and suffixes never need an edit
+    shortest = min(len(a), len(b))
+    prefix = 0
+    while prefix < shortest and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < shortest - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    a = a[prefix:len(a) - suffix]
+    b = b[prefix:len(b) - suffix]
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return len(b) <= limit
+
+    over = limit + 1  # Anything past the limit is as good as infinite
+    previous = [min(j, over) for j in range(len(b) + 1)]
+    for i, char in enumerate(a, 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        current[0] = min(i, over)
+        row_best = current[0] if lo == 1 else over
+        for j in range(lo, hi + 1):
+            cost = min(previous[j - 1] + (char != b[j - 1]), previous[j] + 1, current[j - 1] + 1)
+            current[j] = min(cost, over)
+            row_best = min(row_best, cost)
+        if row_best > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def is_accepted(answer, accepted):
+    """Whether `answer` is within max_edits of any already-normalized `accepted` answer."""
+    answer = normalize(answer)
+    if answer in accepted:
+        return True
+    return any(within_distance(answer, expected, max_edits(len(expected)))
+               for expected in accepted)
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 16:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0002_location_x_position_location_y_position'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='playerprogress',
+            index=models.Index(fields=['-score', 'id'], name='progress_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playerprogress',
+            index=models.Index(fields=['current_location', '-score', 'id'], name='progress_location_score_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+from game.matching import normalize
+
+
+def normalize_existing_answers(apps, schema_editor):
+    Dialogue = apps.get_model('game', 'Dialogue')
+    dialogues = list(Dialogue.objects.only('correct_response'))
+    for dialogue in dialogues:
+        dialogue.normalized_response = normalize(dialogue.correct_response)
+    Dialogue.objects.bulk_update(dialogues, ['normalized_response'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_playerprogress_score_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dialogue',
+            name='alternative_responses',
+            field=models.TextField(blank=True, help_text='Other accepted answers, one per line'),
+        ),
+        migrations.AddField(
+            model_name='dialogue',
+            name='normalized_alternatives',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='dialogue',
+            name='normalized_response',
+            field=models.TextField(db_index=True, default='', editable=False),
+        ),
+        migrations.RunPython(normalize_existing_answers, migrations.RunPython.noop),
+    ]
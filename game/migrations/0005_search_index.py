@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# External-content FTS5 tables: the index stores no second copy of the text,
+# and triggers keep it in step with every insert, update and delete,
+# including bulk_create() and queryset update() which send no signals.
+INDEXES = {
+    'game_dialogue': ('game_dialogue_fts', ('npc_text', 'hint', 'correct_response')),
+    'game_location': ('game_location_fts', ('name', 'description')),
+}
+
+
+def forward_sql(table, fts, columns):
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{c}' for c in columns)
+    old = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite's; on other databases search falls back to icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, (fts, columns) in INDEXES.items():
+        for statement in forward_sql(table, fts, columns):
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for fts, _ in INDEXES.values():
+        for trigger in ('insert', 'delete', 'update'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_dialogue_normalized_answers'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
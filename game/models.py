@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from .matching import normalize
+
 class Location(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
@@ -17,10 +19,41 @@ class Dialogue(models.Model):
     correct_response = models.TextField()
     hint = models.CharField(max_length=200)
     difficulty = models.IntegerField(default=1)
+    alternative_responses = models.TextField(
+        blank=True, help_text="Other accepted answers, one per line")
+    # Filled in from the answers above on save(); see game/matching.py.
+    # normalized_response is indexed for finding dialogues by answer; answer
+    # checks don't use it, they read the dialogue's own row by primary key
+    normalized_response = models.TextField(db_index=True, editable=False, default='')
+    normalized_alternatives = models.TextField(editable=False, default='')
     
     def __str__(self):
         return f"{self.location.name} - {self.npc_text[:50]}..."
 
+    def save(self, *args, **kwargs):
+        self.normalize_answers()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and \
+                {'correct_response', 'alternative_responses'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'normalized_response',
+                                       'normalized_alternatives'}
+        super().save(*args, **kwargs)
+
+    def normalize_answers(self):
+        """Store the normalized accepted answers; bulk_create() callers must call this."""
+        self.normalized_response = normalize(self.correct_response)
+        alternatives = (normalize(a) for a in self.alternative_responses.splitlines())
+        self.normalized_alternatives = '\n'.join(a for a in alternatives if a)
+
+    @property
+    def accepted_answers(self):
+        if not self.normalized_response and self.correct_response:
+            self.normalize_answers()  # Saved before normalization, or never saved
+        accepted = [self.normalized_response] if self.normalized_response else []
+        if self.normalized_alternatives:
+            accepted.extend(self.normalized_alternatives.split('\n'))
+        return accepted
+
 class PlayerProgress(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     current_location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True)
@@ -28,5 +61,13 @@ class PlayerProgress(models.Model):
     score = models.IntegerField(default=0)
     last_played = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        # Leaderboards: ORDER BY score DESC, id, optionally within one location
+        indexes = [
+            models.Index(fields=['-score', 'id'], name='progress_score_idx'),
+            models.Index(fields=['current_location', '-score', 'id'],
+                         name='progress_location_score_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.user.username}'s Progress"
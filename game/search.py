@@ -0,0 +1,110 @@
+"""Full-text search over dialogues and locations.
+
+On SQLite the text is indexed in FTS5 tables (migration 0005) that
+triggers keep current, so rows from bulk_create() or update() are
+searchable too. Matches are ranked by bm25 with hits in a dialogue's
+npc_text or a location's name counting for more. Case and accents are
+ignored, so "estacion" finds "estación". Other databases fall back to
+icontains, unranked.
+
+What the user typed never reaches FTS5 query syntax: each word becomes a
+quoted prefix term, and every word must match.
+"""
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Dialogue, Location
+
+# Model -> (FTS5 table, {column: bm25 weight} in index order)
+INDEXES = {
+    Dialogue: ('game_dialogue_fts', {'npc_text': 3.0, 'hint': 1.0, 'correct_response': 1.0}),
+    Location: ('game_location_fts', {'name': 3.0, 'description': 1.0}),
+}
+
+_WORD = re.compile(r'\w+')
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(text, columns=None):
+    """A safe FTS5 query for `text`, limited to `columns` if given; None if it has no words."""
+    words = _WORD.findall(text)
+    if not words:
+        return None
+    expression = ' '.join(f'"{word}"*' for word in words)
+    if columns:
+        expression = f"{{{' '.join(columns)}}} : ({expression})"
+    return expression
+
+
+def icontains(queryset, text, columns):
+    """Rows with every word of `text` in one of `columns`: the fallback without FTS5."""
+    words = _WORD.findall(text)
+    if not words:
+        return queryset.none()
+    return queryset.filter(reduce(and_, (
+        reduce(or_, (Q(**{f'{column}__icontains': word}) for column in columns))
+        for word in words)))
+
+
+def matching(queryset, text, columns=None):
+    """`queryset` narrowed to rows matching `text`, in its own order. For the admin."""
+    table, weights = INDEXES[queryset.model]
+    columns = columns or list(weights)
+    if not fts_enabled():
+        return icontains(queryset, text, columns)
+    expression = match_expression(text, columns)
+    if expression is None:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression]))
+
+
+def search(queryset, text, limit=20, columns=None):
+    """The best `limit` rows of `queryset` matching `text`, best first, each with a `rank`.
+
+    Lower ranks are better (bm25 scores are negative); without FTS5 every
+    rank is None.
+    """
+    model = queryset.model
+    table, weights = INDEXES[model]
+    columns = columns or list(weights)
+    if not fts_enabled():
+        rows = list(icontains(queryset, text, columns).order_by('pk')[:limit])
+        for row in rows:
+            row.rank = None
+        return rows
+    expression = match_expression(text, columns)
+    if expression is None:
+        return []
+
+    weighting = ', '.join(str(weight) for weight in weights.values())
+    sql = (f'SELECT rowid, bm25({table}, {weighting}) AS rank FROM {table} '
+           f'WHERE {table} MATCH %s')
+    params = [expression]
+    if queryset.query.where:
+        # Rank only within the queryset's filters, so they cannot empty the top `limit`
+        subquery, subparams = queryset.values('pk').query.sql_with_params()
+        sql += f' AND rowid IN ({subquery})'
+        params.extend(subparams)
+    sql += ' ORDER BY rank LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ranked = cursor.fetchall()
+
+    rows = queryset.in_bulk([pk for pk, _ in ranked])
+    results = []
+    for pk, rank in ranked:
+        row = rows.get(pk)
+        if row is not None:
+            row.rank = rank
+            results.append(row)
+    return results
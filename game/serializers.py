@@ -1,3 +1,6 @@
+from collections import defaultdict
+
+from django.db.models import Count
 from rest_framework import serializers
 from .models import Location, Dialogue, PlayerProgress
 from django.contrib.auth.models import User
@@ -12,11 +15,20 @@ class LocationSerializer(serializers.ModelSerializer):
         model = Location
         fields = '__all__'
 
+class LocationSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Location
+        fields = ('id', 'name', 'x_position', 'y_position')
+
 class DialogueSerializer(serializers.ModelSerializer):
     class Meta:
         model = Dialogue
         fields = ('id', 'npc_text', 'hint', 'difficulty')
 
+class AnswerSubmissionSerializer(serializers.Serializer):
+    dialogue_id = serializers.IntegerField()
+    answer = serializers.CharField(allow_blank=True, max_length=1000, trim_whitespace=False)
+
 class PlayerProgressSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     current_location = LocationSerializer(read_only=True)
@@ -24,4 +36,57 @@ class PlayerProgressSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = PlayerProgress
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__' 
+
+def attach_completion_summary(progresses, include_ids=False):
+    """Set completed_by_location (and completed_dialogue_ids) on each PlayerProgress.
+
+    One grouped query over the completions of all of them, plus one for the
+    ids when asked, however many dialogues they have completed.
+    """
+    Completion = PlayerProgress.completed_dialogues.through
+    completions = Completion.objects.filter(playerprogress_id__in=[p.pk for p in progresses])
+    counts = defaultdict(list)
+    for progress_id, location_id, count in (completions
+            .values_list('playerprogress_id', 'dialogue__location_id')
+            .annotate(count=Count('pk')).order_by('playerprogress_id', 'dialogue__location_id')):
+        counts[progress_id].append({'location': location_id, 'count': count})
+    ids = defaultdict(list)
+    if include_ids:
+        for progress_id, dialogue_id in (completions.values_list('playerprogress_id', 'dialogue_id')
+                                         .order_by('dialogue_id')):
+            ids[progress_id].append(dialogue_id)
+    for progress in progresses:
+        progress.completed_by_location = counts[progress.pk]
+        if include_ids:
+            progress.completed_dialogue_ids = ids[progress.pk]
+
+class PlayerProgressSummarySerializer(serializers.ModelSerializer):
+    """Progress with completion counts rather than the completed dialogues themselves.
+
+    Those are paginated at /api/progress/<id>/completed/. Serialize objects
+    passed through attach_completion_summary() to keep the query count flat.
+    """
+    user = UserSerializer(read_only=True)
+    current_location = LocationSummarySerializer(read_only=True)
+    completed_count = serializers.SerializerMethodField()
+    completed_by_location = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PlayerProgress
+        fields = ('id', 'user', 'current_location', 'score', 'last_played', 'completed_count',
+                  'completed_by_location')
+
+    def get_completed_by_location(self, progress):
+        if not hasattr(progress, 'completed_by_location'):
+            attach_completion_summary([progress])
+        return progress.completed_by_location
+
+    def get_completed_count(self, progress):
+        return sum(entry['count'] for entry in self.get_completed_by_location(progress))
+
+    def to_representation(self, progress):
+        data = super().to_representation(progress)
+        if hasattr(progress, 'completed_dialogue_ids'):
+            data['completed_dialogue_ids'] = progress.completed_dialogue_ids
+        return data
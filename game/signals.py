@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .leaderboard import invalidate_leaderboards
+from .models import Dialogue, Location, PlayerProgress
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=Dialogue)
+@receiver(post_delete, sender=Dialogue)
+def content_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=PlayerProgress)
+@receiver(post_delete, sender=PlayerProgress)
+def progress_changed(sender, **kwargs):
+    # Saves can move a player between boards or lower a score; rebuild on next read
+    invalidate_leaderboards()
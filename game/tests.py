@@ -1,3 +1,1680 @@
-from django.test import TestCase
+import time
+from collections import Counter
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.test import (LiveServerTestCase, SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from rest_framework.test import APIClient
+
+from game.core.headless import use_egl_platform
+
+# PyOpenGL picks its platform on first import; render tests run offscreen
+use_egl_platform()
+
+from game.core.heightmap import generate_height_map
+from game.core.timestep import FixedTimestep
+from game.models import Dialogue, Location, PlayerProgress
+
+
+def create_headless_context(test_case, width=64, height=64):
+    from game.core.headless import HeadlessContext
+    try:
+        context = HeadlessContext(width, height)
+    except Exception as e:
+        test_case.skipTest(f"no offscreen OpenGL context available: {e}")
+    test_case.addCleanup(context.release)
+    return context
+
+
+def live_gl_objects(max_name=512):
+    from OpenGL.GL import glIsBuffer, glIsProgram, glIsShader, glIsTexture
+    return {
+        'buffers': sum(bool(glIsBuffer(i)) for i in range(1, max_name)),
+        'programs': sum(bool(glIsProgram(i)) for i in range(1, max_name)),
+        'shaders': sum(bool(glIsShader(i)) for i in range(1, max_name)),
+        'textures': sum(bool(glIsTexture(i)) for i in range(1, max_name)),
+    }
+
+
+class HeightMapGenerationTests(SimpleTestCase):
+    def test_process_pool_output_is_bit_identical(self):
+        single = generate_height_map(97, base=3)
+        pooled = generate_height_map(97, base=3, workers=2)
+        self.assertEqual(single.dtype, pooled.dtype)
+        self.assertEqual(single.tobytes(), pooled.tobytes())
+
+    def test_matches_the_per_cell_loop(self):
+        from noise import snoise2
+        from game.core.heightmap import build_mesh
+
+        # The original Terrain.generate_terrain: one snoise2 call per cell, then
+        # four unshared vertices and a face normal per quad
+        size = 20
+        legacy = np.zeros((size, size))
+        for i in range(size):
+            for j in range(size):
+                legacy[i][j] = snoise2(i / 25.0, j / 25.0, 4, 0.5, 2.0)
+        legacy = (legacy - legacy.min()) / (legacy.max() - legacy.min()) * 2.0
+
+        height_map = generate_height_map(size)
+        np.testing.assert_allclose(height_map, legacy, atol=1e-6)
+
+        vertices, normals, texcoords, indices = build_mesh(height_map)
+        triangles = indices.reshape(-1, 6)
+        self.assertEqual(len(triangles), (size - 1) ** 2)
+        for quad, (z, x) in enumerate(np.ndindex(size - 1, size - 1)):
+            corners = [(x, z), (x + 1, z), (x + 1, z + 1), (x, z + 1)]
+            v1, v2, v3, v4 = [((cx - size / 2), legacy[cx][cz], (cz - size / 2)) for cx, cz in corners]
+            # Same corners, split into the triangles v1 v2 v3 and v1 v3 v4
+            np.testing.assert_allclose(vertices[triangles[quad]], [v1, v2, v3, v1, v3, v4], atol=1e-6)
+            # Texture coordinates differ only by whole repeats
+            offset = texcoords[triangles[quad]] - [(cx / 5, cz / 5) for cx, cz in
+                                                    (corners[0], corners[1], corners[2],
+                                                     corners[0], corners[2], corners[3])]
+            np.testing.assert_allclose(offset, np.round(offset), atol=1e-6)
+            # Smooth vertex normals stay within 25 degrees of the old normal of the
+            # quad's first triangle, which this winding made point down
+            face = np.cross(np.subtract(v2, v1), np.subtract(v3, v1))
+            face /= -np.linalg.norm(face)
+            self.assertGreater(min(normals[triangles[quad]] @ face), 0.9)
+
+
+class ChunkStreamingTests(SimpleTestCase):
+    class Executor:
+        # Stands in for the process pool: work runs only when run() is called
+        def __init__(self):
+            self.queued = []
+
+        def submit(self, fn, *args):
+            from concurrent.futures import Future
+            future = Future()
+            self.queued.append((future, fn, args))
+            return future
+
+        def run(self, fail=False):
+            for future, fn, args in self.queued:
+                if future.set_running_or_notify_cancel():
+                    if fail:
+                        future.set_exception(RuntimeError("worker died"))
+                    else:
+                        future.set_result(fn(*args))
+            self.queued = []
+
+    def test_chunks_are_deterministic_and_seams_match(self):
+        from game.core.chunks import generate_chunk
+
+        size = 16
+        _, _, left, left_vertices, left_normals, _, _ = generate_chunk(7, 0, 0, size)
+        _, _, right, right_vertices, right_normals, _, _ = generate_chunk(7, 1, 0, size)
+        left_normals = left_normals.reshape(size + 1, size + 1, 3)    # [z, x]
+        right_normals = right_normals.reshape(size + 1, size + 1, 3)
+        left_vertices = left_vertices.reshape(size + 1, size + 1, 3)
+        right_vertices = right_vertices.reshape(size + 1, size + 1, 3)
+        self.assertEqual(left[-1].tobytes(), right[0].tobytes())       # height_map is [x, z]
+        self.assertEqual(left_vertices[:, -1].tobytes(), right_vertices[:, 0].tobytes())
+        self.assertEqual(left_normals[:, -1].tobytes(), right_normals[:, 0].tobytes())
+
+        _, _, again, again_vertices, again_normals, _, _ = generate_chunk(7, 1, 0, size)
+        self.assertEqual(again.tobytes(), right.tobytes())
+        self.assertEqual(again_vertices.tobytes(), right_vertices.tobytes())
+        self.assertEqual(again_normals.tobytes(), right_normals.tobytes())
+        self.assertNotEqual(generate_chunk(8, 1, 0, size)[2].tobytes(), right.tobytes())
+
+    def test_update_streams_evicts_least_recently_used_and_survives_failures(self):
+        from game.core.chunks import ChunkedTerrain
+
+        executor = self.Executor()
+        terrain = ChunkedTerrain(chunk_size=8, view_radius=0, max_chunks=2, executor=executor)
+        self.addCleanup(terrain.release)
+
+        def visit(cx, run=True):
+            terrain.update((cx * 8 + 4, 0, 4))
+            if run:
+                executor.run()
+                terrain.update((cx * 8 + 4, 0, 4))
+
+        visit(0)
+        visit(1)
+        self.assertEqual(list(terrain.chunks), [(0, 0), (1, 0)])
+        visit(0)  # A hit makes (1, 0) the least recently used
+        visit(2, run=False)
+        visit(3)  # (2, 0) never started: cancelled, not generated
+        self.assertEqual(list(terrain.chunks), [(0, 0), (3, 0)])
+        self.assertEqual(terrain.pending, {})
+        m = terrain.metrics
+        self.assertEqual((m.hits, m.misses, m.evictions, m.cancelled, m.generated),
+                         (2, 4, 1, 1, 3))
+
+        terrain.update((4 * 8 + 4, 0, 4))
+        executor.run(fail=True)
+        terrain.update((4 * 8 + 4, 0, 4))  # Must not raise
+        self.assertEqual(terrain.metrics.failed, 1)
+        self.assertNotIn((4, 0), terrain.chunks)
+        visit(4)  # Resubmitted, and this time it works
+        self.assertIn((4, 0), terrain.chunks)
+        self.assertEqual(terrain.metrics.misses, 6)
+
+
+class TerrainLodTests(SimpleTestCase):
+    N = 16
+
+    def edge_segments(self, indices, on_edge, along):
+        # Triangle edges lying on one side of the patch, as (start, end) along that side
+        n = self.N
+        triangles = np.asarray(indices).reshape(-1, 3)
+        xs, zs = triangles % (n + 1), triangles // (n + 1)
+        segments = set()
+        for a, b in ((0, 1), (1, 2), (2, 0)):
+            both = on_edge(xs[:, a], zs[:, a]) & on_edge(xs[:, b], zs[:, b])
+            ends = np.sort(np.stack([along(xs[:, a], zs[:, a]), along(xs[:, b], zs[:, b])],
+                                    axis=1)[both], axis=1)
+            segments.update(map(tuple, ends.tolist()))
+        return segments
+
+    def test_edges_next_to_a_coarser_patch_have_no_cracks(self):
+        from game.core.lod import (EDGE_NEG_X, EDGE_NEG_Z, EDGE_POS_X, EDGE_POS_Z, lod_indices,
+                                   max_level)
+        n = self.N
+        # Each side, and the side of the neighbour that touches it
+        sides = {
+            EDGE_NEG_Z: (lambda x, z: z == 0, lambda x, z: z == n, lambda x, z: x),
+            EDGE_POS_Z: (lambda x, z: z == n, lambda x, z: z == 0, lambda x, z: x),
+            EDGE_NEG_X: (lambda x, z: x == 0, lambda x, z: x == n, lambda x, z: z),
+            EDGE_POS_X: (lambda x, z: x == n, lambda x, z: x == 0, lambda x, z: z),
+        }
+        for level in range(max_level(n)):
+            coarse = lod_indices(n, level + 1)
+            stride = 2 ** (level + 1)
+            for mask in range(16):
+                fine = lod_indices(n, level, mask)
+                triangles = fine.reshape(-1, 3)
+                # Snapping must not open holes: the triangles still cover the whole patch
+                x, z = triangles % (n + 1), triangles // (n + 1)
+                area = np.abs((x[:, 1] - x[:, 0]) * (z[:, 2] - z[:, 0])
+                              - (x[:, 2] - x[:, 0]) * (z[:, 1] - z[:, 0])) / 2
+                self.assertEqual(area.sum(), n * n)
+                for bit, (on_edge, neighbour_edge, along) in sides.items():
+                    if not mask & bit:
+                        continue
+                    with self.subTest(level=level, mask=mask, edge=bit):
+                        segments = self.edge_segments(fine, on_edge, along)
+                        self.assertTrue(all(a % stride == 0 and b % stride == 0
+                                            for a, b in segments))
+                        self.assertEqual(segments, self.edge_segments(coarse, neighbour_edge, along))
+
+    def test_constrained_neighbours_are_at_most_one_level_apart(self):
+        from game.core.lod import EDGE_NEG_X, EDGE_NEG_Z, EDGE_POS_X, EDGE_POS_Z, constrain_levels
+
+        rng = np.random.default_rng(4)
+        sides = ((0, -1, EDGE_NEG_Z), (1, 0, EDGE_POS_X), (0, 1, EDGE_POS_Z), (-1, 0, EDGE_NEG_X))
+        for _ in range(50):
+            wanted = {(cx, cz): int(rng.integers(0, 5)) for cx in range(6) for cz in range(6)
+                      if rng.random() < 0.9}
+            levels = dict(wanted)
+            masks = constrain_levels(levels)
+            for (cx, cz), level in levels.items():
+                self.assertLessEqual(level, wanted[(cx, cz)])  # Only ever made finer
+                for dx, dz, bit in sides:
+                    other = levels.get((cx + dx, cz + dz))
+                    if other is None:
+                        continue
+                    self.assertLessEqual(abs(level - other), 1)
+                    self.assertEqual(bool(masks[(cx, cz)] & bit), other > level)
+
+
+    def test_static_terrain_patches_meet_without_cracks(self):
+        from game.core.lod import patch_lod_indices
+        from game.core.terrain import Terrain
+
+        # 50 vertices: the last row and column of patches is a single quad wide
+        for size, eye in ((65, (-40.0, 5.0, -40.0)), (50, (-30.0, 5.0, 0.0))):
+            terrain = Terrain(size=size, patch_size=16)
+            patches = np.arange(len(terrain.patches))
+            levels = terrain.patch_levels(patches, eye)
+            self.assertGreater(max(level for level, _ in levels.values()), 0)
+            drawn = []
+            for patch in patches:
+                level, mask = levels[patch]
+                x0, z0, x1, z1 = terrain.patch_cells[patch]
+                if x1 - x0 < 16 or z1 - z0 < 16:
+                    self.assertEqual((level, mask), (0, 0))
+                if level or mask:
+                    drawn.append(patch_lod_indices(size, x0, z0, 16, level, mask))
+                else:
+                    first, count = terrain.patches[patch]
+                    drawn.append(terrain.indices[first:first + count])
+            triangles = np.concatenate(drawn).reshape(-1, 3).astype(np.int64)
+            self.assertLess(len(triangles), 2 * (size - 1) ** 2)
+
+            # Every edge inside the map is shared by two triangles; only the border is open
+            edges = Counter()
+            for a, b in ((0, 1), (1, 2), (2, 0)):
+                edges.update(map(tuple, np.sort(triangles[:, [a, b]], axis=1).tolist()))
+            x, z = triangles % size, triangles // size
+            area = np.abs((x[:, 1] - x[:, 0]) * (z[:, 2] - z[:, 0])
+                          - (x[:, 2] - x[:, 0]) * (z[:, 1] - z[:, 0])) / 2
+            self.assertEqual(area.sum(), (size - 1) ** 2)
+            for (a, b), uses in edges.items():
+                on_border = any(c in (0, size - 1) and d == c
+                                for c, d in ((a % size, b % size), (a // size, b // size)))
+                with self.subTest(size=size, edge=(a, b)):
+                    self.assertEqual(uses, 1 if on_border else 2)
+
+class TerrainCacheTests(SimpleTestCase):
+    PARAMS = {'size': 8, 'octaves': 4}
+
+    def setUp(self):
+        import tempfile
+        from game.core.terrain_cache import TerrainCache
+
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.cache = TerrainCache(root.name)
+        self.arrays = {'height_map': np.arange(64, dtype=np.float32).reshape(8, 8),
+                       'indices': np.arange(96, dtype=np.uint32)}
+
+    def assert_rebuilt(self, corrupt):
+        import os
+        self.cache.store(self.PARAMS, self.arrays)
+        entry = self.cache.path(self.PARAMS)
+        corrupt(entry)
+        with self.assertLogs('game.core.terrain_cache', 'WARNING'):
+            self.assertIsNone(self.cache.load(self.PARAMS))
+        self.assertFalse(os.path.exists(entry))
+
+    def test_warm_load_is_memory_mapped(self):
+        self.cache.store(self.PARAMS, self.arrays)
+        loaded = self.cache.load(self.PARAMS)
+        for name, array in self.arrays.items():
+            self.assertIsInstance(loaded[name], np.memmap)
+            self.assertEqual(loaded[name].tobytes(), array.tobytes())
+
+    def test_corrupt_entries_are_discarded(self):
+        import os
+
+        def flip_bytes(entry):
+            path = os.path.join(entry, 'height_map.npy')
+            with open(path, 'r+b') as f:
+                f.seek(-4, os.SEEK_END)
+                f.write(b'\xff\xff\xff\xff')
+
+        def truncate_manifest(entry):
+            path = os.path.join(entry, 'manifest.json')
+            with open(path, 'r+') as f:
+                f.truncate(os.path.getsize(path) // 2)
+
+        def truncate_array(entry):
+            with open(os.path.join(entry, 'indices.npy'), 'r+b') as f:
+                f.truncate(100)
+
+        for corrupt in (flip_bytes, truncate_manifest, truncate_array):
+            with self.subTest(corrupt.__name__):
+                self.assert_rebuilt(corrupt)
+
+    def test_other_parameters_and_format_versions_miss(self):
+        from unittest import mock
+        from game.core import terrain_cache
+
+        self.cache.store(self.PARAMS, self.arrays)
+        self.assertIsNone(self.cache.load({**self.PARAMS, 'size': 16}))
+        with mock.patch.object(terrain_cache, 'FORMAT_VERSION', terrain_cache.FORMAT_VERSION + 1):
+            self.assertIsNone(self.cache.load(self.PARAMS))
+        self.assertIsNotNone(self.cache.load(self.PARAMS))
+
+
+class HeightSamplingTests(SimpleTestCase):
+    # Indexed [x, z], like every height map
+    HEIGHTS = np.array([[0, 1, 4],
+                        [2, 5, 3],
+                        [7, 6, 8]], dtype=np.float32)
+
+    def test_bilinear_heights(self):
+        from game.core.heightmap import sample_heights
+
+        h = self.HEIGHTS
+        xs, zs = np.meshgrid(np.arange(3), np.arange(3), indexing='ij')
+        np.testing.assert_array_equal(sample_heights(h, xs, zs), h)
+        cases = [
+            ((0.5, 0.0), (h[0, 0] + h[1, 0]) / 2),                 # Midpoints of cell edges
+            ((1.0, 1.5), (h[1, 1] + h[1, 2]) / 2),
+            ((0.5, 0.5), h[:2, :2].mean()),                        # Cell centre
+            ((0.25, 0.75), 0.75 * 0.25 * h[0, 0] + 0.25 * 0.25 * h[1, 0]
+             + 0.75 * 0.75 * h[0, 1] + 0.25 * 0.75 * h[1, 1]),
+            ((2.0, 0.5), (h[2, 0] + h[2, 1]) / 2),                 # Far border
+            ((1.5, 2.0), (h[1, 2] + h[2, 2]) / 2),
+            ((-5.0, 0.5), (h[0, 0] + h[0, 1]) / 2),                # Clamped to the edge
+            ((9.0, 9.0), h[2, 2]),
+            ((1.5, -3.0), (h[1, 0] + h[2, 0]) / 2),
+        ]
+        for (gx, gz), expected in cases:
+            with self.subTest(gx=gx, gz=gz):
+                self.assertAlmostEqual(float(sample_heights(h, gx, gz)), expected, places=6)
+
+    def test_gradients_and_normals(self):
+        from game.core.heightmap import gradients_to_normals, sample_gradients, sample_heights
+
+        xs, zs = np.meshgrid(np.arange(4), np.arange(4), indexing='ij')
+        plane = (3 * xs - 2 * zs + 1).astype(np.float32)
+        gx = np.array([0.0, 0.5, 1.25, 3.0, -2.0, 7.0])
+        gz = np.array([0.0, 2.5, 0.75, 3.0, 1.0, -1.0])
+        dh_dx, dh_dz = sample_gradients(plane, gx, gz, cell_size=2.0)
+        np.testing.assert_allclose(dh_dx, 1.5)
+        np.testing.assert_allclose(dh_dz, -1.0)
+        expected = np.array([-1.5, 1.0, 1.0]) / np.sqrt(1.5 ** 2 + 1 + 1)
+        np.testing.assert_allclose(gradients_to_normals(dh_dx, dh_dz), np.tile(expected, (6, 1)))
+
+        # Inside a cell the gradient is the derivative of the interpolated surface
+        h, e = self.HEIGHTS, 1e-4
+        for x, z in ((0.3, 0.6), (1.7, 1.2)):
+            dx, dz = sample_gradients(h, x, z)
+            self.assertAlmostEqual(float(dx), float(sample_heights(h, x + e, z)
+                                                    - sample_heights(h, x - e, z)) / (2 * e), 3)
+            self.assertAlmostEqual(float(dz), float(sample_heights(h, x, z + e)
+                                                    - sample_heights(h, x, z - e)) / (2 * e), 3)
+
+    def test_terrain_heights_match_the_grid(self):
+        from game.core.terrain import Terrain
+
+        terrain = Terrain(size=16, scale=2)
+        cells = np.arange(16)
+        world = (cells - 8) * 2
+        for i in (0, 5, 15):
+            for j in (0, 9, 15):
+                self.assertEqual(terrain.get_height(world[i], world[j]), terrain.height_map[i, j])
+        xs, zs = np.meshgrid(world, world, indexing='ij')
+        np.testing.assert_array_equal(terrain.get_heights(xs, zs), terrain.height_map)
+
+
+class SpatialGridTests(SimpleTestCase):
+    def test_queries_match_a_brute_force_scan(self):
+        import math
+        import random
+        from game.core.spatial import SpatialGrid
+
+        rng = random.Random(5)
+        grid = SpatialGrid(cell_size=8.0)
+        boxes = {}
+
+        def random_box():
+            # Mostly smaller than a cell, but many straddle cell edges and some span several
+            x, z = rng.uniform(-60, 60), rng.uniform(-60, 60)
+            w = rng.uniform(0, 6) if rng.random() < 0.8 else rng.uniform(6, 30)
+            d = rng.uniform(0, 12)
+            if rng.random() < 0.2:
+                x = z = rng.randint(-6, 6) * 8.0 - 0.5  # Right across a cell corner
+            return x, z, x + w, z + d
+
+        def distance(key, x, z):
+            min_x, min_z, max_x, max_z = boxes[key]
+            return math.hypot(max(min_x - x, 0, x - max_x), max(min_z - z, 0, z - max_z))
+
+        next_key = 0
+        for step in range(1500):
+            roll = rng.random()
+            if roll < 0.4 or len(boxes) < 5:
+                boxes[next_key] = random_box()
+                grid.insert(next_key, *boxes[next_key])
+                next_key += 1
+            elif roll < 0.8:
+                key = rng.choice(list(boxes))
+                min_x, min_z, max_x, max_z = boxes[key]
+                if rng.random() < 0.5:
+                    dx, dz = rng.uniform(-3, 3), rng.uniform(-3, 3)  # Nudge, maybe over an edge
+                    boxes[key] = (min_x + dx, min_z + dz, max_x + dx, max_z + dz)
+                else:
+                    boxes[key] = random_box()
+                grid.move(key, *boxes[key])
+            else:
+                key = rng.choice(list(boxes))
+                del boxes[key]
+                grid.remove(key)
+
+            if step % 10:
+                continue
+            self.assertEqual(len(grid), len(boxes))
+            x, z = rng.uniform(-80, 80), rng.uniform(-80, 80)
+            w, d, radius = rng.uniform(0, 40), rng.uniform(0, 40), rng.uniform(0, 25)
+            self.assertEqual(sorted(grid.query_aabb(x, z, x + w, z + d)),
+                             sorted(k for k, b in boxes.items()
+                                    if b[0] <= x + w and x <= b[2] and b[1] <= z + d and z <= b[3]))
+            self.assertEqual(sorted(grid.query_radius(x, z, radius)),
+                             sorted(k for k in boxes if distance(k, x, z) <= radius))
+            self.assertEqual(sorted(grid.query_point(x, z)),
+                             sorted(k for k, b in boxes.items()
+                                    if b[0] < x < b[2] and b[1] < z < b[3]))
+            best = min(distance(k, x, z) for k in boxes)
+            key, found = grid.nearest(x, z)
+            self.assertAlmostEqual(found, best)
+            self.assertAlmostEqual(distance(key, x, z), best)
+            within = grid.nearest(x, z, max_distance=radius)
+            if best <= radius:
+                self.assertAlmostEqual(within[1], best)
+            else:
+                self.assertIsNone(within)
+
+        for key, box in boxes.items():
+            cells = {cell for cell, members in grid.cells.items() if key in members}
+            self.assertEqual(cells, set(grid._cells_for(box)))
+
+
+class StaticBatchTests(SimpleTestCase):
+    def test_swap_remove_uploads_only_dirty_slots(self):
+        from unittest import mock
+        from game.core import static_batch
+        from game.core.static_batch import StaticBatch, box_vertices
+
+        uploads = []
+        gl = {'glGenBuffers': mock.Mock(side_effect=[1, 2]), 'glBindBuffer': mock.Mock(),
+              'glBufferData': mock.Mock(),
+              'glBufferSubData': lambda target, offset, size, data: uploads.append(
+                  (offset, size, np.array(data)))}
+        with mock.patch.multiple(static_batch, **gl):
+            batch = StaticBatch(capacity=8)
+            boxes = {key: ((i * 10.0, 0.0, 0.0), (2.0, 3.0, 2.0)) for i, key in enumerate('abcdef')}
+            for key, (position, size) in boxes.items():
+                batch.add(key, position, size)
+            batch._sync()
+            self.assertEqual(gl['glBufferData'].call_count, 2)  # First sync: whole buffers
+            self.assertEqual(uploads, [])
+            slot_bytes = batch.data[0].nbytes
+
+            batch.remove('b')  # The last box moves into the hole
+            self.assertEqual(batch.keys, ['a', 'f', 'c', 'd', 'e'])
+            self.assertEqual(batch.slots, {'a': 0, 'f': 1, 'c': 2, 'd': 3, 'e': 4})
+            np.testing.assert_array_equal(batch.data[1], box_vertices(*boxes['f']))
+            batch._sync()
+            self.assertEqual(len(uploads), 1)
+            offset, size, data = uploads.pop()
+            self.assertEqual((offset, size), (slot_bytes, slot_bytes))
+            np.testing.assert_array_equal(data[0], box_vertices(*boxes['f']))
+
+            # Slots 0 and 1 are refilled and the vacated slot 2 is dropped: one upload
+            batch.remove('f')
+            batch.remove('c')
+            batch.remove('a')
+            self.assertEqual(batch.keys, ['d', 'e'])
+            batch._sync()
+            self.assertEqual([(offset, size) for offset, size, _ in uploads],
+                             [(0, 2 * slot_bytes)])
+            for key, slot in batch.slots.items():
+                np.testing.assert_array_equal(batch.data[slot], box_vertices(*boxes[key]))
+            self.assertEqual(gl['glBufferData'].call_count, 2)  # Never rebuilt
+
+    def test_set_uv_remaps_every_face(self):
+        from unittest import mock
+        from game.core import static_batch
+        from game.core.static_batch import StaticBatch, box_vertices
+
+        uploads = []
+        gl = {'glGenBuffers': mock.Mock(side_effect=[1, 2]), 'glBindBuffer': mock.Mock(),
+              'glBufferData': mock.Mock(),
+              'glBufferSubData': lambda target, offset, size, data: uploads.append((offset, size))}
+        with mock.patch.multiple(static_batch, **gl):
+            batch = StaticBatch(capacity=4)
+            batch.add('a', (0, 0, 0), (2, 3, 2))
+            batch.add('b', (5, 0, 0), (2, 3, 2))
+            batch._sync()
+            uv = (0.25, 0.5, 0.375, 0.625)
+            batch.set_uv(uv)
+            batch.add('c', (9, 0, 0), (1, 1, 1))
+            np.testing.assert_array_equal(batch.data[0], box_vertices((0, 0, 0), (2, 3, 2), uv))
+            np.testing.assert_array_equal(batch.data[2], box_vertices((9, 0, 0), (1, 1, 1), uv))
+            texcoords = batch.data[:3, :, 6:8]
+            self.assertEqual((texcoords.min(axis=(0, 1)).tolist(), texcoords.max(axis=(0, 1)).tolist()),
+                             ([0.25, 0.5], [0.375, 0.625]))
+            np.testing.assert_array_equal(batch.data[:3, :, :6],
+                                          np.stack([box_vertices(p, s)[:, :6] for p, s in
+                                                    (((0, 0, 0), (2, 3, 2)), ((5, 0, 0), (2, 3, 2)),
+                                                     ((9, 0, 0), (1, 1, 1)))]))
+            batch._sync()
+            self.assertEqual(uploads, [(0, 3 * batch.data[0].nbytes)])  # Every slot, one upload
+
+            batch.set_uv(uv)  # Unchanged: nothing to upload
+            batch._sync()
+            self.assertEqual(len(uploads), 1)
+
+
+class MipChainTests(SimpleTestCase):
+    def test_level_sizes(self):
+        from game.core.textures import mip_chain
+
+        for (height, width), expected in (
+                ((8, 4), [(8, 4), (4, 2), (2, 1), (1, 1)]),
+                ((5, 3), [(5, 3), (2, 1), (1, 1)]),           # Odd rows/columns are dropped
+                ((1, 4), [(1, 4), (1, 2), (1, 1)]),
+                ((1, 1), [(1, 1)])):
+            levels = mip_chain(np.zeros((height, width, 4), dtype=np.uint8))
+            self.assertEqual([level.shape[:2] for level in levels], expected)
+            self.assertTrue(all(level.dtype == np.uint8 for level in levels))
+        limited = mip_chain(np.zeros((16, 16, 4), dtype=np.uint8), max_level=2)
+        self.assertEqual([level.shape[:2] for level in limited], [(16, 16), (8, 8), (4, 4)])
+
+    def test_levels_are_rounded_box_filter_averages(self):
+        from game.core.textures import mip_chain
+
+        pixels = np.zeros((2, 4, 4), dtype=np.uint8)
+        pixels[..., 0] = [[0, 10, 255, 255], [20, 31, 255, 254]]
+        pixels[..., 3] = 255
+        half, quarter = mip_chain(pixels)[1:]
+        self.assertEqual(half[..., 0].tolist(), [[15, 255]])   # (0+10+20+31+2)//4, (1019+2)//4
+        self.assertEqual(half[..., 3].tolist(), [[255, 255]])
+        self.assertEqual(quarter[..., 0].tolist(), [[135]])    # A single row averages with itself
+
+        rng = np.random.default_rng(2)
+        pixels = rng.integers(0, 256, (64, 32, 4), dtype=np.uint8)
+        for level in mip_chain(pixels)[1:]:
+            self.assertLessEqual(abs(float(level.mean()) - float(pixels.mean())), 1.0)
+
+
+class TextureManagerTests(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+        create_headless_context(self)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write_image(self, name, size, color):
+        import os
+        from PIL import Image
+        path = os.path.join(self.dir.name, name)
+        Image.new('RGBA', size, color).save(path)
+        return path
+
+    def test_cache_write_failure_still_uploads(self):
+        from game.core.textures import TextureManager
+
+        class FullDiskCache:
+            def load(self, params):
+                return None
+
+            def store(self, params, arrays):
+                raise OSError(28, 'No space left on device')
+
+        path = self.write_image('sign.png', (16, 8), (200, 10, 10, 255))
+        manager = TextureManager(workers=1)
+        self.addCleanup(manager.release)
+        manager.cache = FullDiskCache()
+        with self.assertLogs('game.core.textures', 'WARNING') as logs:
+            manager.request('sign', path)
+            self.assertTrue(manager.wait(timeout=10))
+        self.assertIn('Could not write texture cache', logs.output[0])
+        self.assertEqual((manager.stats['decoded'], manager.stats['missing']), (1, 0))
+        self.assertEqual((manager.get('sign').width, manager.get('sign').height), (16, 8))
+
+    def test_small_textures_share_an_atlas_page(self):
+        from OpenGL.GL import (GL_NO_ERROR, GL_RGBA, GL_TEXTURE_2D, GL_UNSIGNED_BYTE,
+                               glBindTexture, glGetError, glGetTexImage)
+        from game.core.render_queue import RenderQueue
+        from game.core.textures import TextureManager
+        from game.core.world import World
+
+        before = live_gl_objects()
+        manager = TextureManager(workers=2, atlas_size=256)
+        manager.request('building', self.write_image('building.png', (32, 48), (255, 0, 0, 255)))
+        manager.request('crate', self.write_image('crate.png', (20, 20), (0, 0, 255, 255)))
+        manager.request('ground', self.write_image('ground.png', (32, 32), (0, 255, 0, 255)),
+                        repeat=True)
+        self.assertTrue(manager.wait(timeout=10))
+        self.assertEqual(glGetError(), GL_NO_ERROR)
+        building, crate, ground = (manager.get(n) for n in ('building', 'crate', 'ground'))
+        self.assertEqual(len(manager.atlases), 1)
+        self.assertIs(building.atlas, crate.atlas)
+        self.assertEqual(building.id, crate.id)
+        self.assertIsNone(ground.atlas)  # Tiled textures need GL_REPEAT on their own texture
+        self.assertEqual(ground.uv, (0.0, 0.0, 1.0, 1.0))
+
+        # Each image sits inside its uv rectangle of the page
+        glBindTexture(GL_TEXTURE_2D, building.id)
+        page = np.frombuffer(glGetTexImage(GL_TEXTURE_2D, 0, GL_RGBA, GL_UNSIGNED_BYTE),
+                             np.uint8).reshape(256, 256, 4)
+        for texture, color in ((building, [255, 0, 0, 255]), (crate, [0, 0, 255, 255])):
+            u0, v0, u1, v1 = (round(c * 256) for c in texture.uv)
+            self.assertEqual((u1 - u0, v1 - v0), (texture.width, texture.height))
+            region = page[v0:v1, u0:u1].reshape(-1, 4)
+            self.assertTrue((region == color).all())
+
+        # World maps its building faces into the page and binds the page
+        world = World(textures=manager)
+        self.addCleanup(world.building_batches['building'].release)
+        queue = RenderQueue()
+        world.submit(queue)
+        batch = world.building_batches['building']
+        self.assertEqual(batch.uv, building.uv)
+        texcoords = batch.data[:len(batch), :, 6:8]
+        self.assertEqual(texcoords.min(axis=(0, 1)).tolist(), list(np.float32(building.uv[:2])))
+        self.assertEqual(texcoords.max(axis=(0, 1)).tolist(), list(np.float32(building.uv[2:])))
+        self.assertIn(building.id, [state.texture for _, state, _, _, _ in queue.items])
+
+        manager.release()
+        self.assertEqual(live_gl_objects()['textures'], before['textures'])
+
+
+class RenderQueueTests(SimpleTestCase):
+    def stub_gl(self):
+        from unittest import mock
+        from game.core import render_queue
+
+        calls = []
+        gl = {name: (lambda name: lambda *args: calls.append((name, *args)))(name)
+              for name in ('glEnable', 'glDisable', 'glBindTexture', 'glPolygonMode', 'glBlendFunc')}
+        patcher = mock.patch.multiple(render_queue, **gl)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return calls
+
+    def test_cache_skips_redundant_state_calls(self):
+        from game.core.render_queue import GLStateCache, RenderState, UNLIT
+        from OpenGL.GL import GL_BLEND, GL_FILL, GL_FRONT_AND_BACK, GL_LIGHTING, GL_TEXTURE_2D
+
+        calls = self.stub_gl()
+        cache = GLStateCache()
+        cache.apply(RenderState(texture=5))
+        self.assertEqual(calls, [('glEnable', GL_TEXTURE_2D), ('glBindTexture', GL_TEXTURE_2D, 5),
+                                 ('glEnable', GL_LIGHTING), ('glPolygonMode', GL_FRONT_AND_BACK, GL_FILL),
+                                 ('glDisable', GL_BLEND)])
+        self.assertEqual(cache.changes, 5)
+
+        calls.clear()
+        cache.apply(RenderState(texture=5))
+        cache.set_enabled(GL_TEXTURE_2D, True)
+        cache.bind_texture(5)
+        self.assertEqual(calls, [])
+        self.assertEqual((cache.changes, cache.skipped), (5, 7))
+
+        # Only what differs is issued
+        cache.apply(RenderState(texture=6))
+        cache.apply(UNLIT)
+        self.assertEqual(calls, [('glBindTexture', GL_TEXTURE_2D, 6),
+                                 ('glDisable', GL_TEXTURE_2D), ('glDisable', GL_LIGHTING)])
+
+        # A forgotten binding is re-issued even when it looks unchanged
+        calls.clear()
+        cache.forget_texture()
+        cache.bind_texture(6)
+        self.assertEqual(calls, [('glBindTexture', GL_TEXTURE_2D, 6)])
+
+    def test_flush_sorts_by_state(self):
+        from game.core.render_queue import (RenderQueue, RenderState, DEFAULT_STATE, UNLIT,
+                                            WIREFRAME, OVERLAY)
+
+        calls = self.stub_gl()
+        queue = RenderQueue()
+        drawn = []
+        for name, state, layer in (
+                ('grass', RenderState(texture=2), 0),
+                ('wireframe', WIREFRAME, OVERLAY),
+                ('stone', RenderState(texture=1), 0),
+                ('avatars', DEFAULT_STATE, 0),
+                ('grid', UNLIT, 0),
+                ('smoke', RenderState(texture=9, blend=True), 0),
+                ('glass', RenderState(texture=1, blend=True), 0),
+                ('more grass', RenderState(texture=2), 0)):
+            queue.submit(state, lambda name=name: drawn.append(name), layer)
+        queue.flush()
+
+        # Layer first, then untextured before textured and unlit before lit;
+        # blended items go last in their layer, in submission order
+        self.assertEqual(drawn, ['grid', 'avatars', 'stone', 'grass', 'more grass',
+                                 'smoke', 'glass', 'wireframe'])
+        binds = [call[2] for call in calls if call[0] == 'glBindTexture']
+        self.assertEqual(binds, [1, 2, 9, 1])
+        self.assertEqual(queue.items, [])
+
+        # The cache outlives the frame: the state the last item left needs no calls
+        calls.clear()
+        queue.submit(WIREFRAME, lambda: drawn.append('wireframe'), OVERLAY)
+        queue.flush()
+        self.assertEqual(calls, [])
+        self.assertEqual(drawn[-1], 'wireframe')
+
+
+class EntityStoreTests(SimpleTestCase):
+    class FlatTerrain:
+        def get_heights(self, xs, zs):
+            return np.full(len(xs), 2.0)
+
+    def test_removed_rows_are_reused_once(self):
+        from game.core.entities.store import EntityStore
+
+        store = EntityStore()
+        a, b, c = (store.add((i, 0, 0)) for i in range(3))
+        store.remove(b)
+        store.remove(b)  # A second remove must not free the row twice
+        self.assertEqual(len(store), 2)
+        reused = store.add((5, 0, 0), rotation=90)
+        self.assertEqual(reused, b)
+        self.assertEqual(store.add(), 3)  # Not b again
+        self.assertEqual(store.positions[b].tolist(), [5, 0, 0])
+        self.assertEqual(store.rotations[b], 90)
+        self.assertTrue(store.alive[b])
+        self.assertEqual(len(store), 4)
+
+    def test_growth_keeps_existing_rows(self):
+        from game.core.entities.store import EntityStore
+
+        store = EntityStore(capacity=2)
+        first = store.add((1, 2, 3), rotation=45)
+        store.set_velocities(first, (0.5, 0, 0))
+        second = store.add((4, 5, 6))
+        store.remove(second)
+        rows = store.add_many(np.arange(30).reshape(10, 3), rotations=10)
+        self.assertGreaterEqual(store.capacity, 12)
+        self.assertEqual(rows.tolist(), list(range(2, 12)))
+        self.assertEqual(store.positions[first].tolist(), [1, 2, 3])
+        self.assertEqual(store.rotations[first], 45)
+        self.assertEqual(store.velocities[first].tolist(), [0.5, 0, 0])
+        self.assertTrue(store.walking[first])
+        self.assertFalse(store.alive[second])
+        self.assertEqual(store.positions[rows].tolist(), np.arange(30).reshape(10, 3).tolist())
+        self.assertEqual(store.add(), second)  # The free list survives growth too
+
+    def test_update_leaves_dead_rows_alone(self):
+        from game.core.entities.store import EntityStore
+
+        store = EntityStore()
+        live = store.add((0, 0, 0), height=2.0)
+        dead = store.add((10, 7, 0))
+        for row in (live, dead):
+            store.set_velocities(row, (1, 0, 0))
+        store.update(self.FlatTerrain())
+        store.remove(dead)
+        frame = store.animation_frames[dead]
+        store.update(self.FlatTerrain())
+
+        self.assertEqual(store.positions[live].tolist(), [2, 3, 0])  # Ground 2 + height / 2
+        self.assertEqual(store.animation_frames[live], 2)
+        self.assertEqual(store.positions[dead].tolist(), [11, 2.9, 0])  # Where the first tick left it
+        self.assertEqual(store.animation_frames[dead], frame)
+
+    def test_interpolation_turns_the_short_way(self):
+        from game.core.entities.store import EntityStore
+
+        store = EntityStore()
+        row = store.add((0, 0, 0), rotation=350)
+        store.snapshot()
+        store.positions[row] = (4, 0, 0)
+        store.rotate(row, 20)  # 350 -> 10 through 0
+        positions, rotations = store.interpolated(0.5, [row])
+        self.assertEqual(positions.tolist(), [[2, 0, 0]])
+        self.assertAlmostEqual(rotations[0], 0.0)
+        _, rotations = store.interpolated(0.25, [row])
+        self.assertAlmostEqual(rotations[0], 355.0)
+
+        store.snapshot()
+        store.rotate(row, -30)  # 10 -> 340 back through 0
+        _, rotations = store.interpolated(0.5, [row])
+        self.assertAlmostEqual(rotations[0], 355.0)
+
+
+class FixedTimestepTests(SimpleTestCase):
+    TICKS = 240
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from game.core.terrain import Terrain
+        cls.terrain = Terrain(size=32)
+
+    @staticmethod
+    def scripted_input(tick):
+        # Walk, strafe and turn in a pattern that depends only on the tick number
+        forward = 1 if (tick // 40) % 3 != 2 else 0
+        right = (tick // 25) % 3 - 1
+        turn = 4.5 if tick % 60 < 20 else -1.25
+        return forward, right, turn
+
+    def trajectory(self, fps):
+        from game.core.entities.avatar import Avatar
+        from game.core.entities.store import EntityStore
+
+        store = EntityStore()
+        avatar = Avatar(position=(0, 5, 0), store=store)
+        timestep = FixedTimestep(1 / 60, max_steps=8)
+        states = []
+        while len(states) < self.TICKS:
+            steps = timestep.advance(1 / fps)
+            for _ in range(steps):
+                forward, right, turn = self.scripted_input(len(states))
+                store.snapshot()
+                avatar.rotate(turn)
+                avatar.move(forward, right)
+                store.update(self.terrain)
+                states.append((*avatar.position, avatar.rotation))
+            self.assertTrue(0.0 <= timestep.alpha <= 1.0)
+        return np.array(states[:self.TICKS])
+
+    def test_trajectory_is_identical_at_any_render_rate(self):
+        reference = self.trajectory(60)
+        for fps in (30, 240):
+            with self.subTest(fps=fps):
+                self.assertEqual(self.trajectory(fps).tobytes(), reference.tobytes())
+
+    def test_catch_up_is_capped_after_a_stall(self):
+        timestep = FixedTimestep(1 / 60, max_steps=5)
+        self.assertEqual(timestep.advance(1.0), 5)
+        self.assertAlmostEqual(timestep.dropped, 55 / 60)
+        self.assertLess(timestep.alpha, 1.0)
+        self.assertEqual(timestep.advance(1 / 60), 1)
+
+
+class InputReplayTests(SimpleTestCase):
+    TICKS = 300
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from game.core.terrain import Terrain
+        cls.terrain = Terrain(size=32)
+
+    def simulate(self, frames, recorder=None, terrain=None):
+        # Game.update's tick without a window or network; streams when given a ChunkedTerrain
+        from game.core.chunks import ChunkedTerrain
+        from game.core.entities.avatar import Avatar
+        from game.core.entities.store import EntityStore
+        from game.core.replay import apply_input, state_checksum
+
+        terrain = terrain or self.terrain
+        store = EntityStore()
+        avatar = Avatar(position=(0, 5, 0), store=store)
+        checksums = {}
+        for tick, frame in enumerate(frames, 1):
+            store.snapshot()
+            apply_input(avatar, frame)
+            if isinstance(terrain, ChunkedTerrain):
+                terrain.update(avatar.position)
+            store.update(terrain)
+            checksums[tick] = state_checksum(store)
+            if recorder is not None:
+                recorder.record(frame, lambda: state_checksum(store))
+        return checksums
+
+    def test_replay_reproduces_recorded_checksums(self):
+        import os
+        import tempfile
+        from game.core.replay import InputFrame, InputRecorder, InputReplay, KEY_FORWARD, KEY_LEFT
+
+        frames = [InputFrame(KEY_FORWARD | (KEY_LEFT if (tick // 70) % 2 else 0),
+                             7 if tick % 90 < 5 else 0, -1 if tick % 45 == 0 else 0)
+                  for tick in range(self.TICKS)]
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'session.ginp')
+            recorder = InputRecorder(path, checksum_interval=50)
+            recorded = self.simulate(frames, recorder)
+            recorder.close()
+            # Held keys collapse into repeat records
+            self.assertLess(os.path.getsize(path), 6 * self.TICKS // 4)
+
+            log = InputReplay(path)
+            self.assertEqual(log.frames, frames)
+            self.assertEqual(sorted(log.checksums), list(range(50, self.TICKS + 1, 50)))
+            for tick, crc in log.checksums.items():
+                self.assertEqual(recorded[tick], crc)
+            replayed = self.simulate(log.frames)
+            self.assertEqual(replayed, recorded)
+            for tick, crc in log.checksums.items():
+                self.assertEqual(replayed[tick], crc)
+
+            # A log cut off mid-record replays up to its last complete record
+            with open(path, 'r+b') as f:
+                f.truncate(os.path.getsize(path) - 1)
+            truncated = InputReplay(path)
+            self.assertEqual(truncated.frames, frames)
+            self.assertNotIn(self.TICKS, truncated.checksums)
+
+    def test_streaming_replay_does_not_depend_on_worker_timing(self):
+        import os
+        import tempfile
+        from game.core.chunks import ChunkedTerrain
+        from game.core.replay import InputFrame, InputRecorder, InputReplay, KEY_FORWARD
+
+        def terrain(executor, blocking=True):
+            chunks = ChunkedTerrain(seed=3, chunk_size=8, view_radius=1, executor=executor,
+                                    blocking=blocking)
+            self.addCleanup(chunks.release)
+            return chunks
+
+        class Immediate(ChunkStreamingTests.Executor):
+            # Every chunk is ready by the next update, as with idle workers
+            def submit(self, fn, *args):
+                future = super().submit(fn, *args)
+                self.run()
+                return future
+
+        # Walks across several chunk borders
+        frames = [InputFrame(KEY_FORWARD, 3 if tick % 40 == 0 else 0, 0) for tick in range(200)]
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'streaming.ginp')
+            recorder = InputRecorder(path, streaming=True, checksum_interval=20)
+            stalled = ChunkStreamingTests.Executor()  # Workers never finish on their own
+            recorded = self.simulate(frames, recorder, terrain(stalled))
+            recorder.close()
+            self.assertTrue(stalled.queued)
+
+            log = InputReplay(path)
+            self.assertTrue(log.streaming)
+            self.assertFalse(log.networked)
+            replayed = self.simulate(log.frames, terrain=terrain(Immediate()))
+            self.assertEqual(replayed, recorded)
+            for tick, crc in log.checksums.items():
+                self.assertEqual(replayed[tick], crc)
+
+        # Without blocking the avatar walks on 0 until a worker delivers its chunk
+        self.assertNotEqual(self.simulate(frames, terrain=terrain(stalled, blocking=False)),
+                            recorded)
+
+    def test_checksum_skips_remote_rows(self):
+        from game.core.entities.store import EntityStore
+        from game.core.replay import state_checksum
+
+        store = EntityStore()
+        local = store.add((1, 2, 3), rotation=40)
+        remote = store.add((5, 0, 5))
+        dead = store.add((9, 0, 9))
+        store.remove(dead)
+        crc = state_checksum(store, [local])
+        store.positions[remote] = (6, 0, 6)  # The server moved another player
+        store.rotations[remote] = 90
+        self.assertEqual(state_checksum(store, [local]), crc)
+        store.rotations[local] = 41
+        self.assertNotEqual(state_checksum(store, [local]), crc)
+
+
+class MeshBufferTests(SimpleTestCase):
+    def setUp(self):
+        create_headless_context(self)
+
+    def test_indexed_mesh_draws_and_releases_its_buffers(self):
+        from OpenGL.GL import (GL_COLOR_BUFFER_BIT, GL_NO_ERROR, GL_RGBA, GL_UNSIGNED_BYTE,
+                               glClear, glClearColor, glColor3f, glGetError, glIsBuffer,
+                               glReadPixels)
+        from game.core.gl_buffers import MeshBuffer
+
+        # A quad over the left half of clip space, as two indexed triangles
+        vertices = np.array([(-1, -1, 0), (0, -1, 0), (0, 1, 0), (-1, 1, 0)], dtype=np.float32)
+        normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (4, 1))
+        texcoords = np.array([(0, 0), (1, 0), (1, 1), (0, 1)], dtype=np.float32)
+        mesh = MeshBuffer(vertices, normals, texcoords, indices=[0, 1, 2, 0, 2, 3])
+        vbo, ibo = mesh.vbo, mesh.indices.ibo
+        self.assertTrue(glIsBuffer(vbo) and glIsBuffer(ibo))
+
+        glClearColor(0, 0, 0, 1)
+        glClear(GL_COLOR_BUFFER_BIT)
+        glColor3f(1, 0, 0)
+        mesh.draw()
+        self.assertEqual(glGetError(), GL_NO_ERROR)
+        left = np.frombuffer(glReadPixels(16, 32, 1, 1, GL_RGBA, GL_UNSIGNED_BYTE), np.uint8)
+        right = np.frombuffer(glReadPixels(48, 32, 1, 1, GL_RGBA, GL_UNSIGNED_BYTE), np.uint8)
+        self.assertEqual(left.tolist(), [255, 0, 0, 255])
+        self.assertEqual(right.tolist(), [0, 0, 0, 255])
+
+        mesh.delete()
+        mesh.delete()  # Safe to call twice
+        self.assertEqual(glGetError(), GL_NO_ERROR)
+        self.assertIsNone(mesh.vbo)
+        self.assertIsNone(mesh.indices)
+        self.assertFalse(glIsBuffer(vbo) or glIsBuffer(ibo))
+
+    def test_terrain_buffer_path(self):
+        from OpenGL.GL import GL_NO_ERROR, glFinish, glGetError
+        from game.core.frustum import Frustum
+        from game.core.terrain import Terrain
+
+        before = live_gl_objects()
+        terrain = Terrain(size=33, patch_size=8)
+        frustum = Frustum.from_camera((0, 20, -30), (0, 0, 0), 45, 1.0, 0.1, 150.0)
+        terrain.draw(0, frustum)
+        terrain.draw(0)
+        glFinish()
+        self.assertEqual(glGetError(), GL_NO_ERROR)
+        self.assertIsNotNone(terrain.mesh)
+        self.assertTrue(terrain._lod_buffers)  # Distant patches drew at a coarser level
+        self.assertEqual(live_gl_objects()['buffers'],
+                         before['buffers'] + 2 + len(terrain._lod_buffers))
+        self.assertGreater(terrain.triangles_drawn, 0)
+
+        terrain.release()
+        self.assertIsNone(terrain.mesh)
+        self.assertEqual(live_gl_objects(), before)
+
+
+class AvatarRendererLeakTests(SimpleTestCase):
+    FRAMES = 10000
+
+    def setUp(self):
+        create_headless_context(self)
+
+    def assert_gl_objects_flat(self, draw_frame):
+        from OpenGL.GL import glFinish
+        for _ in range(10):
+            draw_frame()
+        glFinish()
+        before = live_gl_objects()
+        for _ in range(self.FRAMES):
+            draw_frame()
+        glFinish()
+        self.assertEqual(live_gl_objects(), before)
+
+    def test_instanced_and_batched_paths_do_not_leak(self):
+        from game.core.entities.avatar_renderer import AvatarRenderer
+        from game.core.entities.store import EntityStore
+
+        store = EntityStore()
+        store.add_many([(0, 1, 0), (2, 1, 0), (-2, 1, 3)], rotations=[0, 90, 200])
+        for instanced in (True, False):
+            renderer = AvatarRenderer(instanced=instanced)
+            self.addCleanup(renderer.release)
+            with self.subTest(instanced=renderer.instanced):
+                self.assert_gl_objects_flat(lambda: renderer.draw_store(store))
+
+    def test_avatar_draw_reuses_shared_meshes(self):
+        from game.core.entities.avatar import Avatar
+        from game.core.entities.avatar_renderer import release_shared_renderer
+
+        avatar = Avatar(position=(0, 1, 0))
+        self.addCleanup(release_shared_renderer)
+        self.assert_gl_objects_flat(avatar.draw)
+
+
+class PositionServerTests(SimpleTestCase):
+    class Writer:
+        # Stands in for an asyncio StreamWriter; `stalled` fakes a client that stopped reading
+        def __init__(self):
+            self.data = bytearray()
+            self.stalled = False
+            self.closed = False
+            self.transport = self
+
+        def is_closing(self):
+            return self.closed
+
+        def close(self):
+            self.closed = True
+
+        def get_extra_info(self, name):
+            return None
+
+        def get_write_buffer_size(self):
+            return 1 << 30 if self.stalled else 0
+
+        def write(self, data):
+            self.data += data
+
+    def test_malformed_frames(self):
+        import asyncio
+        from game.core.net import MSG_STATE, STATE, frame
+        from position_server import MAX_CLIENT_MESSAGE, PositionServer
+
+        async def session():
+            server = PositionServer()
+            reader, writer = asyncio.StreamReader(), self.Writer()
+            task = asyncio.ensure_future(server.handle_client(reader, writer))
+            await asyncio.sleep(0)
+            entity_id, = server.clients
+
+            # Empty and unknown frames are ignored, the connection stays up
+            reader.feed_data(frame(b'') + frame(b'\x07\x00') + frame(b'\x01'))
+            reader.feed_data(frame(STATE.pack(MSG_STATE, 1.0, 2.0, 3.0, 90.0)))
+            for _ in range(5):
+                await asyncio.sleep(0)
+            self.assertFalse(task.done())
+            self.assertEqual(server.states[entity_id], (1.0, 2.0, 3.0, 90.0))
+
+            # An oversized length drops the client without waiting for the payload
+            reader.feed_data((MAX_CLIENT_MESSAGE + 1).to_bytes(2, 'little'))
+            with self.assertLogs('position_server', 'WARNING'):
+                await asyncio.wait_for(task, 1)
+            self.assertTrue(writer.closed)
+            self.assertNotIn(entity_id, server.clients)
+            self.assertNotIn(entity_id, server.states)
+
+        asyncio.run(session())
+
+    def test_clients_reconstruct_what_they_can_see(self):
+        import random
+        from game.core.net import LENGTH, apply_snapshot, dequantize
+        from position_server import Client, PositionServer
+
+        rng = random.Random(3)
+        server = PositionServer(interest_radius=20.0, max_visible=8)
+        positions, known = {}, {}
+
+        def connect():
+            entity_id = server._allocate_id()
+            server.clients[entity_id] = Client(entity_id, self.Writer())
+            positions[entity_id] = [rng.uniform(0, 60), rng.uniform(0, 60), rng.uniform(0, 360)]
+            known[entity_id] = {}
+
+        for _ in range(30):
+            connect()
+        for tick in range(200):
+            for entity_id, p in positions.items():
+                # Mostly walking, sometimes teleporting past what an int16 delta can carry
+                if rng.random() < 0.01:
+                    p[0] += 700
+                else:
+                    p[0] += rng.uniform(-1, 1)
+                p[1] += rng.uniform(-1, 1)
+                p[2] += rng.uniform(-20, 20)
+                server._set_state(entity_id, (p[0], 1.0, p[1], p[2]))
+            for client in server.clients.values():
+                client.writer.stalled = rng.random() < 0.2
+            if tick % 50 == 25:
+                gone = rng.choice(list(server.clients))
+                server._disconnect(gone)
+                del positions[gone], known[gone]
+                connect()
+            server.step()
+
+            visible = server._visible_all()
+            for entity_id, client in server.clients.items():
+                data, state = client.writer.data, known[entity_id]
+                while data:
+                    size, = LENGTH.unpack_from(data)
+                    apply_snapshot(bytes(data[LENGTH.size:LENGTH.size + size]), state)
+                    del data[:LENGTH.size + size]
+                if client.writer.stalled:
+                    continue
+                self.assertEqual(state.keys(), visible.get(entity_id, set()))
+                self.assertLessEqual(len(state), 8)
+                for other, q in state.items():
+                    self.assertEqual(q, server.quantized[other])
+                    self.assertAlmostEqual(dequantize(q)[0], positions[other][0], delta=1 / 64)
+
+
+class LatencyMiddleware:
+    """Delays every response by `delay` seconds and counts requests per path."""
+    delay = 0.0
+    hits = Counter()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        self.hits[request.path] += 1
+        time.sleep(self.delay)
+        return self.get_response(request)
+
+
+@override_settings(MIDDLEWARE=[*settings.MIDDLEWARE, 'game.tests.LatencyMiddleware'])
+class ApiClientTests(LiveServerTestCase):
+    def setUp(self):
+        from game.core.api import ApiClient
+
+        user = User.objects.create_user('ana', password='correct-horse')
+        location = Location.objects.create(name='Plaza', description='The town square')
+        self.dialogue = Dialogue.objects.create(location=location, npc_text='¿Cómo estás?',
+                                                correct_response='Bien', hint='Good', difficulty=2)
+        PlayerProgress.objects.create(user=user, current_location=location)
+        LatencyMiddleware.hits.clear()
+        LatencyMiddleware.delay = 0.2
+        self.addCleanup(setattr, LatencyMiddleware, 'delay', 0.0)
+        self.api = ApiClient(self.live_server_url, 'ana', 'correct-horse')
+        self.addCleanup(self.api.close)
+
+    def run_frames(self, done, timeout=10.0):
+        # Poll like Game.run does and return the longest a single poll took
+        worst = 0.0
+        deadline = time.monotonic() + timeout
+        while not done():
+            self.assertLess(time.monotonic(), deadline, "no response from the API")
+            start = time.perf_counter()
+            self.api.poll()
+            worst = max(worst, time.perf_counter() - start)
+            time.sleep(1 / 120)
+        return worst
+
+    def test_slow_server_never_blocks_the_frame_loop(self):
+        received = []
+        start = time.perf_counter()
+        for _ in range(5):
+            self.api.get('/api/locations/', callback=received.append, max_age=60)
+        self.assertLess(time.perf_counter() - start, 0.05)
+
+        worst_poll = self.run_frames(lambda: len(received) == 5)
+        self.assertLess(worst_poll, 0.05)
+        self.assertEqual({r.status for r in received}, {200})
+        self.assertEqual(received[0].data[0]['name'], 'Plaza')
+        # The five identical GETs went out as one request
+        self.assertEqual(LatencyMiddleware.hits['/api/locations/'], 1)
+
+        self.api.get('/api/locations/', callback=received.append, max_age=60)
+        self.assertTrue(self.api.poll()[0].cached)
+        self.assertEqual(LatencyMiddleware.hits['/api/locations/'], 1)
+
+    def test_post_invalidates_cached_gets_over_kept_alive_connections(self):
+        received = []
+        self.api.get('/api/progress/', callback=received.append, max_age=60)
+        self.run_frames(lambda: received)
+        self.assertEqual(received[-1].data[0]['score'], 0)
+
+        # DialogueViewSet only looks dialogues up within a ?location=
+        self.api.post(f'/api/dialogues/{self.dialogue.pk}/check_answer/'
+                      f'?location={self.dialogue.location_id}', {'answer': 'bien'},
+                      callback=received.append, invalidates=['/api/progress/'])
+        self.run_frames(lambda: len(received) == 2)
+        self.assertEqual(received[-1].status, 200, received[-1].error)
+        self.assertTrue(received[-1].data['correct'])
+
+        self.api.get('/api/progress/', callback=received.append, max_age=60)
+        self.run_frames(lambda: len(received) == 3)
+        self.assertFalse(received[-1].cached)
+        self.assertEqual(received[-1].data[0]['score'], 20)
+        # Login plus three API calls, on at most one connection per worker
+        self.assertEqual(self.api.requests_sent, 5)
+        self.assertLessEqual(self.api.connections_opened, 2)
+
+
+class SubmitAnswersTests(TestCase):
+    URL = '/api/dialogues/submit_answers/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('ana')
+        location = Location.objects.create(name='Plaza', description='The town square')
+        self.dialogues = Dialogue.objects.bulk_create(
+            Dialogue(location=location, npc_text=f'Frase {i}', correct_response=f'Respuesta {i}',
+                     hint=f'Pista {i}', difficulty=i % 3 + 1)
+            for i in range(20))
+        self.progress = PlayerProgress.objects.create(user=self.user, current_location=location)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def answers(self, dialogues, correct=True):
+        return [{'dialogue_id': d.pk,
+                 'answer': f' {d.correct_response.upper()} ' if correct else 'no sé'}
+                for d in dialogues]
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        for size in (1, 20):
+            with self.subTest(size=size), self.assertNumQueries(7):
+                # dialogues, progress id, savepoint, bulk insert, score update, new score, release
+                answers = self.answers(self.dialogues[:size])
+                response = self.client.post(self.URL, {'answers': answers}, format='json')
+            self.assertEqual(response.status_code, 200)
+
+    def test_batch_scores_like_single_calls(self):
+        first, second, third = self.dialogues[:3]
+        answers = (self.answers([first, second]) + self.answers([third], correct=False)
+                   + self.answers([first]) + [{'dialogue_id': 0, 'answer': 'hola'}])
+        response = self.client.post(self.URL, {'answers': answers}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['dialogue_id'] for r in results], [first.pk, second.pk, third.pk,
+                                                               first.pk, 0])
+        self.assertEqual([r['correct'] for r in results], [True, True, False, True, False])
+        self.assertEqual(results[2]['hint'], third.hint)
+        self.assertIn('error', results[4])
+
+        # Repeating an answer scores again, as check_answer does, but completes it once
+        expected = (2 * first.difficulty + second.difficulty) * 10
+        self.assertEqual(response.data['score_gained'], expected)
+        self.progress.refresh_from_db()
+        self.assertEqual(self.progress.score, expected)
+        self.assertEqual(set(self.progress.completed_dialogues.all()), {first, second})
+
+    def test_invalid_batches_are_rejected(self):
+        for answers in (None, [], [{'dialogue_id': 'x', 'answer': 'hola'}],
+                        self.answers(self.dialogues) * 11):
+            with self.subTest(answers=answers and answers[:1]):
+                response = self.client.post(self.URL, {'answers': answers}, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.progress.refresh_from_db()
+        self.assertEqual(self.progress.score, 0)
+
+
+class PlayerProgressQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana')
+        self.locations = [Location.objects.create(name=f'Place {i}', description='')
+                          for i in range(3)]
+        self.dialogues = Dialogue.objects.bulk_create(
+            Dialogue(location=self.locations[i % 3], npc_text=f'Frase {i}',
+                     correct_response='sí', hint='', difficulty=1)
+            for i in range(120))
+        self.progress = PlayerProgress.objects.create(user=self.user,
+                                                      current_location=self.locations[0])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def complete(self, count):
+        self.progress.completed_dialogues.set(self.dialogues[:count])
+
+    def assert_constant_queries(self, num, request):
+        for history in (3, 120):
+            self.complete(history)
+            with self.subTest(history=history), self.assertNumQueries(num):
+                response = request()
+            self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_summary_reads_are_constant(self):
+        pk = self.progress.pk
+        # progress with user and location, completion counts (+ ids)
+        self.assert_constant_queries(2, lambda: self.client.get('/api/progress/'))
+        self.assert_constant_queries(2, lambda: self.client.get(f'/api/progress/{pk}/'))
+        response = self.assert_constant_queries(
+            3, lambda: self.client.get(f'/api/progress/{pk}/?include=completed_ids'))
+
+        self.assertEqual(response.data['completed_count'], 120)
+        self.assertEqual(response.data['completed_by_location'],
+                         [{'location': location.pk, 'count': 40} for location in self.locations])
+        self.assertEqual(response.data['completed_dialogue_ids'], [d.pk for d in self.dialogues])
+        self.assertNotIn('completed_dialogue_ids', self.client.get('/api/progress/').data[0])
+
+    def test_change_location_is_constant(self):
+        # location, progress, save, completion counts
+        response = self.assert_constant_queries(4, lambda: self.client.post(
+            '/api/progress/change_location/', {'location_id': self.locations[2].pk}))
+        self.assertEqual(response.data['current_location']['name'], 'Place 2')
+        self.assertEqual(response.data['completed_count'], 120)
+
+    def test_completed_dialogues_are_paginated(self):
+        url = f'/api/progress/{self.progress.pk}/completed/'
+        # progress, count, page
+        response = self.assert_constant_queries(3, lambda: self.client.get(url))
+        self.assertEqual(response.data['count'], 120)
+        self.assertEqual([d['id'] for d in response.data['results']],
+                         [d.pk for d in self.dialogues[:50]])
+
+        response = self.client.get(url, {'location': self.locations[1].pk, 'page': 2,
+                                         'page_size': 30})
+        self.assertEqual(response.data['count'], 40)
+        self.assertEqual([d['id'] for d in response.data['results']],
+                         [d.pk for d in self.dialogues[1::3][30:]])
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.location = Location.objects.create(name='Plaza', description='The town square')
+        self.dialogue = Dialogue.objects.create(location=self.location, npc_text='Hola',
+                                                correct_response='hola', hint='Hi')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('ana'))
+
+    def test_warm_responses_skip_the_database_and_honour_etags(self):
+        urls = ['/api/locations/', f'/api/locations/{self.location.pk}/',
+                f'/api/dialogues/?location={self.location.pk}',
+                f'/api/dialogues/{self.dialogue.pk}/?location={self.location.pk}']
+        for url in urls:
+            with self.subTest(url=url):
+                cold = self.client.get(url)
+                self.assertEqual(cold.status_code, 200)
+                with self.assertNumQueries(0):
+                    warm = self.client.get(url)
+                    not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=cold['ETag'])
+                self.assertEqual(warm.content, cold.content)
+                self.assertEqual(warm['ETag'], cold['ETag'])
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified['ETag'], cold['ETag'])
+
+    def test_content_edits_invalidate_cached_responses(self):
+        url = f'/api/dialogues/?location={self.location.pk}'
+        before = self.client.get(url)
+
+        self.dialogue.npc_text = '¿Qué tal?'
+        self.dialogue.save()
+        after = self.client.get(url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual(after.json()[0]['npc_text'], '¿Qué tal?')
+
+        self.dialogue.delete()
+        self.assertEqual(self.client.get(url).json(), [])
+        Location.objects.create(name='Mercado', description='')
+        self.assertEqual(len(self.client.get('/api/locations/').json()), 2)
+
+    def test_lost_version_key_does_not_revive_old_responses(self):
+        from game.catalog import VERSION_KEY, bump_catalog_version
+
+        url = '/api/locations/'
+        cache.clear()  # Seeded by the first request rather than by setUp's saves
+        before = self.client.get(url)
+        Location.objects.filter(pk=self.location.pk).update(name='Mercado')  # No signals
+        bump_catalog_version()
+        self.assertEqual(self.client.get(url).json()[0]['name'], 'Mercado')
+
+        # Evicted or lost with a cache restart, while the old entries survive
+        cache.delete(VERSION_KEY)
+        after = self.client.get(url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(after.json()[0]['name'], 'Mercado')
+        self.assertNotEqual(after['ETag'], before['ETag'])
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.plaza = Location.objects.create(name='Plaza', description='')
+        self.market = Location.objects.create(name='Mercado', description='')
+        self.dialogue = Dialogue.objects.create(location=self.plaza, npc_text='Hola',
+                                                correct_response='hola', hint='', difficulty=1)
+        self.players = {}
+        for name, score, location in (('ana', 30, self.plaza), ('ben', 50, self.market),
+                                      ('cai', 30, self.plaza), ('dov', 10, self.plaza)):
+            user = User.objects.create_user(name)
+            PlayerProgress.objects.create(user=user, score=score, current_location=location)
+            self.players[name] = user
+        self.client = APIClient()
+        self.client.force_authenticate(self.players['dov'])
+
+    def board(self, **params):
+        response = self.client.get('/api/leaderboard/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_global_and_location_boards(self):
+        data = self.board()
+        self.assertEqual([(r['rank'], r['username'], r['score']) for r in data['results']],
+                         [(1, 'ben', 50), (2, 'ana', 30), (2, 'cai', 30), (4, 'dov', 10)])
+        self.assertEqual(data['player'], {'rank': 4, 'score': 10})
+
+        data = self.board(location=self.plaza.pk, limit=2)
+        self.assertEqual([r['username'] for r in data['results']], ['ana', 'cai'])
+        self.assertEqual(data['player'], {'rank': 3, 'score': 10})
+        self.assertIsNone(self.board(location=self.market.pk)['player'])
+        self.assertEqual(self.client.get('/api/leaderboard/', {'limit': 'x'}).status_code, 400)
+
+    def test_correct_answers_update_the_cached_board_in_place(self):
+        self.board()
+        self.board(location=self.plaza.pk)
+        url = f'/api/dialogues/{self.dialogue.pk}/check_answer/?location={self.plaza.pk}'
+        for _ in range(5):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {'answer': 'Hola'})
+
+        # Served from the updated cache: only the player's own rank is queried
+        with self.assertNumQueries(2):
+            data = self.board()
+        self.assertEqual([(r['username'], r['score']) for r in data['results'][:2]],
+                         [('dov', 60), ('ben', 50)])
+        self.assertEqual(data['player'], {'rank': 1, 'score': 60})
+        self.assertEqual(self.board(location=self.plaza.pk)['results'][0]['username'], 'dov')
+
+        # Moving saves the row, which drops the boards so they rebuild
+        self.client.post('/api/progress/change_location/', {'location_id': self.market.pk})
+        self.assertEqual([r['username'] for r in self.board(location=self.plaza.pk)['results']],
+                         ['ana', 'cai'])
+        self.assertEqual([r['username'] for r in self.board(location=self.market.pk)['results']],
+                         ['dov', 'ben'])
+
+
+class ConcurrentScoringTests(TransactionTestCase):
+    THREADS = 8
+    ANSWERS = 25
+
+    def test_parallel_correct_answers_are_all_counted(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import connection
+
+        cache.clear()
+        location = Location.objects.create(name='Plaza', description='')
+        dialogue = Dialogue.objects.create(location=location, npc_text='Hola',
+                                           correct_response='hola', hint='', difficulty=2)
+        user = User.objects.create_user('ana')
+        progress = PlayerProgress.objects.create(user=user, current_location=location)
+        url = f'/api/dialogues/{dialogue.pk}/check_answer/?location={location.pk}'
+
+        def answer(_):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                return [client.post(url, {'answer': 'hola'}).status_code
+                        for _ in range(self.ANSWERS)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.THREADS) as pool:
+            statuses = [s for batch in pool.map(answer, range(self.THREADS)) for s in batch]
+        self.assertEqual(set(statuses), {200})
+        progress.refresh_from_db()
+        self.assertEqual(progress.score, self.THREADS * self.ANSWERS * 20)
+        self.assertEqual(list(progress.completed_dialogues.all()), [dialogue])
+
+        client = APIClient()
+        client.force_authenticate(user)
+        board = client.get('/api/leaderboard/').data
+        self.assertEqual(board['results'][0]['score'], progress.score)
+
+
+class AnswerMatchingTests(SimpleTestCase):
+    def test_normalize_folds_case_accents_and_punctuation(self):
+        from game.matching import normalize
+        self.assertEqual(normalize('¡Adiós, Señor!'), 'adios senor')
+        self.assertEqual(normalize('  ¿Qué   tal?\t'), 'que tal')
+        self.assertEqual(normalize('?!'), '')
+
+    def test_bounded_distance_agrees_with_full_levenshtein(self):
+        import random
+        from game.matching import within_distance
+
+        def levenshtein(a, b):
+            previous = list(range(len(b) + 1))
+            for i, x in enumerate(a, 1):
+                current = [i]
+                for j, y in enumerate(b, 1):
+                    current.append(min(previous[j - 1] + (x != y), previous[j] + 1,
+                                       current[j - 1] + 1))
+                previous = current
+            return previous[-1]
+
+        rng = random.Random(7)
+        for _ in range(5000):
+            a = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 8)))
+            b = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 8)))
+            limit = rng.randint(0, 3)
+            self.assertEqual(within_distance(a, b, limit), levenshtein(a, b) <= limit,
+                             (a, b, limit))
+
+    def test_typos_allowed_grow_with_answer_length(self):
+        from game.matching import is_accepted
+        self.assertTrue(is_accepted('Adios', ['adios']))
+        self.assertTrue(is_accepted('grcias', ['gracias']))
+        self.assertFalse(is_accepted('grcas', ['gracias']))
+        self.assertFalse(is_accepted('sol', ['sal']))
+        station = ['donde esta la estacion de tren']
+        self.assertTrue(is_accepted('¿Dónde está la estasion de tre?', station))
+        self.assertFalse(is_accepted('donde esta la estasion de tern', station))
+        self.assertTrue(is_accepted('buenas', ['hola', 'buenas']))
+
+
+class DialogueAnswerTests(TestCase):
+    def setUp(self):
+        location = Location.objects.create(name='Plaza', description='')
+        self.dialogue = Dialogue.objects.create(
+            location=location, npc_text='Me voy', correct_response='¡Adiós!', hint='Goodbye',
+            alternative_responses='Hasta luego\n\nChao')
+        PlayerProgress.objects.create(user=User.objects.create_user('ana'))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(username='ana'))
+
+    def check(self, answer):
+        response = self.client.post(f'/api/dialogues/{self.dialogue.pk}/check_answer/'
+                                    f'?location={self.dialogue.location_id}', {'answer': answer})
+        return response.data['correct']
+
+    def test_normalized_answers_are_stored_on_save(self):
+        from django.db import connection
+
+        self.assertEqual(self.dialogue.normalized_response, 'adios')
+        self.assertEqual(self.dialogue.accepted_answers, ['adios', 'hasta luego', 'chao'])
+        self.dialogue.correct_response = 'Nos vemos'
+        self.dialogue.save(update_fields=['correct_response'])
+        self.dialogue.refresh_from_db()
+        self.assertEqual(self.dialogue.normalized_response, 'nos vemos')
+        self.assertEqual(Dialogue.objects.get(normalized_response='nos vemos'), self.dialogue)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Dialogue._meta.db_table)
+        self.assertIn(['normalized_response'],
+                      [c['columns'] for c in constraints.values() if c['index']])
+
+    def test_check_answer_is_lenient(self):
+        for answer, correct in (('adios', True), ('ADIÓS', True), ('adio', True),
+                                ('hasta lugo', True), ('chao!', True), ('hola', False),
+                                ('', False)):
+            with self.subTest(answer=answer):
+                self.assertEqual(self.check(answer), correct)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.station = Location.objects.create(name='Estación', description='Trains leave hourly')
+        self.market = Location.objects.create(name='Mercado',
+                                              description='Stalls near the estación')
+        self.where = Dialogue.objects.create(location=self.station,
+                                             npc_text='¿Dónde está el tren?',
+                                             correct_response='En el andén', hint='Platform')
+        self.price = Dialogue.objects.create(location=self.market, npc_text='¿Cuánto cuesta?',
+                                             correct_response='Tres euros', hint='Price of the tren')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('ana'))
+
+    def test_matches_ignore_accents_and_rank_names_first(self):
+        from game import search
+        names = [location.name for location in search.search(Location.objects.all(), 'estacion')]
+        self.assertEqual(names, ['Estación', 'Mercado'])
+        texts = [dialogue.npc_text for dialogue in search.search(Dialogue.objects.all(), 'tren')]
+        self.assertEqual(texts, ['¿Dónde está el tren?', '¿Cuánto cuesta?'])
+        # Every word must match, as a prefix; query syntax in the text is just words
+        self.assertEqual(search.search(Dialogue.objects.all(), 'donde tre'), [self.where])
+        self.assertEqual(search.search(Dialogue.objects.all(), '"tren" -'), [self.where, self.price])
+        self.assertEqual(search.search(Dialogue.objects.all(), '*?'), [])
+
+    def test_index_follows_saves_deletes_and_bulk_creates(self):
+        from game import search
+        self.where.npc_text = '¿Dónde está el autobús?'
+        self.where.save()
+        self.assertEqual(search.search(Dialogue.objects.all(), 'autobus'), [self.where])
+        self.assertEqual(search.search(Dialogue.objects.all(), 'tren'), [self.price])
+        self.price.delete()
+        self.assertEqual(search.search(Dialogue.objects.all(), 'tren'), [])
+        Dialogue.objects.bulk_create([Dialogue(location=self.market, npc_text='Un tren más',
+                                               correct_response='Sí', hint='')])
+        self.assertEqual(len(search.search(Dialogue.objects.all(), 'tren')), 1)
+
+    def test_api_ranks_results_and_never_matches_answers(self):
+        response = self.client.get('/api/search/', {'q': 'tren'})
+        self.assertEqual(response.status_code, 200)
+        dialogues = response.json()['dialogues']
+        self.assertEqual([d['id'] for d in dialogues], [self.where.pk, self.price.pk])
+        self.assertLessEqual(dialogues[0]['rank'], dialogues[1]['rank'])
+        self.assertNotIn('correct_response', dialogues[0])
+        self.assertEqual(response.json()['locations'], [])
+
+        self.assertEqual(self.client.get('/api/search/', {'q': 'euros'}).json()['dialogues'], [])
+        narrowed = self.client.get('/api/search/', {'q': 'tren', 'type': 'dialogues',
+                                                    'location': self.market.pk}).json()
+        self.assertEqual([d['id'] for d in narrowed['dialogues']], [self.price.pk])
+        self.assertNotIn('locations', narrowed)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'tren', 'type': 'npcs'})
+                         .status_code, 400)
+
+    def test_admin_search_uses_the_index(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get('/admin/game/dialogue/', {'q': 'euros'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.price])
+        response = self.client.get('/admin/game/location/', {'q': 'estacion'})
+        self.assertEqual(set(response.context['cl'].result_list), {self.station, self.market})
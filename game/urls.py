@@ -6,6 +6,8 @@ router = DefaultRouter()
 router.register(r'locations', views.LocationViewSet, basename='location')
 router.register(r'dialogues', views.DialogueViewSet, basename='dialogue')
 router.register(r'progress', views.PlayerProgressViewSet, basename='progress')
+router.register(r'leaderboard', views.LeaderboardViewSet, basename='leaderboard')
+router.register(r'search', views.SearchViewSet, basename='search')
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -1,29 +1,123 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404, render
 from django.contrib.auth.decorators import login_required
+from django.utils import timezone
+from django.utils.http import parse_etags
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from . import leaderboard, search
+from .catalog import catalog_cache_key, catalog_cache_timeout
+from .matching import is_accepted
 from .models import Location, Dialogue, PlayerProgress
 from .serializers import (
     LocationSerializer,
+    LocationSummarySerializer,
     DialogueSerializer,
-    PlayerProgressSerializer
+    PlayerProgressSerializer,
+    PlayerProgressSummarySerializer,
+    AnswerSubmissionSerializer,
+    attach_completion_summary
 )
 
+MAX_ANSWERS_PER_SUBMISSION = 200
+MAX_SEARCH_RESULTS = 50
+
+def is_correct_answer(dialogue, answer):
+    accepted = dialogue.accepted_answers
+    if not accepted:
+        # Nothing left after normalizing (an answer of "?"): compare as typed
+        return answer.strip().lower() == dialogue.correct_response.strip().lower()
+    return is_accepted(answer, accepted)
+
+def record_correct_answers(user, dialogue_ids, points):
+    """Complete dialogues and add points for `user` in one transaction.
+
+    The score is incremented in the database, so concurrent answers never
+    overwrite each other. Returns the new score, or None if the user has
+    no progress.
+    """
+    progress_id = PlayerProgress.objects.filter(user=user).values_list('pk', flat=True).first()
+    if progress_id is None:
+        return None
+    Completion = PlayerProgress.completed_dialogues.through
+    with transaction.atomic():
+        Completion.objects.bulk_create(
+            [Completion(playerprogress_id=progress_id, dialogue_id=dialogue_id)
+             for dialogue_id in dialogue_ids],
+            ignore_conflicts=True)
+        # update() skips auto_now, so last_played is set here
+        PlayerProgress.objects.filter(pk=progress_id).update(
+            score=F('score') + points, last_played=timezone.now())
+        score, location_id = (PlayerProgress.objects.filter(pk=progress_id)
+                              .values_list('score', 'current_location_id').get())
+        transaction.on_commit(lambda: leaderboard.record_score(
+            progress_id, user.get_username(), score, location_id))
+    return score
+
 def home(request):
     context = {}
     if request.user.is_authenticated:
         context['locations'] = Location.objects.all()
-        context['player_progress'] = PlayerProgress.objects.filter(user=request.user).first()
+        context['player_progress'] = (PlayerProgress.objects.select_related('current_location')
+                                      .filter(user=request.user).first())
     return render(request, 'game/home.html', context)
 
-class LocationViewSet(viewsets.ReadOnlyModelViewSet):
+class CatalogCacheMixin:
+    """Serve list and retrieve from rendered JSON cached under the catalog version.
+
+    Responses carry a strong ETag of the body; a matching If-None-Match gets
+    a 304 without touching the database. Only JSON is cached, so the
+    browsable API renders as before.
+    """
+    catalog_cache = True
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CatalogCacheMixin, self).list(
+            request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CatalogCacheMixin, self).retrieve(
+            request, *args, **kwargs))
+
+    def cached_response(self, request, respond):
+        if not self.catalog_cache or request.accepted_renderer.format != 'json':
+            return respond()
+        key = catalog_cache_key(request.get_full_path())
+        entry = cache.get(key)
+        if entry is None:
+            response = respond()
+            if response.status_code != 200:
+                return response
+            body = request.accepted_renderer.render(response.data, request.accepted_media_type,
+                                                    self.get_renderer_context())
+            entry = ('"%s"' % hashlib.sha1(body).hexdigest(), body)
+            cache.set(key, entry, catalog_cache_timeout())
+        etag, body = entry
+
+        client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in client_etags or '*' in client_etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type=request.accepted_renderer.media_type)
+        response['ETag'] = etag
+        # Per-user (authenticated) data: browsers may keep it but must revalidate
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+class LocationViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
     permission_classes = [IsAuthenticated]
 
-class DialogueViewSet(viewsets.ReadOnlyModelViewSet):
+class DialogueViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = DialogueSerializer
     permission_classes = [IsAuthenticated]
 
@@ -36,28 +130,102 @@ class DialogueViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, methods=['post'])
     def check_answer(self, request, pk=None):
         dialogue = self.get_object()
-        user_answer = request.data.get('answer', '').strip().lower()
-        correct_answer = dialogue.correct_response.strip().lower()
-        
-        is_correct = user_answer == correct_answer
+        is_correct = is_correct_answer(dialogue, request.data.get('answer', ''))
         
         if is_correct:
-            progress = PlayerProgress.objects.get(user=request.user)
-            progress.completed_dialogues.add(dialogue)
-            progress.score += dialogue.difficulty * 10
-            progress.save()
+            score = record_correct_answers(request.user, [dialogue.pk], dialogue.difficulty * 10)
+            if score is None:
+                return Response({'error': 'No progress for this player'},
+                                status=status.HTTP_404_NOT_FOUND)
         
         return Response({
             'correct': is_correct,
             'hint': dialogue.hint if not is_correct else None
         })
 
+    @action(detail=False, methods=['post'])
+    def submit_answers(self, request):
+        """Check a batch of answers and record every correct one in one transaction.
+
+        Expects {"answers": [{"dialogue_id": 1, "answer": "..."}, ...]} and
+        answers with one result per submitted answer, in order. Scoring
+        matches the same answers sent one at a time to check_answer.
+        """
+        data = request.data.get('answers') if hasattr(request.data, 'get') else None
+        submissions = AnswerSubmissionSerializer(
+            data=data, many=True, allow_empty=False,
+            max_length=MAX_ANSWERS_PER_SUBMISSION)
+        submissions.is_valid(raise_exception=True)
+        answers = submissions.validated_data
+
+        # One query for every dialogue in the batch
+        dialogues = Dialogue.objects.in_bulk({a['dialogue_id'] for a in answers})
+        results = []
+        completed = set()
+        gained = 0
+        for submitted in answers:
+            dialogue = dialogues.get(submitted['dialogue_id'])
+            if dialogue is None:
+                results.append({'dialogue_id': submitted['dialogue_id'], 'correct': False,
+                                'hint': None, 'error': 'Dialogue not found.'})
+                continue
+            is_correct = is_correct_answer(dialogue, submitted['answer'])
+            if is_correct:
+                completed.add(dialogue.pk)
+                gained += dialogue.difficulty * 10
+            results.append({'dialogue_id': dialogue.pk, 'correct': is_correct,
+                            'hint': dialogue.hint if not is_correct else None})
+
+        if completed and record_correct_answers(request.user, completed, gained) is None:
+            return Response({'error': 'No progress for this player'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        return Response({'results': results, 'score_gained': gained})
+
+class CompletedDialoguePagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
 class PlayerProgressViewSet(viewsets.ModelViewSet):
     serializer_class = PlayerProgressSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return PlayerProgress.objects.filter(user=self.request.user)
+        return PlayerProgress.objects.filter(user=self.request.user).select_related(
+            'user', 'current_location')
+
+    def get_serializer_class(self):
+        # Reads get the summary; completed dialogues are their own resource
+        if self.action in ('list', 'retrieve', 'change_location'):
+            return PlayerProgressSummarySerializer
+        return PlayerProgressSerializer
+
+    def summarize(self, progresses):
+        """Attach completion counts, and the completed ids with ?include=completed_ids."""
+        include_ids = 'completed_ids' in self.request.query_params.get('include', '').split(',')
+        attach_completion_summary(progresses, include_ids)
+        return progresses
+
+    def list(self, request):
+        progresses = self.summarize(list(self.get_queryset()))
+        return Response(self.get_serializer(progresses, many=True).data)
+
+    def retrieve(self, request, pk=None):
+        progress = self.summarize([self.get_object()])[0]
+        return Response(self.get_serializer(progress).data)
+
+    @action(detail=True, methods=['get'])
+    def completed(self, request, pk=None):
+        """Completed dialogues, a page at a time; ?location= narrows them to one location."""
+        progress = self.get_object()
+        dialogues = Dialogue.objects.filter(playerprogress=progress).order_by('pk')
+        location_id = request.query_params.get('location')
+        if location_id:
+            dialogues = dialogues.filter(location_id=location_id)
+        paginator = CompletedDialoguePagination()
+        page = paginator.paginate_queryset(dialogues, request, view=self)
+        return paginator.get_paginated_response(DialogueSerializer(page, many=True).data)
 
     @action(detail=False, methods=['post'])
     def change_location(self, request):
@@ -69,8 +237,78 @@ class PlayerProgressViewSet(viewsets.ModelViewSet):
             )
         
         location = get_object_or_404(Location, id=location_id)
-        progress = get_object_or_404(PlayerProgress, user=request.user)
+        progress = get_object_or_404(self.get_queryset())
         progress.current_location = location
-        progress.save()
+        progress.save(update_fields=['current_location', 'last_played'])
         
-        return Response(PlayerProgressSerializer(progress).data)
+        return Response(self.get_serializer(self.summarize([progress])[0]).data)
+
+class LeaderboardViewSet(viewsets.ViewSet):
+    """Top players by score; ?location= ranks the players currently at one location."""
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        try:
+            location_id = int(request.query_params['location']) \
+                if 'location' in request.query_params else None
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'error': 'location and limit must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, leaderboard.LEADERBOARD_SIZE))
+
+        results = []
+        for index, (score, _, username) in enumerate(leaderboard.top_players(location_id, limit)):
+            # Ties share a rank: 1, 2, 2, 4
+            rank = results[-1]['rank'] if results and results[-1]['score'] == score else index + 1
+            results.append({'rank': rank, 'username': username, 'score': score})
+
+        player = None
+        own = (PlayerProgress.objects.filter(user=request.user)
+               .values_list('score', 'current_location_id').first())
+        if own is not None and location_id in (None, own[1]):
+            ahead = PlayerProgress.objects.filter(score__gt=own[0])
+            if location_id is not None:
+                ahead = ahead.filter(current_location_id=location_id)
+            player = {'rank': ahead.count() + 1, 'score': own[0]}
+        return Response({'location': location_id, 'results': results, 'player': player})
+
+class SearchViewSet(viewsets.ViewSet):
+    """Full-text search of locations and dialogues, best matches first.
+
+    ?q= is the text; ?type=locations or ?type=dialogues searches only one,
+    ?location= narrows dialogues to one location, and ?limit= caps each
+    list. Dialogues are matched on what players see (npc_text and hint),
+    never on their answers.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        text = request.query_params.get('q', '').strip()
+        kind = request.query_params.get('type')
+        try:
+            location_id = int(request.query_params['location']) \
+                if 'location' in request.query_params else None
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({'error': 'location and limit must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if kind not in (None, 'locations', 'dialogues'):
+            return Response({'error': 'type must be locations or dialogues'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+
+        results = {'query': text}
+        if kind in (None, 'locations'):
+            locations = search.search(Location.objects.all(), text, limit)
+            results['locations'] = [dict(LocationSummarySerializer(location).data,
+                                         rank=location.rank) for location in locations]
+        if kind in (None, 'dialogues'):
+            dialogues = Dialogue.objects.all()
+            if location_id is not None:
+                dialogues = dialogues.filter(location_id=location_id)
+            dialogues = search.search(dialogues, text, limit, columns=('npc_text', 'hint'))
+            results['dialogues'] = [dict(DialogueSerializer(dialogue).data,
+                                         location=dialogue.location_id, rank=dialogue.rank)
+                                    for dialogue in dialogues]
+        return Response(results)
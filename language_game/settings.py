@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -82,6 +83,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than shared-cache memory, so tests that write from
+        # several threads wait on SQLite's lock like the real database does.
+        # Kept out of the checkout in case an interrupted run leaves it behind
+        'TEST': {'NAME': Path(tempfile.gettempdir()) / 'language_game_test.sqlite3'},
     }
 }
 
@@ -148,3 +153,13 @@ REST_FRAMEWORK = {
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8000",
 ]
+
+# Caches rendered catalog API responses and the content version they are
+# keyed on (game/catalog.py). Local memory is per process: use a shared
+# backend such as Redis or Memcached when running more than one.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+CATALOG_CACHE_TIMEOUT = 60 * 60
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+"""Multiplayer position server for the 3D world.
+
+Runs next to the Django site as its own process:
+
+    python position_server.py --port 8765 --tick-rate 20
+
+Clients (Game with --server, or game/benchmarks/position_load.py) send
+their avatar's state whenever it changes; every tick each client gets a
+quantized, delta-compressed snapshot of the avatars within its interest
+radius. The protocol lives in game/core/net.py.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import signal
+import socket
+import sys
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+from game.core.net import (DEFAULT_PORT, ENTER, LENGTH, MAX_MESSAGE, MSG_STATE, STATE, WELCOME,
+                           MSG_WELCOME, encode_snapshot, encode_update, frame, quantize)
+
+logger = logging.getLogger('position_server')
+
+# Clients only send STATE messages; a bigger frame means a broken or hostile client
+MAX_CLIENT_MESSAGE = 64
+
+
+class Client:
+    def __init__(self, entity_id, writer):
+        self.entity_id = entity_id
+        self.writer = writer
+        self.baseline = {}   # Entity id -> quantized state this client was last sent
+        self.bytes_sent = 0
+        self.skipped = 0     # Snapshots not sent because the client was not reading
+        self.synced_tick = None  # Last tick whose snapshot this client was fully sent
+
+
+class PositionServer:
+    def __init__(self, tick_rate=20, interest_radius=48.0, max_visible=64,
+                 max_buffered=64 * 1024):
+        self.tick_rate = tick_rate
+        self.interest_radius = interest_radius
+        self.max_visible = min(max_visible, 255)  # Record counts are one byte
+        self.max_buffered = max_buffered
+        self.clients = {}      # Entity id -> Client
+        self.states = {}       # Entity id -> (x, y, z, rotation) as last reported
+        self.quantized = {}    # Entity id -> quantized state this tick
+        self.updates = {}      # Entity id -> UPDATE record from last tick's state, None if too far
+        self.tick = 0
+        self.tick_times = deque(maxlen=1000)  # Seconds spent on each recent tick
+        self._free_ids = []
+        self._released = []    # Ids freed this tick; reused only after clients saw them leave
+        self._next_id = 1
+
+    def _allocate_id(self):
+        if self._free_ids:
+            return self._free_ids.pop()
+        if self._next_id > 0xFFFF:
+            return None
+        self._next_id += 1
+        return self._next_id - 1
+
+    async def handle_client(self, reader, writer):
+        entity_id = self._allocate_id()
+        if entity_id is None:
+            writer.close()
+            return
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = Client(entity_id, writer)
+        self.clients[entity_id] = client
+        writer.write(frame(WELCOME.pack(MSG_WELCOME, entity_id, self.tick_rate, self.interest_radius)))
+        try:
+            while True:
+                size, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+                if size > MAX_CLIENT_MESSAGE:
+                    logger.warning("Disconnecting client %d: %d byte message", entity_id, size)
+                    break
+                payload = await reader.readexactly(size)
+                if size == STATE.size and payload[0] == MSG_STATE:
+                    self._set_state(entity_id, STATE.unpack(payload)[1:])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._disconnect(entity_id)
+            writer.close()
+
+    def _set_state(self, entity_id, state):
+        if not all(math.isfinite(v) for v in state):
+            return
+        self.states[entity_id] = state
+
+    def _disconnect(self, entity_id):
+        self.clients.pop(entity_id, None)
+        self.states.pop(entity_id, None)
+        self.quantized.pop(entity_id, None)
+        self.updates.pop(entity_id, None)
+        self._released.append(entity_id)
+
+    def _quantize_all(self):
+        # Unchanged entities keep the same tuple object, so clients can compare by identity
+        previous = self.quantized
+        current = {}
+        updates = {}
+        for entity_id, state in self.states.items():
+            q = quantize(*state)
+            old = previous.get(entity_id)
+            if old == q:
+                q = old
+            elif old is not None:
+                updates[entity_id] = encode_update(entity_id, old, q)
+            current[entity_id] = q
+        self.quantized = current
+        self.updates = updates
+
+    def _visible_all(self):
+        """Entity id -> set of the ids it can see: the nearest max_visible within the interest radius.
+
+        Entities are bucketed into cells one interest radius wide, so everyone
+        in a cell shares the same 3x3 block of candidates and their distances
+        are one array operation per cell rather than a query per client.
+        """
+        if not self.states:
+            return {}
+        ids = np.fromiter(self.states, dtype=np.int64, count=len(self.states))
+        xz = np.array([(state[0], state[2]) for state in self.states.values()])
+        cells = defaultdict(list)
+        for index, cell in enumerate(map(tuple, np.floor(xz / self.interest_radius).astype(int))):
+            cells[cell].append(index)
+
+        radius_sq = self.interest_radius ** 2
+        visible = {}
+        for (cx, cz), members in cells.items():
+            near = np.array([i for dx in (-1, 0, 1) for dz in (-1, 0, 1)
+                             for i in cells.get((cx + dx, cz + dz), ())])
+            offsets = xz[members][:, None, :] - xz[near][None, :, :]
+            distance_sq = np.einsum('ijk,ijk->ij', offsets, offsets)
+            within = distance_sq <= radius_sq
+            counts = within.sum(axis=1)
+            seen = np.split(ids[near][np.nonzero(within)[1]], np.cumsum(counts)[:-1])
+            for row, entity_id in enumerate(ids[members].tolist()):
+                if counts[row] > self.max_visible + 1:
+                    # Crowded: keep the nearest (plus itself, dropped below)
+                    nearest = np.argpartition(distance_sq[row], self.max_visible)
+                    seen[row] = ids[near][nearest[:self.max_visible + 1]]
+                visible[entity_id] = set(seen[row].tolist())
+                visible[entity_id].discard(entity_id)
+        return visible
+
+    def _snapshot(self, client, visible, server_time):
+        baseline = client.baseline
+        quantized = self.quantized
+        leaves = baseline.keys() - visible
+        if client.synced_tick == self.tick - 1:
+            # Its baseline is last tick's state, so only this tick's changes matter
+            # and their deltas are the shared ones
+            entering = visible - baseline.keys()
+            changed = (visible & self.updates.keys()) - entering
+            shared = self.updates
+            updates = [shared[i] for i in changed if shared[i] is not None]
+            entering.update(i for i in changed if shared[i] is None)
+            sent = changed
+        else:
+            # Missed snapshots: diff each visible entity against what it last got
+            entering, updates, sent = set(), [], []
+            for entity_id in visible:
+                q = quantized[entity_id]
+                base = baseline.get(entity_id)
+                if base is q:
+                    continue
+                record = None if base is None else encode_update(entity_id, base, q)
+                if record is None:
+                    entering.add(entity_id)
+                else:
+                    updates.append(record)
+                    sent.append(entity_id)
+        for entity_id in sent:
+            baseline[entity_id] = quantized[entity_id]
+        enters = []
+        for entity_id in entering:
+            q = baseline[entity_id] = quantized[entity_id]
+            enters.append(ENTER.pack(entity_id, *q))
+        for entity_id in leaves:
+            del baseline[entity_id]
+        client.synced_tick = self.tick
+        if not (enters or updates or leaves):
+            return None  # Nothing this client can see changed
+        payload = encode_snapshot(self.tick, server_time, enters, updates, leaves)
+        if len(payload) > MAX_MESSAGE:
+            raise ValueError("snapshot too large; lower max_visible")
+        return frame(payload)
+
+    def step(self):
+        start = time.monotonic()
+        self.tick += 1
+        self._quantize_all()
+        visible = self._visible_all()
+        for client in list(self.clients.values()):
+            transport = client.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > self.max_buffered:
+                # Not reading; its baseline stays at what it last got, so the next
+                # snapshot it does get is still a correct delta
+                client.skipped += 1
+                continue
+            data = self._snapshot(client, visible.get(client.entity_id, set()), start)
+            if data is None:
+                continue
+            client.writer.write(data)
+            client.bytes_sent += len(data)
+        self._free_ids.extend(self._released)
+        self._released.clear()
+        self.tick_times.append(time.monotonic() - start)
+
+    async def run_ticks(self):
+        loop = asyncio.get_running_loop()
+        step = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        last_report = loop.time()
+        while True:
+            self.step()
+            now = loop.time()
+            if now - last_report >= 5.0:
+                logger.info("%s", self.summary())
+                last_report = now
+            next_tick += step
+            if next_tick < now:
+                next_tick = now  # Fell behind; do not try to catch up with a burst
+            await asyncio.sleep(next_tick - now)
+
+    def summary(self):
+        times = sorted(self.tick_times)
+
+        def pct(q):
+            return 1000 * times[min(len(times) - 1, int(q * len(times)))] if times else 0.0
+
+        return {
+            'tick': self.tick,
+            'clients': len(self.clients),
+            'tick_ms_p50': pct(0.50),
+            'tick_ms_p99': pct(0.99),
+            'skipped_snapshots': sum(c.skipped for c in self.clients.values()),
+        }
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        logger.info("Position server on %s:%d, %d ticks/s", host, port, self.tick_rate)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        ticks = asyncio.create_task(self.run_ticks())
+        async with server:
+            await stop.wait()
+        ticks.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--tick-rate', type=int, default=20, help="snapshots per second")
+    parser.add_argument('--interest-radius', type=float, default=48.0,
+                        help="clients are sent avatars within this many units")
+    parser.add_argument('--max-visible', type=int, default=64,
+                        help="nearest avatars sent to each client at most")
+    parser.add_argument('--stats-json', action='store_true',
+                        help="print a JSON summary on stdout when stopped")
+    args = parser.parse_args()
+
+    logging.basicConfig(level='INFO', format='%(message)s', stream=sys.stderr)
+    server = PositionServer(args.tick_rate, args.interest_radius, args.max_visible)
+    asyncio.run(server.serve(args.host, args.port))
+    if args.stats_json:
+        print(json.dumps(server.summary()))
+
+
+if __name__ == '__main__':
+    main()